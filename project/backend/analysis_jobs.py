@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "4"))  # Model calls in flight at once
+ANALYSIS_QUEUE = int(os.environ.get("ANALYSIS_QUEUE", "64"))  # Jobs waiting before submit refuses more
+ANALYSIS_TIMEOUT = float(os.environ.get("ANALYSIS_TIMEOUT", "30"))  # Seconds per model call
+ANALYSIS_RETRIES = 2  # Further attempts after a timed out call or a transient API error
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled for each one after
+ANALYSIS_CACHE_DIR = "analysis_cache"
+ANALYSIS_CACHE_ITEMS = 500  # Analyses kept on disk, least recently used evicted first
+MAX_JOBS = 256  # Finished jobs whose result stays queryable by id
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}  # API answers worth another attempt
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class AnalysisBusyError(Exception):
+    """Raised when the job queue is full"""
+
+
+def is_transient(error):
+    """Whether another attempt may succeed: timeouts, dropped connections, rate limits and
+    server errors. Bad requests, auth failures and blocked responses fail the same way
+    every time."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    # Transport errors of the HTTP client under the model SDK carry no status
+    return type(error).__module__.split(".")[0] in ("httpx", "aiohttp")
+
+
+def content_key(*parts):
+    """Hash of the canonical JSON of everything that decides the analysis"""
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class AnalysisCache:
+    """Finished analyses on disk, one JSON file per content key, least recently read
+    evicted first once there are more than max_items. File mtimes are the LRU order."""
+
+    def __init__(self, directory=ANALYSIS_CACHE_DIR, max_items=ANALYSIS_CACHE_ITEMS):
+        self.directory = directory
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        path = self.path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+        with self._lock:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+            if len(entries) > self.max_items:
+                entries.sort(key=lambda entry: entry.stat().st_mtime)
+                for entry in entries[:len(entries) - self.max_items]:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+
+class AnalysisJob:
+    def __init__(self, job_id, key, payload):
+        self.id = job_id
+        self.key = key
+        self.payload = payload  # Handed to the analyze coroutine as keyword arguments
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.attempts = 0
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "cached": self.cached,
+            "attempts": self.attempts,
+            "seconds": round((self.finished or time.time()) - self.created, 2),
+        }
+
+
+class AnalysisQueue:
+    """Post-workout analyses as jobs. submit() returns at once: a cached analysis comes
+    back done, a job for content already queued or running is shared, anything else
+    waits in a bounded queue for one of `workers` tasks on the event loop, which call
+    `analyze(**payload) -> text` under a timeout. Timeouts and transient errors are retried
+    with backoff, anything else fails the job at once. Request threads only ever wait for
+    a result when they ask to (wait()).
+
+    The loop is whatever get_loop() returns (the coach service's), started on first use."""
+
+    def __init__(self, analyze, get_loop, cache=None, workers=ANALYSIS_WORKERS, max_queue=ANALYSIS_QUEUE,
+                 timeout=ANALYSIS_TIMEOUT, retries=ANALYSIS_RETRIES, backoff=RETRY_BACKOFF,
+                 retry_if=is_transient):
+        self.analyze = analyze
+        self.get_loop = get_loop
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_if = retry_if
+        self.jobs = OrderedDict()  # Job id -> AnalysisJob
+        self._by_key = {}  # Content key -> queued or running job
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._queue = None
+        self._waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _start(self):
+        loop = self.get_loop()
+        ready = threading.Event()
+
+        def create():
+            self._queue = asyncio.Queue()
+            for _ in range(self.workers):
+                loop.create_task(self._work())
+            ready.set()
+
+        loop.call_soon_threadsafe(create)
+        ready.wait()
+        return loop
+
+    def submit(self, key, **payload):
+        cached = self.cache.get(key)  # File I/O, outside the lock
+        with self._lock:
+            running = self._by_key.get(key)
+            if running is not None:
+                return running
+            if cached is None and self._waiting >= self.max_queue:
+                self.rejected += 1
+                raise AnalysisBusyError(f"{self._waiting} analyses are already waiting")
+            job = AnalysisJob(f"job-{next(self._ids)}", key, payload)
+            if cached is not None:
+                job.status, job.result, job.cached = DONE, cached, True
+                job.finished = time.time()
+                job.done.set()
+                self._remember(job)
+                return job
+            loop = self._start() if self._queue is None else self.get_loop()
+            self._waiting += 1
+            self._by_key[key] = job
+            self._remember(job)
+        loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_JOBS:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done.is_set():
+                break
+            self.jobs.popitem(last=False)
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            with self._lock:
+                self._waiting -= 1
+            job.status = RUNNING
+            try:
+                await self._run(job)
+            finally:
+                with self._lock:
+                    self._by_key.pop(job.key, None)
+                job.finished = time.time()
+                job.done.set()
+
+    async def _run(self, job):
+        for attempt in range(self.retries + 1):
+            job.attempts = attempt + 1
+            try:
+                job.result = await asyncio.wait_for(self.analyze(**job.payload), self.timeout)
+            except asyncio.TimeoutError:
+                job.error = f"Timed out after {self.timeout:g}s"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                if not self.retry_if(e):
+                    break
+            else:
+                job.status, job.error = DONE, None
+                self.completed += 1
+                try:
+                    self.cache.put(job.key, job.result)
+                except OSError as e:
+                    print(f"Analysis not cached ({job.id}): {e}")
+                return
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        print(f"Analysis {job.id} failed after {job.attempts} attempts: {job.error}")
+        job.status = FAILED
+        self.failed += 1
+
+    def wait(self, job, timeout):
+        """Block until the job is finished or timeout seconds passed; the job either way"""
+        job.done.wait(timeout)
+        return job
+
+    def stats(self):
+        with self._lock:
+            waiting = self._waiting
+        return {
+            "waiting": waiting,
+            "running": len(self._by_key) - waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
@@ -1,121 +1,641 @@
 import base64
+import json
 import cv2
 import numpy as np
-import mediapipe as mp
 import os
 import time
 import threading
-import queue
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
+from flask_sock import Sock, ConnectionClosed
 import dotenv 
 
 dotenv.load_dotenv()
 
 # Own file imports
-from squat_processor import process_squat
-from push_up_processor import process_pushup
-from bicep_curl_processor import process_bicep_curl
+from exercises import EXERCISES
+from exercise_rules import process_exercise, mediapipe_drawing
+from session_store import SessionStore, SessionLimitError, DEFAULT_SESSION_ID
+from frame_stream import LatestFrame, receive_frames
+from session_recording import get_recorder, landmarks_array
+from pose_pool import PosePool, PoolBusyError, POSE_WORKERS
+from kinematics import PoseResults, landmarks_to_array, mediapipe_solutions
+from frame_skipping import FRAME_SKIP
+from audio_cues import CueScheduler, NeuphonicSynthesizer, PcmCache, ToneSynthesizer, speaker_opener
+from rep_segmentation import log_rep
+from multi_person import HORIZONTAL_EXERCISES, GroupTracker, draw_person
+from coach_service import (CoachLimitError, CoachService, CoachSession, Microphone, analysis_key, analyze_set,
+                           gemini_client, load_summary)
+from analysis_jobs import AnalysisBusyError, AnalysisQueue
+from latency_metrics import (begin_timings, end_timings, render_metric, server_timing, stage,
+                             stage_metrics)
 
 app = Flask(__name__)
-CORS(app)
-
-# MediaPipe setup
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(min_detection_confidence=0.6, min_tracking_confidence=0.6)
-
-# Neuphonic TTS setup
-from pyneuphonic import Neuphonic, TTSConfig
-from pyneuphonic.player import AudioPlayer
-client = Neuphonic(api_key=os.environ.get('NEUPHONIC_API_KEY'))
-sse = client.tts.SSEClient()
-tts_config = TTSConfig(lang_code='en', sampling_rate=22050)
-
-# Audio queue and threading
-audio_queue = queue.Queue()
-last_audio_time = 0
+CORS(app, expose_headers=["X-Analysis", "Server-Timing"])
+sock = Sock(app)
+
+# Pose workers use the spawn start method, which re-imports this module as __mp_main__
+# in every worker. They only run Pose, so none of the services below are built there.
+IN_POSE_WORKER = __name__ == "__mp_main__"
+
+TTS_SAMPLING_RATE = 22050
 AUDIO_COOLDOWN = 3
-perfect_form_flag = False
-pushup_phase = "down"  # Initialize pushup_phase for pushup analysis
-bicep_phase = "down"
-
-def audio_worker():
-    while True:
-        message = audio_queue.get()
-        if message is None:
-            break
-        try:
-            with AudioPlayer(sampling_rate=22050) as player:
-                response = sse.send(message, tts_config=tts_config)
-                player.play(response)
-        except Exception as e:
-            print(f"Audio error: {e}")
-        audio_queue.task_done()
-
-audio_thread = threading.Thread(target=audio_worker, daemon=True)
-audio_thread.start()
+coach_client = None  # Gemini client, created on first use
+
+if not IN_POSE_WORKER:
+    # Pose estimation runs in POSE_WORKERS worker processes (0 = in the request thread)
+    pose_pool = PosePool(POSE_WORKERS) if POSE_WORKERS > 0 else None
+
+    # Each client gets its own Pose tracker and rep state
+    sessions = SessionStore(on_close=pose_pool.release if pose_pool else None)
+
+    # Spoken cues: coalesced, faults first, synthesized PCM cached under audio_cache/.
+    # TTS_BACKEND=local swaps Neuphonic for the offline tone synthesizer.
+    if os.environ.get("TTS_BACKEND", "neuphonic" if os.environ.get('NEUPHONIC_API_KEY') else "local") == "local":
+        synthesizer = ToneSynthesizer(TTS_SAMPLING_RATE)
+    else:
+        synthesizer = NeuphonicSynthesizer(os.environ.get('NEUPHONIC_API_KEY'), 'en', TTS_SAMPLING_RATE)
+    audio_queue = CueScheduler(synthesizer, PcmCache(), speaker_opener(TTS_SAMPLING_RATE))
+
+    # Spoken post-workout coaching: every conversation is a task on one background event loop
+    coach_service = CoachService()
+
+def get_coach_client():
+    global coach_client
+    if coach_client is None:
+        coach_client = gemini_client()
+    return coach_client
+
+async def run_analysis(summary, exercise):
+    return await analyze_set(get_coach_client(), summary, exercise)
+
+# Written post-workout analyses: queued jobs on the coach loop, cached by set content
+if not IN_POSE_WORKER:
+    analysis_queue = AnalysisQueue(run_analysis, coach_service.event_loop)
+ANALYSIS_MAX_WAIT = 30  # Seconds GET /analysis/<job_id>?wait= may hold a request
+
+# Routes whose stages are timed into /metrics and the Server-Timing header
+TIMED_ROUTES = {"analyze", "analyze_binary_frame", "analyze_group"}
+
+# Compact per-frame landmark recordings under recordings/<session_id>/
+RECORD_SESSIONS = os.environ.get("RECORD_SESSIONS", "1") == "1"
+
+# Heavy components (MediaPipe graphs, drawing utils, cue audio) load on a background
+# thread so the server accepts connections right away; /ready reports when they are warm
+WARM_UP = os.environ.get("WARM_UP", "1") == "1"
+WARM_UP_TIMEOUT = 60  # Seconds a worker may take to load its first Pose graph
+# Without warm-up, Pose loads on the first frame like it always did: ready from the start
+readiness = {"pose": not WARM_UP, "drawing": False, "audio": False, "seconds": None, "error": None}
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        mediapipe_drawing()
+        readiness["drawing"] = True
+        blank = np.zeros((256, 256, 3), np.uint8)
+        if pose_pool is not None:
+            # One throwaway session per worker, each lands on a different worker
+            warmup_ids = [f"__warmup-{index}" for index in range(pose_pool.size)]
+            futures = [pose_pool.submit(session_id, blank) for session_id in warmup_ids]
+            for future in futures:
+                future.result(WARM_UP_TIMEOUT)
+            for session_id in warmup_ids:
+                pose_pool.release(session_id)
+        else:
+            with mediapipe_solutions().pose.Pose() as pose:
+                pose.process(blank)
+        readiness["pose"] = True
+        readiness["seconds"] = round(time.perf_counter() - start, 2)
+    except Exception as e:
+        # Pose is still marked ready by the first frame a request gets landmarks for
+        readiness["error"] = str(e) or type(e).__name__
+        print(f"Warm-up failed: {e}")
+    audio_queue.warm(text for exercise in EXERCISES.values() for text in exercise.cue_texts()).join()
+    readiness["audio"] = True
+
+if WARM_UP and not IN_POSE_WORKER:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def decode_image(image_bytes):
+    with stage("imdecode"):
+        frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
+
+def estimate_pose(session, frame):
+    """Pose on the session's region of interest, landmarks mapped back to the full frame.
+    Every inference is timed for the session's model tier governor."""
+    def infer(image):
+        start = time.perf_counter()
+        if pose_pool is not None:
+            # Color conversion and inference happen in the worker, this is the round trip
+            with stage("pose"):
+                landmarks = pose_pool.process(session.session_id, image, options=session.pose_options())
+            session.tiers.observe(time.perf_counter() - start, pose_pool.queue_depth(session.session_id))
+            return landmarks
+        with stage("color"):
+            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with stage("pose"):
+            found = session.pose.process(rgb_image).pose_landmarks
+        session.tiers.observe(time.perf_counter() - start)
+        return landmarks_to_array(found) if found else None
+
+    landmarks = session.roi.estimate(frame, infer)
+    readiness["pose"] = True  # Pose answered, with or without a person in view
+    return PoseResults(landmarks)
+
+def track_progress(session, exercise, result, current_time):
+    """Feed an evaluated frame to the session's set summary and rep segmentation"""
+    with stage("summary"):
+        summary = session.set_summary(exercise)
+        summary.update(result, current_time)
+        if result.rep:
+            # A finished rep is when the coach may ask, so the file is never a rep behind
+            try:
+                summary.save()
+            except OSError as e:
+                print(f"Set summary not saved ({session.session_id}): {e}")
+
+    if exercise.rep_spec is not None:
+        with stage("reps"):
+            result.rep_stats = session.rep_segmenter(exercise).update(result.features, current_time, result.faults)
+            if result.rep_stats is not None:
+                log_rep(exercise, result.rep_stats, session.session_id)
+
+def analyze_frame(session, current_exercise, frame, annotate=True, skip=FRAME_SKIP, tier=None, smooth=True):
+    """Run pose estimation and the exercise rules for one frame of a session.
+    With annotate=False nothing is drawn and the frame comes back untouched.
+    With skip=k only every k-th frame (or one that moved) goes through pose
+    estimation; the rules still run on the predicted landmarks in between.
+    tier picks the Pose model (lite/full/heavy, default from the exercise) and
+    smooth its landmark smoothing; the session may run a lighter tier while
+    inference is over budget. Returns (FrameResult, frame, pose results)."""
+    exercise = EXERCISES.get(current_exercise)
+    if exercise is None:
+        raise ValueError(f"Unknown exercise: {current_exercise}")
+    current_time = time.time()
+
+    with session.lock:
+        session.tiers.select(tier or exercise.pose_tier, exercise.min_pose_tier, smooth)
+        recorder = get_recorder(session.session_id, current_exercise, frame.shape) if RECORD_SESSIONS else None
+
+        skipper = session.frame_skipper(skip)
+        with stage("frame_skip"):
+            inferred = skipper is None or skipper.should_infer(frame, current_time)
+        if inferred:
+            results = estimate_pose(session, frame)
+            if skipper is not None:
+                with stage("frame_skip"):
+                    skipper.update(frame, current_time, landmarks_array(results))
+        else:
+            with stage("frame_skip"):
+                results = PoseResults(skipper.predict(current_time))
+        result, processed_frame = process_exercise(
+            exercise, frame, results, session.exercise_state(exercise), current_time, audio_queue,
+            AUDIO_COOLDOWN, annotate=annotate, session_id=session.session_id
+        )
+        result.inferred = inferred
+        result.tier = session.tiers.tier
+        track_progress(session, exercise, result, current_time)
+
+        if recorder is not None:
+            with stage("record"):
+                recorder.record(current_time, landmarks_array(results))
+
+    return result, processed_frame, results
+
+def analyze_group_frame(session, current_exercise, frame, annotate=False, tier=None, smooth=True):
+    """Multi-person variant of analyze_frame: every athlete the session's GroupTracker
+    follows gets pose estimation and their own rule state, summary and rep segmentation.
+    Spoken cues name the athlete's track id. Returns ([(track, FrameResult, pose results)],
+    frame), the frame annotated in place when annotate is set."""
+    exercise = EXERCISES.get(current_exercise)
+    if exercise is None:
+        raise ValueError(f"Unknown exercise: {current_exercise}")
+    if exercise.name in HORIZONTAL_EXERCISES:
+        raise ValueError(f"Group tracking finds standing athletes only, not {current_exercise}")
+    current_time = time.time()
+
+    with session.lock:
+        group = session.group_tracker(lambda: GroupTracker(session.session_id, pose_pool, audio_queue,
+                                                           pose_pool.release if pose_pool else None))
+        people = []
+        for track, landmarks in group.estimate(frame, tier or exercise.pose_tier, exercise.min_pose_tier, smooth):
+            results = PoseResults(landmarks)
+            # The athlete's own lock, which the summary and reps routes read under
+            with track.session.lock:
+                result, _ = process_exercise(
+                    exercise, frame, results, track.session.exercise_state(exercise), current_time, track.cues,
+                    AUDIO_COOLDOWN, annotate=False, session_id=track.session.session_id
+                )
+                result.tier = track.session.tiers.tier
+                track_progress(track.session, exercise, result, current_time)
+            if annotate:
+                with stage("draw"):
+                    draw_person(frame, track, results, result)
+            people.append((track, result, results))
+    return people, frame
+
+def smoothing(value):
+    """Landmark smoothing flag from a query parameter or JSON field, on unless turned off"""
+    return str(value).lower() not in ("0", "false", "off")
+
+def landmarks_response(result, results):
+    """Compact analysis for clients that draw the overlay themselves: the 33 normalized
+    landmarks as [x, y, z, visibility], the joint angles and the feedback"""
+    landmarks = []
+    if results.pose_landmarks:
+        landmarks = [[round(lm.x, 4), round(lm.y, 4), round(lm.z, 4), round(lm.visibility, 3)]
+                     for lm in results.pose_landmarks.landmark]
+    return {
+        "feedback": result.feedback,
+        "tier": result.tier,
+        "landmarks": landmarks,
+        "angles": {name: round(value, 1) for name, value in result.features.items() if value is not None}
+    }
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    global last_audio_time, perfect_form_flag, pushup_phase, bicep_phase
-
-    data = request.get_json()
+    with stage("parse"):
+        data = request.get_json()
     if not data or 'image' not in data:
         return jsonify({"error": "No image provided"}), 400
 
+    try:
+        session = sessions.get(data.get("session_id") or request.headers.get("X-Session-ID"))
+    except SessionLimitError as e:
+        return jsonify({"error": str(e)}), 503
+
     try:
         current_exercise = data.get("exercise", "squat").lower()
         image_data_str = data['image']
         if image_data_str.startswith("data:image"):
-            image_data_str = image_data_str.split(",")[1]
-        frame = cv2.imdecode(np.frombuffer(base64.b64decode(image_data_str), np.uint8), cv2.IMREAD_COLOR)
-        current_time = time.time()
-
-        if current_exercise == "squat":
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_frame)
-            feedback, processed_frame, perfect_form_flag, last_audio_time = process_squat(
-                frame, results, mp_pose,
-                last_audio_time, audio_queue, perfect_form_flag, current_time,
-                AUDIO_COOLDOWN
-            )
+            image_data_str = image_data_str.split(",", 1)[1]
+        with stage("b64decode"):
+            image_bytes = base64.b64decode(image_data_str)
+        frame = decode_image(image_bytes)
+        landmarks_only = data.get("response") == "landmarks"
+        result, processed_frame, results = analyze_frame(
+            session, current_exercise, frame, annotate=not landmarks_only, skip=int(data.get("skip", FRAME_SKIP)),
+            tier=data.get("tier"), smooth=smoothing(data.get("smooth")))
+        if landmarks_only:
+            with stage("serialize"):
+                return jsonify(landmarks_response(result, results))
+
+        with stage("imencode"):
             _, buffer = cv2.imencode('.jpg', processed_frame)
+        with stage("serialize"):
             return jsonify({
-                "feedback": feedback,
+                "feedback": result.feedback,
                 "annotated_image": f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
             })
-        
-        elif current_exercise == "pushup":
-            global pushup_phase  # Declare as global so we can update it
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_frame)
-            feedback, processed_frame, pushup_phase, last_audio_time = process_pushup(
-                frame, results, mp_pose,
-                last_audio_time, audio_queue, pushup_phase, current_time,
-                AUDIO_COOLDOWN
-            )
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze/frame', methods=['POST'])
+def analyze_binary_frame():
+    """Binary variant of /analyze: raw image/jpeg body (or multipart "image" field) in,
+    annotated JPEG bytes out with the feedback JSON in the X-Analysis header.
+    Pass ?response=json to get only the feedback JSON back, or ?response=landmarks
+    for landmarks, angles and feedback without any drawing or re-encoding."""
+    if request.files.get("image"):
+        image_bytes = request.files["image"].read()
+    else:
+        image_bytes = request.get_data(cache=False)
+    if not image_bytes:
+        return jsonify({"error": "No image provided"}), 400
+
+    try:
+        session = sessions.get(request.args.get("session_id") or request.headers.get("X-Session-ID"))
+    except SessionLimitError as e:
+        return jsonify({"error": str(e)}), 503
+
+    try:
+        current_exercise = (request.args.get("exercise") or request.headers.get("X-Exercise") or "squat").lower()
+        response_mode = request.args.get("response", "jpeg")
+        result, processed_frame, results = analyze_frame(
+            session, current_exercise, decode_image(image_bytes), annotate=response_mode == "jpeg",
+            skip=request.args.get("skip", FRAME_SKIP, type=int), tier=request.args.get("tier"),
+            smooth=smoothing(request.args.get("smooth")))
+
+        with stage("serialize"):
+            if response_mode == "landmarks":
+                return jsonify(landmarks_response(result, results))
+            analysis = {"feedback": result.feedback}
+            if response_mode == "json":
+                return jsonify(analysis)
+
+        with stage("imencode"):
             _, buffer = cv2.imencode('.jpg', processed_frame)
-            return jsonify({
-                "feedback": feedback,
-                "annotated_image": f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
-            })
-        
-        elif current_exercise == "bicep":
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_frame)
-            feedback, processed_frame, bicep_phase, last_audio_time = process_bicep_curl(
-                frame, results, mp_pose,
-                last_audio_time, audio_queue, bicep_phase, current_time,
-                AUDIO_COOLDOWN
-            )
+        with stage("serialize"):
+            return Response(buffer.tobytes(), mimetype="image/jpeg",
+                            headers={"X-Analysis": json.dumps(analysis)})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze/group', methods=['POST'])
+def analyze_group():
+    """Multi-person variant of /analyze/frame for group classes in front of one camera.
+    Raw image/jpeg body (or multipart "image" field) in; out comes {"people": [...]}
+    with each tracked athlete's persistent "track" id, feedback, phase, landmarks and
+    angles (plus "rep_stats" on the frame a segmented rep ends). ?response=jpeg returns
+    the annotated frame instead, with that JSON in the X-Analysis header. Push-ups are
+    refused with a 400: the person detector only finds athletes standing up."""
+    if request.files.get("image"):
+        image_bytes = request.files["image"].read()
+    else:
+        image_bytes = request.get_data(cache=False)
+    if not image_bytes:
+        return jsonify({"error": "No image provided"}), 400
+
+    try:
+        session = sessions.get(request.args.get("session_id") or request.headers.get("X-Session-ID"))
+    except SessionLimitError as e:
+        return jsonify({"error": str(e)}), 503
+
+    try:
+        current_exercise = (request.args.get("exercise") or request.headers.get("X-Exercise") or "squat").lower()
+        response_mode = request.args.get("response", "json")
+        people, processed_frame = analyze_group_frame(
+            session, current_exercise, decode_image(image_bytes), annotate=response_mode == "jpeg",
+            tier=request.args.get("tier"), smooth=smoothing(request.args.get("smooth")))
+
+        with stage("serialize"):
+            analysis = {"people": []}
+            for track, result, results in people:
+                person = {"track": track.id, "phase": result.phase, **landmarks_response(result, results)}
+                if result.rep_stats is not None:
+                    person["rep_stats"] = result.rep_stats
+                analysis["people"].append(person)
+            if response_mode != "jpeg":
+                return jsonify(analysis)
+
+        with stage("imencode"):
             _, buffer = cv2.imencode('.jpg', processed_frame)
-            return jsonify({
-                "feedback": feedback,
-                "annotated_image": f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
-            })
+        with stage("serialize"):
+            return Response(buffer.tobytes(), mimetype="image/jpeg",
+                            headers={"X-Analysis": json.dumps(analysis)})
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolBusyError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@sock.route('/ws/analyze')
+def analyze_stream(ws):
+    """Streaming variant of /analyze over a WebSocket. The client sends JPEG frames as
+    binary messages; the server pushes {"type": "feedback"} after each analyzed frame
+    (followed by the annotated JPEG when ?response=jpeg, or carrying landmarks and angles
+    when ?response=landmarks) plus "phase" and "rep" events, and a "rep_stats" event
+    with tempo, range of motion and form score when a segmented rep ends. With ?skip=k pose
+    estimation only runs on every k-th frame and "inferred" is false in between;
+    ?tier=lite|full|heavy and ?smooth=0 choose the Pose model as for /analyze.
+    Frames arriving faster than they can be analyzed are dropped, newest wins."""
+    current_exercise = (request.args.get("exercise") or "squat").lower()
+    response_mode = request.args.get("response", "json")
+    skip = request.args.get("skip", FRAME_SKIP, type=int)
+    tier = request.args.get("tier")
+    smooth = smoothing(request.args.get("smooth"))
+    try:
+        session = sessions.get(request.args.get("session_id"))
+    except SessionLimitError as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+
+    inbox = LatestFrame()
+    threading.Thread(target=receive_frames, args=(ws, inbox, current_exercise), daemon=True).start()
+
+    reps = 0
+    try:
+        while True:
+            item = inbox.take()
+            if item is None:
+                break
+            image_bytes, exercise = item
+            current_exercise = exercise
+            begin_timings()
+            try:
+                result, processed_frame, results = analyze_frame(
+                    session, current_exercise, decode_image(image_bytes), annotate=response_mode == "jpeg", skip=skip,
+                    tier=tier, smooth=smooth)
+            except Exception as e:
+                # Bad frames, a busy pool or a failing rule: report it, keep the stream open
+                stage_metrics.observe("analyze_stream", end_timings(), "error")
+                ws.send(json.dumps({"type": "error", "error": str(e)}))
+                continue
+
+            with stage("serialize"):
+                message = {"type": "feedback", "feedback": result.feedback, "inferred": result.inferred,
+                           "tier": result.tier}
+                if response_mode == "landmarks":
+                    message.update(landmarks_response(result, results))
+                message.update({"frames": inbox.received, "dropped": inbox.dropped, "invalid": inbox.invalid})
+                message = json.dumps(message)
+            ws.send(message)
+            if response_mode == "jpeg":
+                with stage("imencode"):
+                    _, buffer = cv2.imencode('.jpg', processed_frame)
+                ws.send(buffer.tobytes())
+            stage_metrics.observe("analyze_stream", end_timings(), "ok")
+
+            if result.rep_stats is not None:
+                ws.send(json.dumps({"type": "rep_stats", **result.rep_stats}))
+            if result.transition:
+                ws.send(json.dumps({"type": "phase", "phase": result.phase}))
+                if result.rep:
+                    reps += 1
+                    ws.send(json.dumps({"type": "rep", "count": reps}))
+    except ConnectionClosed:
+        pass
+    finally:
+        inbox.close()
+
+@app.route('/pool/metrics', methods=['GET'])
+def pool_metrics():
+    if pose_pool is None:
+        return jsonify({"workers": 0})
+    return jsonify(pose_pool.metrics())
+
+@app.before_request
+def start_stage_timings():
+    if request.endpoint in TIMED_ROUTES:
+        begin_timings()
+
+@app.after_request
+def record_stage_timings(response):
+    """Stage timings of the analysis routes go to /metrics and the Server-Timing header"""
+    timings = end_timings()
+    if timings is not None:
+        stage_metrics.observe(request.endpoint, timings, response.status_code)
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms of every analysis route,
+    plus pose pool, session and spoken cue counters"""
+    parts = [stage_metrics.render(),
+             render_metric("analysis_sessions", "gauge", "Live client sessions", [((), len(sessions))])]
+    if pose_pool is not None:
+        pool = pose_pool.metrics()
+        parts.append(render_metric("pose_pool_queue_depth", "gauge", "Frames waiting per pose worker",
+                                   [((("worker", index),), depth) for index, depth in enumerate(pool["queue_depth"])]))
+        for key, help_text in (("submitted", "Frames sent to the pose workers"),
+                               ("completed", "Frames the pose workers answered"),
+                               ("rejected", "Frames refused because a worker queue was full"),
+                               ("restarts", "Pose workers restarted after exiting")):
+            parts.append(render_metric(f"pose_pool_{key}_total", "counter", help_text, [((), pool[key])]))
+    cues = audio_queue.stats()
+    for key, help_text in (("played", "Spoken cues played"),
+                           ("coalesced", "Spoken cues merged into one already waiting"),
+                           ("dropped", "Spoken cues dropped as stale or crowded out"),
+                           ("cache_hits", "Spoken cues played from the PCM cache"),
+                           ("cache_misses", "Spoken cues that had to be synthesized")):
+        parts.append(render_metric(f"audio_cues_{key}_total", "counter", help_text, [((), cues[key])]))
+    analyses = analysis_queue.stats()
+    parts.append(render_metric("analysis_jobs_waiting", "gauge", "Analysis jobs queued for a worker",
+                               [((), analyses["waiting"])]))
+    for key, help_text in (("completed", "Analyses the model returned"),
+                           ("failed", "Analysis jobs that failed every attempt"),
+                           ("rejected", "Analysis jobs refused because the queue was full"),
+                           ("cache_hits", "Analyses served from the cache")):
+        parts.append(render_metric(f"analysis_jobs_{key}_total", "counter", help_text, [((), analyses[key])]))
+    return Response("".join(parts), mimetype="text/plain; version=0.0.4")
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once pose estimation is warm (or has answered a frame),
+    503 until then; "error" in the components is why warm-up failed"""
+    return jsonify({"ready": readiness["pose"], "components": readiness}), 200 if readiness["pose"] else 503
+
+def find_session(session_id):
+    """The live session with this id, or None. "<group id>#<track id>" (the "#" sent as
+    %23 in a URL) is one athlete of a group session's multi-person tracker."""
+    session = sessions.find(session_id)
+    if session is not None or "#" not in session_id:
+        return session
+    group_id, _, track_id = session_id.rpartition("#")
+    group_session = sessions.find(group_id)
+    if group_session is None or not track_id.isdigit():
+        return None
+    with group_session.lock:
+        track = group_session.group.tracks.get(int(track_id)) if group_session.group else None
+    return track.session if track is not None else None
+
+@app.route('/sessions/<session_id>/summary', methods=['GET'])
+def session_summary(session_id):
+    """Per-rep statistics, tempo and faults of the session's sets so far, by exercise"""
+    session = find_session(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+    with session.lock:
+        return jsonify({name: summary.to_dict() for name, summary in session.summaries.items()})
+
+@app.route('/sessions/<session_id>/reps', methods=['GET'])
+def session_reps(session_id):
+    """Segmented reps of the session by exercise: eccentric/concentric seconds, range of
+    motion and form score of each rep, plus the totals"""
+    session = find_session(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+    with session.lock:
+        return jsonify({name: {"reps": list(segmenter.reps), "totals": segmenter.totals()}
+                        for name, segmenter in session.rep_segmenters.items()})
+
+def set_summary_of(session_id, exercise):
+    """A live session's summary, which includes the rep in progress, else the saved one"""
+    session = find_session(session_id)
+    if session is not None:
+        with session.lock:
+            if exercise.name in session.summaries:
+                return session.summaries[exercise.name].to_dict()
+    return load_summary(exercise.name, session_id, exercise.log_file)
+
+@app.route('/start-gemini', methods=['POST'])
+def start_gemini():
+    """Start the spoken coach on a session's set: it analyzes the set summary, then
+    answers questions on this machine's microphone until told "exit" (or "listen": false
+    for the analysis only). Returns at once; the conversation runs on the coach loop."""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get("session_id") or request.headers.get("X-Session-ID") or DEFAULT_SESSION_ID
+    exercise_name = data.get("exercise", "squat").lower()
+    exercise = EXERCISES.get(exercise_name)
+    if exercise is None:
+        return jsonify({"error": f"Unknown exercise: {exercise_name}"}), 400
+    summary = set_summary_of(session_id, exercise)
+
+    def make_session():
+        return CoachSession(session_id, get_coach_client(), synthesizer, summary=summary, exercise=exercise_name,
+                            open_output=speaker_opener(TTS_SAMPLING_RATE),
+                            microphone=Microphone() if data.get("listen", True) else None)
+
+    try:
+        return jsonify(coach_service.start(session_id, make_session)), 202
+    except CoachLimitError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Coach unavailable: {e}"}), 503
+
+@app.route('/analysis', methods=['POST'])
+def submit_analysis():
+    """Queue the written analysis of a session's set. 200 with the result when the same
+    set was analyzed before, else 202 with a job id to poll at GET /analysis/<job_id>."""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get("session_id") or request.headers.get("X-Session-ID") or DEFAULT_SESSION_ID
+    exercise_name = data.get("exercise", "squat").lower()
+    exercise = EXERCISES.get(exercise_name)
+    if exercise is None:
+        return jsonify({"error": f"Unknown exercise: {exercise_name}"}), 400
+    summary = set_summary_of(session_id, exercise)
+    if not summary:
+        return jsonify({"error": "No set data for this session"}), 404
+    try:
+        job = analysis_queue.submit(analysis_key(summary, exercise_name), summary=summary, exercise=exercise_name)
+    except AnalysisBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    return jsonify(job.to_dict()), 200 if job.done.is_set() else 202
+
+@app.route('/analysis/<job_id>', methods=['GET'])
+def analysis_result(job_id):
+    """A job's status and, once done, the analysis. ?wait=<seconds> holds the request
+    until the job finishes (at most ANALYSIS_MAX_WAIT) instead of polling."""
+    job = analysis_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown analysis job"}), 404
+    wait = min(request.args.get("wait", 0, type=float), ANALYSIS_MAX_WAIT)
+    if wait > 0:
+        analysis_queue.wait(job, wait)
+    return jsonify(job.to_dict())
+
+@app.route('/sessions/<session_id>/coach', methods=['GET'])
+def coach_status(session_id):
+    """State of the session's coaching conversation: speaking, listening or done"""
+    status = coach_service.status(session_id)
+    if status is None:
+        return jsonify({"error": "No coaching conversation"}), 404
+    return jsonify(status)
+
+@app.route('/sessions/<session_id>/coach', methods=['DELETE'])
+def stop_coach(session_id):
+    return jsonify({"stopped": coach_service.stop(session_id)})
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    sessions.remove(session_id)
+    return jsonify({"status": "ended"})
+
 if __name__ == '__main__':
-    app.run(host="127.0.0.1", port=5000)
+    app.run(host="127.0.0.1", port=5000, threaded=True)
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+AUDIO_CACHE_DIR = "audio_cache"
+AUDIO_CACHE_BYTES = 64 * 1024 * 1024  # On-disk budget for synthesized PCM
+AUDIO_CACHE_MEMORY = 64  # Most recently played cues also kept in memory
+CUE_MAX_AGE = 2.0  # Seconds a cue may wait before it is too stale to say
+MAX_PENDING_CUES = 4
+
+# Cue priorities, lower plays first
+FAULT = 0
+COACHING = 1
+
+
+class NeuphonicSynthesizer:
+    """Text -> 16-bit mono PCM through Neuphonic's SSE endpoint. The client is created
+    on the first request, so importing this module does not load pyneuphonic."""
+
+    def __init__(self, api_key=None, lang_code="en", sampling_rate=22050):
+        self.api_key = api_key
+        self.lang_code = lang_code
+        self.sampling_rate = sampling_rate
+        self.voice_key = json.dumps({"engine": "neuphonic", "lang_code": lang_code,
+                                     "sampling_rate": sampling_rate}, sort_keys=True)
+        self._sse = None
+        self._tts_config = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self._sse is None:
+                from pyneuphonic import Neuphonic, TTSConfig
+                self._tts_config = TTSConfig(lang_code=self.lang_code, sampling_rate=self.sampling_rate)
+                self._sse = Neuphonic(api_key=self.api_key).tts.SSEClient()
+            return self._sse
+
+    def synthesize(self, text):
+        sse = self._connect()
+        return b"".join(message.data.audio for message in sse.send(text, tts_config=self._tts_config)
+                        if message.data.audio)
+
+
+class ToneSynthesizer:
+    """Local stand-in for tests and machines without a TTS key: one short beep per word,
+    pitched from the word, so every cue still has distinct, deterministic PCM"""
+
+    def __init__(self, sampling_rate=22050):
+        self.sampling_rate = sampling_rate
+        self.voice_key = f"tone-{sampling_rate}"
+
+    def synthesize(self, text):
+        beep = np.arange(int(0.08 * self.sampling_rate)) / self.sampling_rate
+        gap = np.zeros(int(0.02 * self.sampling_rate))
+        parts = []
+        for word in text.split():
+            frequency = 300 + zlib.crc32(word.lower().encode()) % 600
+            parts += [0.3 * np.sin(2 * math.pi * frequency * beep), gap]
+        samples = np.concatenate(parts) if parts else gap
+        return (samples * 32767).astype("<i2").tobytes()
+
+
+class PcmCache:
+    """Synthesized PCM on disk, one file per (text, voice config), least recently played
+    evicted first once the directory grows past max_bytes. File mtimes are the LRU order."""
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BYTES, memory_items=AUDIO_CACHE_MEMORY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".pcm"))
+
+    def path(self, text, voice_key):
+        digest = hashlib.sha256(f"{voice_key}\n{text}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pcm")
+
+    def get(self, text, voice_key):
+        path = self.path(text, voice_key)
+        with self._lock:
+            pcm = self._memory.get(path)
+            if pcm is not None:
+                self._memory.move_to_end(path)
+        if pcm is None:
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self._remember(path, pcm)
+        self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted meanwhile, the memory copy still plays
+        return pcm
+
+    def put(self, text, voice_key, pcm):
+        path = self.path(text, voice_key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pcm)
+        with self._lock:
+            try:
+                replaced = os.path.getsize(path)  # Overwriting a key: its old file stops counting
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            self._size += len(pcm) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+        self._remember(path, pcm)
+
+    def get_or_synthesize(self, text, synthesizer):
+        pcm = self.get(text, synthesizer.voice_key)
+        if pcm is None:
+            pcm = synthesizer.synthesize(text)
+            self.put(text, synthesizer.voice_key, pcm)
+        return pcm
+
+    def warm(self, texts, synthesizer):
+        """Synthesize every cue that is not cached yet; returns how many were added"""
+        added = 0
+        for text in texts:
+            if os.path.exists(self.path(text, synthesizer.voice_key)):
+                continue
+            try:
+                self.put(text, synthesizer.voice_key, synthesizer.synthesize(text))
+                added += 1
+            except Exception as e:
+                print(f"Audio cache warm-up failed for {text!r}: {e}")
+        return added
+
+    def _remember(self, path, pcm):
+        with self._lock:
+            self._memory[path] = pcm
+            self._memory.move_to_end(path)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith(".pcm"))
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            os.remove(path)
+            self._size -= size
+
+
+class Speaker:
+    """Audio output kept open for the life of the scheduler instead of one per cue"""
+
+    def __init__(self, sampling_rate):
+        from pyneuphonic.player import AudioPlayer
+
+        self.player = AudioPlayer(sampling_rate=sampling_rate)
+        self.player.open()
+
+    def play(self, pcm):
+        self.player.play(pcm)
+        self.player.audio_bytes = bytearray()  # AudioPlayer keeps everything it played otherwise
+
+    def close(self):
+        self.player.close()
+
+
+class CueScheduler:
+    """Spoken cues for the whole process, played one at a time on a background thread.
+
+    put() is a drop-in for the old audio_queue.put. A cue that is already waiting (or
+    playing) is not queued twice, cues older than max_age are dropped instead of spoken
+    late, and form faults play before coaching and encouragement. PCM comes from the
+    PcmCache, so a repeated cue needs no TTS round trip. The audio device is opened by
+    open_output (returning a Speaker, or None for silent) when the first cue plays."""
+
+    def __init__(self, synthesizer, cache=None, open_output=None, max_age=CUE_MAX_AGE,
+                 max_pending=MAX_PENDING_CUES):
+        self.synthesizer = synthesizer
+        self.cache = cache if cache is not None else PcmCache()
+        self.open_output = open_output
+        self.speaker = None
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self._pending = {}  # text -> (priority, queued at)
+        self._playing = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self.played = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._thread = None  # Started by the first cue
+
+    def put(self, text, priority=COACHING):
+        if text is None:
+            self.close()
+            return
+        with self._cond:
+            if text == self._playing:
+                self.coalesced += 1
+                return
+            if text in self._pending:
+                self.coalesced += 1
+                old_priority, _ = self._pending[text]
+                self._pending[text] = (min(old_priority, priority), time.monotonic())
+                return
+            self._pending[text] = (priority, time.monotonic())
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="cue-scheduler", daemon=True)
+                self._thread.start()
+            while len(self._pending) > self.max_pending:
+                # Least important first, the oldest of those
+                victim = max(self._pending, key=lambda t: (self._pending[t][0], -self._pending[t][1]))
+                del self._pending[victim]
+                self.dropped += 1
+            self._cond.notify()
+
+    def warm(self, texts):
+        """Pre-synthesize the known cues on a background thread"""
+        thread = threading.Thread(target=self.cache.warm, args=(list(texts), self.synthesizer), daemon=True)
+        thread.start()
+        return thread
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                for text, (_, queued) in list(self._pending.items()):
+                    if now - queued > self.max_age:
+                        del self._pending[text]
+                        self.dropped += 1
+                if self._pending:
+                    # Highest priority, newest first: the latest fault is the relevant one
+                    text = min(self._pending, key=lambda t: (self._pending[t][0], -self._pending[t][1]))
+                    del self._pending[text]
+                    self._playing = text
+                    return text
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            text = self._next()
+            if text is None:
+                break
+            if self.open_output is not None:
+                self.speaker = self.open_output()
+                self.open_output = None
+            try:
+                pcm = self.cache.get_or_synthesize(text, self.synthesizer)
+                if self.speaker is not None:
+                    self.speaker.play(pcm)
+                self.played += 1
+            except Exception as e:
+                print(f"Audio error: {e}")
+            finally:
+                with self._cond:
+                    self._playing = None
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "played": self.played,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+    def close(self, timeout=2):
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.speaker is not None:
+            self.speaker.close()
+
+
+def speaker_opener(sampling_rate):
+    """open_output for CueScheduler: a Speaker, or None (cues are still scheduled and
+    cached) when there is no audio device"""
+    def open_output():
+        try:
+            return Speaker(sampling_rate)
+        except Exception as e:
+            print(f"Audio output unavailable: {e}")
+            return None
+    return open_output
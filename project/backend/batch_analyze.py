@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from exercises import EXERCISES
+from frame_skipping import FrameSkipper
+from kinematics import to_pixels
+from pose_pool import PosePool, POSE_OPTIONS, POSE_WORKERS
+from pose_roi import RegionOfInterest
+from pose_tiers import POSE_TIERS, pose_options
+from session_recording import SessionRecorder
+from rep_segmentation import RepSegmenter
+from session_summary import SetSummary
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DECODE_AHEAD = 32  # Decoded frames buffered per input
+IMAGE_FPS = 30  # Frame rate assumed for image directories
+BATCH_POSE_TIMEOUT = 60  # Seconds; generous, workers share the cores with the decoders
+
+
+def collect_inputs(paths):
+    """Expand the command line into (name, path, kind) inputs. A directory of videos
+    becomes one input per video; a directory of images is one image sequence."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.listdir(path))
+            videos = [f for f in files if f.lower().endswith(VIDEO_EXTENSIONS)]
+            inputs += [(os.path.join(path, f), "video") for f in videos]
+            if any(f.lower().endswith(IMAGE_EXTENSIONS) for f in files):
+                inputs.append((path, "images"))
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            inputs.append((path, "video"))
+        else:
+            raise SystemExit(f"Not a video or image directory: {path}")
+
+    named, seen = [], Counter()
+    for path, kind in inputs:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        seen[name] += 1
+        named.append((name if seen[name] == 1 else f"{name}-{seen[name]}", path, kind))
+    return named
+
+
+def read_frames(path, kind, frames, stop, fps=IMAGE_FPS):
+    """Decode thread: puts (index, timestamp, frame) on the bounded frames queue, then None,
+    or the exception decoding failed with. Gives up as soon as stop is set, so an input
+    whose analysis failed does not leave it blocked on a full queue."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    capture = None
+    end = None
+    try:
+        if kind == "video":
+            capture = cv2.VideoCapture(path)
+            if not capture.isOpened():
+                raise OSError(f"Could not open video: {path}")
+            video_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+            index = 0
+            while True:
+                ok, frame = capture.read()
+                if not ok or not put((index, index / video_fps, frame)):
+                    break
+                index += 1
+        else:
+            images = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+            for index, filename in enumerate(images):
+                frame = cv2.imread(os.path.join(path, filename))
+                if frame is not None and not put((index, index / fps, frame)):
+                    break
+    except Exception as e:
+        end = e
+    finally:
+        if capture is not None:
+            capture.release()
+        put(end)
+
+
+def analyze_input(pool, exercise, name, path, kind, out_dir, skip=1, fps=IMAGE_FPS, tier=None):
+    """Score one video or image sequence frame by frame with the exercise's rules.
+    Writes <name>.rec (landmarks, same format as live sessions), <name>.jsonl
+    (one line per frame) and <name>.summary.json (per-rep statistics, as the coach
+    gets them for live sessions) to out_dir and returns the summary. tier picks the Pose model,
+    default the exercise's; there is no latency budget offline, so it never steps down."""
+    options = pose_options(POSE_OPTIONS, tier or exercise.pose_tier)
+    frames = queue.Queue(DECODE_AHEAD)
+    stop = threading.Event()
+    threading.Thread(target=read_frames, args=(path, kind, frames, stop, fps), name=f"decode-{name}",
+                     daemon=True).start()
+
+    rec_path = os.path.join(out_dir, f"{name}.rec")
+    if os.path.exists(rec_path):
+        os.remove(rec_path)
+    state = exercise.new_state()
+    set_summary = SetSummary(exercise, name)
+    segmenter = RepSegmenter(exercise, history=None) if exercise.rep_spec is not None else None
+    roi = RegionOfInterest()
+    skipper = FrameSkipper(skip) if skip > 1 else None
+    recorder = None
+    reps = 0
+    faults = Counter()
+    frame_count = pose_frames = 0
+    start = time.perf_counter()
+
+    try:
+        with open(os.path.join(out_dir, f"{name}.jsonl"), "w") as lines:
+            while True:
+                item = frames.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                index, timestamp, frame = item
+                if recorder is None:
+                    recorder = SessionRecorder(rec_path, exercise.name, frame.shape, name)
+
+                inferred = skipper is None or skipper.should_infer(frame, timestamp)
+                if inferred:
+                    landmarks = roi.estimate(frame, lambda image: pool.process(path, image, BATCH_POSE_TIMEOUT, options))
+                    if skipper is not None:
+                        skipper.update(frame, timestamp, landmarks)
+                else:
+                    landmarks = skipper.predict(timestamp)
+
+                entry = {"frame": index, "t": round(timestamp, 3), "inferred": inferred}
+                if landmarks is None:
+                    recorder.record(timestamp, np.full((33, 4), np.nan))
+                    entry.update({"pose": False, "phase": state.phase})
+                else:
+                    result = exercise.evaluate(to_pixels(landmarks, frame.shape), state, frame.shape)
+                    set_summary.update(result, timestamp)
+                    rep_stats = segmenter.update(result.features, timestamp, result.faults) if segmenter else None
+                    if result.logs:
+                        recorder.mark_feedback(result.logs[-1][0])
+                    recorder.record(timestamp, landmarks)
+                    pose_frames += result.pose
+                    reps += result.rep
+                    faults.update(result.faults)
+                    entry.update({
+                        "pose": result.pose,
+                        "phase": result.phase,
+                        "feedback": result.feedback,
+                        "faults": result.faults,
+                        "rep": result.rep,
+                        "reps": reps,
+                        "features": {k: round(v, 1) for k, v in result.features.items() if v is not None},
+                    })
+                    if rep_stats is not None:
+                        entry["rep_stats"] = rep_stats
+                lines.write(json.dumps(entry) + "\n")
+                frame_count += 1
+    finally:
+        stop.set()
+        pool.release(path)
+    if recorder is not None:
+        recorder.flush()
+    set_summary.save(os.path.join(out_dir, f"{name}.summary.json"))
+    elapsed = time.perf_counter() - start
+    return {
+        "name": name,
+        "input": path,
+        "exercise": exercise.name,
+        "tier": tier or exercise.pose_tier,
+        "frames": frame_count,
+        "pose_frames": pose_frames,
+        "reps": reps,
+        "faults": dict(faults),
+        "segmented_reps": segmenter.totals() if segmenter else None,
+        "seconds": round(elapsed, 2),
+        "fps": round(frame_count / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-score recorded workouts offline: per-frame landmarks, rep counts and faults "
+                    "from the same rules the live app uses.")
+    parser.add_argument("inputs", nargs="+", help="video files, directories of videos, or image directories")
+    parser.add_argument("--exercise", required=True, choices=sorted(EXERCISES))
+    parser.add_argument("--out", default="batch_results", help="output directory (default: batch_results)")
+    parser.add_argument("--workers", type=int, default=max(1, POSE_WORKERS),
+                        help="pose estimation processes (default: POSE_WORKERS, one per core)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="inputs analyzed at the same time (default: --workers)")
+    parser.add_argument("--skip", type=int, default=1, help="run pose estimation on every k-th frame")
+    parser.add_argument("--tier", choices=list(POSE_TIERS), default=None,
+                        help="pose model tier (default: the exercise's)")
+    parser.add_argument("--fps", type=float, default=IMAGE_FPS, help="frame rate of image directories")
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.inputs)
+    os.makedirs(args.out, exist_ok=True)
+    exercise = EXERCISES[args.exercise]
+    # Tracking needs a video's frames in order on one Pose, so the cores are
+    # spread over inputs: each input sticks to a worker for its whole length.
+    pool = PosePool(args.workers)
+    pool.start()
+    # Each input has one frame in flight; more inputs than the worker queues hold
+    # would have frames rejected as busy
+    max_jobs = pool.size * pool.queue_size
+    jobs_wanted = args.jobs or args.workers
+    if jobs_wanted > max_jobs:
+        print(f"--jobs {jobs_wanted} capped at {max_jobs} (workers x queue size)")
+    summaries = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(jobs_wanted, max_jobs)) as executor:
+            jobs = [(name, executor.submit(analyze_input, pool, exercise, name, path, kind, args.out, args.skip,
+                                           args.fps, args.tier))
+                    for name, path, kind in inputs]
+            for name, job in jobs:
+                # One unreadable input or pose timeout must not lose the other results
+                try:
+                    summary = job.result()
+                except Exception as e:
+                    summaries.append({"name": name, "error": str(e) or type(e).__name__})
+                    print(f"{name}: failed: {e}")
+                    continue
+                summaries.append(summary)
+                print(f"{summary['name']}: {summary['frames']} frames, {summary['reps']} reps, "
+                      f"faults {summary['faults']}, {summary['fps']} fps")
+    finally:
+        pool.close()
+        with open(os.path.join(args.out, "summary.json"), "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
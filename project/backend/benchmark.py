@@ -0,0 +1,260 @@
+import argparse
+import base64
+import gc
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(BACKEND_DIR, "..", "frontend", "assets", "images")
+CORPUS = {"squat": "squat.jpg", "pushup": "pushup.jpg", "bicep": "bicep.jpg"}  # Exercise -> corpus image
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmark_baseline.json")
+PROCESSOR_FRAME_SIZE = 640  # Longest side of the frames the processors draw on
+SYNTHETIC_FRAMES = 300  # Frames per synthetic landmark stream, 10 s at 30 fps
+SYNTHETIC_FPS = 30
+ANALYZE_REQUESTS = 30  # /analyze requests per corpus image
+WARMUP_CALLS = 10  # Untimed calls before each benchmark
+REPEAT = 3  # Timed rounds per benchmark, the best one is reported
+REGRESSION_TOLERANCE = 0.15  # Relative slowdown of fps or p50 reported as a regression
+SEED = 1234
+
+
+def load_corpus(max_side=None):
+    frames = {}
+    for exercise, filename in CORPUS.items():
+        frame = cv2.imread(os.path.join(IMAGE_DIR, filename))
+        if frame is None:
+            raise SystemExit(f"Missing benchmark image {filename} in {IMAGE_DIR}")
+        if max_side and max(frame.shape[:2]) > max_side:
+            scale = max_side / max(frame.shape[:2])
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frames[exercise] = frame
+    return frames
+
+
+def corpus_landmarks(frames):
+    """(33, 4) normalized landmarks of each corpus frame, from one static-image Pose run"""
+    from kinematics import landmarks_to_array
+    from pose_tiers import create_pose
+
+    landmarks = {}
+    with create_pose({"static_image_mode": True}) as pose:
+        for exercise, frame in frames.items():
+            found = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).pose_landmarks
+            if found is None:
+                raise SystemExit(f"No pose found in the {exercise} benchmark image")
+            landmarks[exercise] = landmarks_to_array(found)
+    return landmarks
+
+
+def synthetic_stream(landmarks, frames=SYNTHETIC_FRAMES, seed=SEED):
+    """Deterministic landmark stream around a real pose: the upper body moves towards
+    and away from the hips in 2 s repetitions (so joint angles sweep through the
+    phases) with a little seeded jitter, visibility unchanged. (frames, 33, 4)."""
+    rng = np.random.default_rng(seed)
+    hips = landmarks[[23, 24], :2].mean(axis=0)
+    t = np.arange(frames) / SYNTHETIC_FPS
+    squeeze = 0.3 * (1 - np.cos(np.pi * t)) / 2  # 0 .. 0.3 and back every 2 s
+    stream = np.repeat(landmarks[np.newaxis], frames, axis=0).astype(np.float64)
+    stream[:, :, :2] = hips + (stream[:, :, :2] - hips) * (1 - squeeze[:, np.newaxis, np.newaxis])
+    stream[:, :, :3] += rng.normal(0, 0.002, stream[:, :, :3].shape)
+    return stream
+
+
+def measure(name, call, inputs, repeat=REPEAT, warmup=WARMUP_CALLS):
+    """Time call(item) over inputs, repeat times: frames per second, p50/p99 latency of
+    the fastest round (the others only add scheduler and cache noise) and the peak RSS
+    of the process so far"""
+    for item in inputs[:warmup]:
+        call(item)
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        latencies = []
+        start = time.perf_counter()
+        for item in inputs:
+            call_start = time.perf_counter()
+            call(item)
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = elapsed, np.array(latencies) * 1000
+    elapsed, latencies = best
+    return {
+        "name": name,
+        "frames": len(inputs),
+        "fps": round(len(inputs) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def session_call(exercise, frame, annotate, cues):
+    """call(pose results) running the exercise's rules like a live session does: one
+    ExerciseState across all calls, so phases and log cooldowns carry over, and a clock
+    that keeps running from round to round"""
+    from exercise_rules import process_exercise
+
+    state = exercise.new_state()
+    clock = itertools.count()
+
+    def call(results):
+        # Drawing happens in place, so the annotated runs draw on a fresh copy (included in the time)
+        image = frame.copy() if annotate else frame
+        return process_exercise(exercise, image, results, state, next(clock) / SYNTHETIC_FPS, cues, 3, annotate)
+
+    return call
+
+
+def processor_benchmarks(frames, landmarks, stream_frames):
+    """(name, call, inputs) for each exercise's rules through process_exercise, the path
+    the app runs, on synthetic landmark streams, with drawing ("annotated") and without
+    ("rules")"""
+    from exercises import EXERCISES
+    from kinematics import PoseResults
+    from landmark_replay import NullCueQueue
+
+    cues = NullCueQueue()
+    for name in CORPUS:
+        items = [PoseResults(points) for points in synthetic_stream(landmarks[name], stream_frames)]
+        yield f"rules_{name}", session_call(EXERCISES[name], frames[name], False, cues), items
+        yield f"annotated_{name}", session_call(EXERCISES[name], frames[name], True, cues), items
+
+
+def analyze_benchmarks(requests):
+    """(name, call, inputs) for the full /analyze and /analyze/frame routes through the
+    Flask test client, pose estimation in-process, on the original corpus images. The
+    model tier is pinned to the bundled full model so results do not depend on which
+    models a machine has downloaded."""
+    import app as backend
+    from landmark_replay import NullCueQueue
+
+    backend.audio_queue = NullCueQueue()
+    client = backend.app.test_client()
+    for exercise, filename in CORPUS.items():
+        with open(os.path.join(IMAGE_DIR, filename), "rb") as f:
+            image_bytes = f.read()
+        body = {"image": "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode(),
+                "exercise": exercise, "session_id": f"bench-json-{exercise}", "tier": "full"}
+
+        def post_json(_, body=body):
+            response = client.post("/analyze", json=body)
+            assert response.status_code == 200, response.get_json()
+
+        def post_frame(_, image_bytes=image_bytes, exercise=exercise):
+            response = client.post(f"/analyze/frame?exercise={exercise}&response=landmarks&tier=full"
+                                   f"&session_id=bench-frame-{exercise}",
+                                   data=image_bytes, content_type="image/jpeg")
+            assert response.status_code == 200, response.get_json()
+
+        yield f"analyze_{exercise}", post_json, list(range(requests))
+        yield f"analyze_frame_landmarks_{exercise}", post_frame, list(range(requests))
+
+
+def compare(results, baseline, tolerance):
+    """Relative change against the baseline per benchmark; regressions are fps drops or
+    p50 increases beyond the tolerance"""
+    regressions = []
+    for result in results:
+        base = baseline.get("results", {}).get(result["name"])
+        if base is None:
+            result["vs_baseline"] = None
+            continue
+        change = {
+            "fps": round(result["fps"] / base["fps"] - 1, 3),
+            "p50_ms": round(result["p50_ms"] / base["p50_ms"] - 1, 3),
+            "p99_ms": round(result["p99_ms"] / base["p99_ms"] - 1, 3),
+        }
+        result["vs_baseline"] = change
+        if change["fps"] < -tolerance or change["p50_ms"] > tolerance:
+            regressions.append(result["name"])
+    return regressions
+
+
+def environment():
+    import mediapipe
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "mediapipe": mediapipe.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def report(results):
+    print(f"{'benchmark':34} {'fps':>9} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8}  vs baseline (fps / p50)")
+    for result in results:
+        change = result.get("vs_baseline")
+        versus = "-" if change is None else f"{change['fps']:+.1%} / {change['p50_ms']:+.1%}"
+        print(f"{result['name']:34} {result['fps']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9} "
+              f"{result['peak_rss_mb']:>8}  {versus}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the exercise processors on synthetic landmark streams and the /analyze "
+                    "routes on the bundled squat, push-up and bicep images. Runs offline: spoken cues go "
+                    "to a null queue and pose estimation runs in-process.")
+    parser.add_argument("--only", default=None, help="run only benchmarks whose name contains this")
+    parser.add_argument("--frames", type=int, default=SYNTHETIC_FRAMES, help="frames per synthetic stream")
+    parser.add_argument("--requests", type=int, default=ANALYZE_REQUESTS, help="requests per image and route")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed rounds per benchmark, best one reported")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="relative fps drop / p50 increase counted as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when something regressed")
+    parser.add_argument("--out", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Before the backend is imported: in-process pose, no warm-up thread, no recordings,
+    # no TTS. Logs the processors write land in a scratch directory.
+    os.environ.update({"POSE_WORKERS": "0", "WARM_UP": "0", "RECORD_SESSIONS": "0", "TTS_BACKEND": "local"})
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="benchmark-"))
+
+    frames = load_corpus(PROCESSOR_FRAME_SIZE)
+    landmarks = corpus_landmarks(frames)
+    benchmarks = [processor_benchmarks(frames, landmarks, args.frames)]
+    if args.only is None or "analyze" in args.only:
+        benchmarks.append(analyze_benchmarks(args.requests))  # Imports the app, so only when selected
+    results = [measure(name, call, inputs, args.repeat) for group in benchmarks for name, call, inputs in group
+               if args.only is None or args.only in name]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    report(results)
+
+    summary = {"environment": environment(), "results": {result.pop("name"): result for result in results}}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.save_baseline:
+        for result in summary["results"].values():
+            result.pop("vs_baseline", None)
+        with open(args.baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    if regressions:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
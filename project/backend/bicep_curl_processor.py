@@ -1,109 +1,94 @@
-import cv2
-import numpy as np
-import mediapipe as mp
-from datetime import datetime
-import json
-import time
+from kinematics import PoseLandmark
+from exercise_rules import CompiledExercise, ExerciseState, process_exercise
 
-def log_feedback(feedback_type, coordinates):
-    entry = {
-        "timestamp": datetime.now().isoformat(),
-        "feedback": feedback_type,
-        "coordinates": coordinates
-    }
-    with open("bicep_log.txt", "a") as f:
-        f.write(json.dumps(entry) + "\n")
-
-def calculate_angle(a, b, c):
-    a = np.array(a[:2])
-    b = np.array(b[:2])
-    c = np.array(c[:2])
-    
-    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-    angle = np.abs(np.degrees(radians))
-    
-    return angle if angle <= 180 else 360 - angle
-
-def get_landmark_point(landmark, frame_shape):
-    return [landmark.x * frame_shape[1],
-            landmark.y * frame_shape[0],
-            landmark.z]
-
-def process_bicep_curl(frame, results, mp_pose, last_audio_time, audio_queue, bicep_phase, current_time, AUDIO_COOLDOWN):
-    feedback = "No pose detected"
-    frame_shape = frame.shape
-    annotated_frame = frame.copy()
-    perfect_form_flag = False
-
-    if results.pose_landmarks:
-        landmarks = results.pose_landmarks.landmark
-
-        # Get landmarks
-        shoulderL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER], frame_shape)
-        elbowL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_ELBOW], frame_shape)
-        wristL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_WRIST], frame_shape)
-        hipL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_HIP], frame_shape)
-
-        # Calculate angles
-        elbow_angle = int(calculate_angle(shoulderL, elbowL, wristL))
-        back_lean = abs(shoulderL[0] - hipL[0]) / frame_shape[1] * 100  # Percentage
-
-        # Bicep curl logic
-        feedback_given = False
-        ELBOW_RANGE = {'down': 170, 'up': 30}
-        BACK_LEAN_THRESHOLD = 10  # Changed from 15 to 10 (more sensitive)
-        
-        if elbow_angle > ELBOW_RANGE['down']:
-            bicep_phase = "down"
-        elif elbow_angle < ELBOW_RANGE['up'] and bicep_phase == "down":
-            bicep_phase = "up"
-            audio_queue.put(f"Rep counted")
-            log_feedback("rep_completed", {
-                "elbow_angle": elbow_angle,
-                "joints": {
-                    "shoulder": shoulderL,
-                    "elbow": elbowL,
-                    "wrist": wristL
-                }
-            })
+# Bicep curl thresholds
+ELBOW_RANGE = {'down': 170, 'up': 30}
+LIFT_TOLERANCE = 20  # Degrees above the top of the curl still counted as good form
+BACK_LEAN_THRESHOLD = 10  # Changed from 15 to 10 (more sensitive)
+REP_REST_ANGLE = 160  # Elbow angle of a hanging arm, for rep segmentation
+LOG_COOLDOWN = 0.5  # Seconds between log lines of one feedback type; "lift higher" and "good form" hold for many frames
 
+BICEP_CURL = {
+    "name": "bicep",
+    "log_file": "bicep_log.txt",
+    "log_cooldown": LOG_COOLDOWN,
+    # One elbow angle over a large range, the lite model is accurate enough
+    "pose_tier": "lite",
+    # "down" = arm extended, "up" = curled
+    "initial_phase": "down",
+    "rep_transition": ("down", "up"),
+    "default_feedback": "No pose detected",
+    "required_features": ["elbow_left"],
+    "features": {
+        "elbow_left": {"angle": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST)},
+        # Horizontal shoulder-hip offset as a percentage of the frame width
+        "back_lean": {"linear": [(PoseLandmark.LEFT_SHOULDER, "x", 1), (PoseLandmark.LEFT_HIP, "x", -1)],
+                      "abs": True, "unit": "percent_width"},
+    },
+    # Per-rep extremes for the set summary: top of the curl and the largest back lean
+    "summary": {"elbow_left": "min", "back_lean": "max"},
+    # Curling up is the concentric half. "Lift higher" fires on every lowering, so only
+    # back lean costs form points; a short curl already shows in the range of motion.
+    "reps": {"signal": "elbow_left", "rest": REP_REST_ANGLE, "bottom": ELBOW_RANGE['up'] + LIFT_TOLERANCE,
+             "first_half": "concentric", "score_faults": ["back_lean"]},
+    "conditions": {
+        "extended": [("elbow_left", ">", ELBOW_RANGE['down'])],
+        "curled": [("elbow_left", "<", ELBOW_RANGE['up'])],
+        "low": [("elbow_left", ">", ELBOW_RANGE['up'] + LIFT_TOLERANCE)],
+        "leaning": [("back_lean", ">", BACK_LEAN_THRESHOLD)],
+    },
+    "rules": [
+        {"name": "arm_extended", "when": "extended", "to": "down", "stop": False},
+        {"phase": "down", "when": "curled", "to": "up", "stop": False,
+         "cue": "Rep counted", "cue_cooldown": False,
+         "log": "rep_completed", "data": {
+             "elbow_angle": "elbow_left",
+             "joints": {
+                 "shoulder": PoseLandmark.LEFT_SHOULDER,
+                 "elbow": PoseLandmark.LEFT_ELBOW,
+                 "wrist": PoseLandmark.LEFT_WRIST
+             }
+         }},
         # Feedback conditions
-        if bicep_phase == "up" and elbow_angle > ELBOW_RANGE['up'] + 20:
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                audio_queue.put("Lift higher")
-                last_audio_time = current_time
-                log_feedback("lift_higher", {
-                    "elbow_angle": elbow_angle,
-                    "elbow_position": elbowL,
-                    "wrist_position": wristL
-                })
-                feedback = "Lift Higher!"
-                feedback_given = True
-
-        if back_lean > BACK_LEAN_THRESHOLD:  # Updated threshold
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN and not feedback_given:
-                audio_queue.put("Keep your back straight")
-                last_audio_time = current_time
-                log_feedback("back_lean", {
-                    "shoulder_hip_diff": back_lean,
-                    "shoulder_position": shoulderL,
-                    "hip_position": hipL
-                })
-                feedback = "Keep Back Straight!"
-                feedback_given = True
-
-        if not feedback_given and bicep_phase == "up" and elbow_angle <= ELBOW_RANGE['up'] + 20:
-            feedback = "Good form!"
-            log_feedback("good_form", {
-                "elbow_angle": elbow_angle,
-                "back_lean": back_lean
-            })
+        {"phase": "up", "when": "low", "fault": True,
+         "feedback": "Lift Higher!", "cue": "Lift higher",
+         "log": "lift_higher", "data": {
+             "elbow_angle": "elbow_left",
+             "elbow_position": PoseLandmark.LEFT_ELBOW,
+             "wrist_position": PoseLandmark.LEFT_WRIST
+         }},
+        {"when": "leaning", "fault": True,
+         "feedback": "Keep Back Straight!", "cue": "Keep your back straight",
+         "log": "back_lean", "data": {
+             "shoulder_hip_diff": "back_lean",
+             "shoulder_position": PoseLandmark.LEFT_SHOULDER,
+             "hip_position": PoseLandmark.LEFT_HIP
+         }},
+        {"phase": "up", "when": "not low",
+         "feedback": "Good form!",
+         "log": "good_form", "data": {"elbow_angle": "elbow_left", "back_lean": "back_lean"}},
+    ],
+    "overlay": {
+        "feedback": {"org": (10, 30), "scale": 1, "color": (0, 255, 0), "thickness": 2},
+        "labels": [
+            {"text": "Elbow: {elbow_left}°", "org": (10, 60), "scale": 0.7, "color": (255, 255, 255)},
+            {"text": "Back Lean: {back_lean}%", "org": (10, 90), "scale": 0.5, "color": (255, 255, 0),
+             "thickness": 1},
+        ],
+    },
+}
 
-        # Visualization
-        cv2.putText(annotated_frame, feedback, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(annotated_frame, f'Elbow: {elbow_angle}°', (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(annotated_frame, f'Back Lean: {int(back_lean)}%', (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-        mp.solutions.drawing_utils.draw_landmarks(
-            annotated_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+bicep_exercise = CompiledExercise(BICEP_CURL)
 
-    return feedback, annotated_frame, bicep_phase, last_audio_time
\ No newline at end of file
+def process_bicep_curl(frame, results, mp_pose, last_audio_time, audio_queue, bicep_phase, current_time, AUDIO_COOLDOWN,
+                       annotate=True, angles=None, session_id=None, state=None):
+    """Bicep curl through the shared rule engine, keeping the original call signature. Pass
+    the same ExerciseState as state on every call to keep log cooldowns between frames."""
+    state = state if state is not None else ExerciseState(bicep_phase)
+    state.phase = bicep_phase
+    state.last_audio_time = last_audio_time
+    result, frame = process_exercise(bicep_exercise, frame, results, state, current_time, audio_queue,
+                                     AUDIO_COOLDOWN, annotate, session_id)
+    if angles is not None and result.pose:
+        angles.update(result.features)
+    return result.feedback, frame, state.phase, state.last_audio_time
@@ -3,10 +3,7 @@ import cv2
 import numpy as np
 import os
 import time
-import threading
-import queue
-from pyneuphonic import Neuphonic, TTSConfig
-from pyneuphonic.player import AudioPlayer
+from audio_cues import CueScheduler, NeuphonicSynthesizer, PcmCache, FAULT, speaker_opener
 import dotenv 
 
 dotenv.load_dotenv()
@@ -15,31 +12,12 @@ dotenv.load_dotenv()
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
-# Neuphonic TTS setup
-client = Neuphonic(api_key=os.environ.get('NEUPHONIC_API_KEY'))
-sse = client.tts.SSEClient()
-tts_config = TTSConfig(lang_code='en', sampling_rate=22050)
-
-# Audio queue and threading setup
-audio_queue = queue.Queue()
+# Spoken cues through Neuphonic TTS: coalesced, faults first, PCM cached on disk
+audio_queue = CueScheduler(NeuphonicSynthesizer(os.environ.get('NEUPHONIC_API_KEY'), 'en', 22050), PcmCache(),
+                           speaker_opener(22050))
 last_audio_time = 0
 AUDIO_COOLDOWN = 3  # Seconds between audio cues
-
-def audio_worker():
-    while True:
-        message = audio_queue.get()
-        if message is None:
-            break
-        try:
-            with AudioPlayer(sampling_rate=22050) as player:
-                response = sse.send(message, tts_config=tts_config)
-                player.play(response)
-        except Exception as e:
-            print(f"Audio error: {e}")
-        audio_queue.task_done()
-
-audio_thread = threading.Thread(target=audio_worker, daemon=True)
-audio_thread.start()
+audio_queue.warm(["Go lower", "Lean forward too much", "Left knee in", "Right knee in", "Good form, go up"])
 
 # --- Utility Functions ---
 def calculate_angle(a, b, c):
@@ -121,7 +99,7 @@ try:
                 # Check depth first
                 if not current_depth_met:
                     if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                        audio_queue.put("Go lower")
+                        audio_queue.put("Go lower", FAULT)
                         last_audio_time = current_time
                         cv2.putText(image, "Go Lower!", (10, 120), 
                                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
@@ -129,14 +107,14 @@ try:
                         perfect_form_flag = False
                 elif angleBack < back_lean_threshold:
                     if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                        audio_queue.put("Lean forward too much")
+                        audio_queue.put("Lean forward too much", FAULT)
                         last_audio_time = current_time
                         cv2.putText(image, "Lean Forward Too Much!", (10, 90), 
                                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                         feedback_given = True
                 elif knee_valgus_left:
                     if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                        audio_queue.put("Left knee in")
+                        audio_queue.put("Left knee in", FAULT)
                         last_audio_time = current_time
                         cv2.putText(image, "Left Knee In!", 
                                     (int(kneeL[0] - 50), int(kneeL[1])),
@@ -144,7 +122,7 @@ try:
                         feedback_given = True
                 elif knee_valgus_right:
                     if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                        audio_queue.put("Right knee in")
+                        audio_queue.put("Right knee in", FAULT)
                         last_audio_time = current_time
                         cv2.putText(image, "Right Knee In!", 
                                     (int(kneeR[0] - 50), int(kneeR[1])),
@@ -211,19 +189,8 @@ finally:
     # Cleanup process
     print("Shutting down...")
     
-    # Clear audio queue
-    while not audio_queue.empty():
-        try:
-            audio_queue.get_nowait()
-            audio_queue.task_done()
-        except queue.Empty:
-            break
-    
-    # Signal audio thread to exit
-    audio_queue.put(None)
-    
-    # Wait for audio thread to finish
-    audio_thread.join(timeout=2)
+    # Drop pending cues and stop the audio thread
+    audio_queue.close()
     
     # Release resources
     if cap.isOpened():
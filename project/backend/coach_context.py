@@ -0,0 +1,113 @@
+import json
+import os
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("COACH_CONTEXT_TOKENS", "1500"))  # Past turns + their summary
+SESSION_TOKEN_BUDGET = int(os.environ.get("COACH_SESSION_TOKENS", "1500"))  # Set summary in every prompt
+HISTORY_SUMMARY_TOKENS = 300  # Rolling summary of the folded turns
+MIN_RECENT_TURNS = 2  # Latest exchanges always kept word for word
+CHARS_PER_TOKEN = 4  # Rough English average, close enough for budgeting
+
+HISTORY_SUMMARY_PROMPT = """Summarize this coaching conversation for the coach's own notes in at most {words} words. Keep the athlete's questions, the advice given, numbers that were discussed and anything the athlete said about themselves. No preamble.
+
+{text}"""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def compact_session_summary(summary, max_tokens=SESSION_TOKEN_BUDGET):
+    """The set summary as compact JSON within max_tokens: per-rep details and fault
+    events are cut to the most recent ones until it fits, the set totals always stay"""
+    summary = dict(summary)
+    for key in ("rep_details", "recent_fault_events"):
+        if isinstance(summary.get(key), list):
+            summary[key] = list(summary[key])
+    while True:
+        text = json.dumps(summary, separators=(",", ":"))
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        lists = [key for key in ("rep_details", "recent_fault_events") if summary.get(key)]
+        if not lists:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        longest = max(lists, key=lambda key: len(summary[key]))
+        summary[longest] = summary[longest][len(summary[longest]) // 2 + 1:] if len(summary[longest]) > 1 else []
+
+
+class CoachContext:
+    """What the coach model sees each turn, kept to a fixed size however long the chat runs.
+
+    The prompt is the system prompt, the session analysis (attached once, as compact JSON
+    rendered a single time), a rolling summary of older exchanges and the latest
+    exchanges word for word. When the exchanges outgrow the token budget the oldest ones
+    are folded into the rolling summary by `summarize(prompt) -> text` (one extra model
+    call per fold, not per turn); without it, or if it fails, the rolling summary is
+    the most recent part of their transcript instead."""
+
+    def __init__(self, system_prompt, summarize=None, budget=CONTEXT_TOKEN_BUDGET,
+                 session_budget=SESSION_TOKEN_BUDGET):
+        self.system_prompt = system_prompt
+        self.summarize = summarize
+        self.budget = budget
+        self.session_budget = session_budget
+        self.session = None
+        self.history_summary = ""
+        self.turns = []  # (user, coach)
+        self.folds = 0
+
+    def attach_session(self, summary):
+        """Attach the session analysis; a dict is rendered to compact JSON once, here"""
+        if summary is None:
+            self.session = None
+        elif isinstance(summary, str):
+            self.session = summary[:self.session_budget * CHARS_PER_TOKEN]
+        else:
+            self.session = compact_session_summary(summary, self.session_budget)
+
+    def prompt(self, user_input):
+        parts = [self.system_prompt]
+        if self.session:
+            parts.append(f"Session data:\n{self.session}")
+        if self.history_summary:
+            parts.append(f"Earlier in this conversation:\n{self.history_summary}")
+        for user, coach in self.turns:
+            parts.append(f"User: {user}\nCoach: {coach}")
+        parts.append(f"User: {user_input}")
+        return "\n\n".join(parts)
+
+    def add_turn(self, user_input, response):
+        self.turns.append((user_input, response))
+        if self._history_tokens() > self.budget:
+            self._fold()
+
+    def _history_tokens(self):
+        return estimate_tokens(self.history_summary) + sum(estimate_tokens(user) + estimate_tokens(coach)
+                                                           for user, coach in self.turns)
+
+    def _fold(self):
+        """Fold the oldest turns into the rolling summary until the history is back under
+        half the budget, so the next fold is several turns away"""
+        folded = []
+        while len(self.turns) > MIN_RECENT_TURNS and self._history_tokens() > self.budget // 2:
+            folded.append(self.turns.pop(0))
+        if not folded:
+            return
+        text = "\n".join(f"User: {user}\nCoach: {coach}" for user, coach in folded)
+        if self.history_summary:
+            text = f"{self.history_summary}\n{text}"
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(HISTORY_SUMMARY_PROMPT.format(
+                    words=HISTORY_SUMMARY_TOKENS * 3 // 4, text=text))
+            except Exception as e:
+                print(f"Conversation summary failed: {e}")
+        if not summary:
+            summary = text
+        # The model may ignore the word limit; the summary never grows past its share
+        self.history_summary = summary.strip()[-HISTORY_SUMMARY_TOKENS * CHARS_PER_TOKEN:]
+        self.folds += 1
+
+    def stats(self):
+        return {"turns": len(self.turns), "folds": self.folds, "history_tokens": self._history_tokens(),
+                "session_tokens": estimate_tokens(self.session or "")}
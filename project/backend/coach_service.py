@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from coach_context import CoachContext
+from analysis_jobs import content_key
+from coach_speech import SpeechPipeline, in_daemon_thread
+from feedback_logger import session_log_path
+from session_summary import summary_path, summarize_feedback_log
+
+COACH_MODEL = os.environ.get("COACH_MODEL", "gemini-2.0-flash")
+MAX_COACH_SESSIONS = int(os.environ.get("MAX_COACH_SESSIONS", "4"))  # Conversations per process
+LISTEN_TIMEOUT = 5  # Seconds the microphone waits for speech before checking for a stop
+PHRASE_TIME_LIMIT = 20  # Longest question, in seconds
+FINISHED_KEPT = 16  # Ended conversations whose status stays queryable
+
+SYSTEM_PROMPT = """You are an expert fitness coach analyzing {exercise} form data. The data is a summary of the set: per-rep joint angle extremes (joint angles in degrees, depth and drift in pixels), rep tempo, and form faults with the rep and the time in seconds into the set they happened. Make use of these numbers in your analysis. Your task is to:
+1. Output should be summarised to reduce how long the message is. Only include key, necessary points.
+2. Identify patterns in the form feedback data
+3. Highlight 2-3 key areas for improvement
+4. Recognize what the user did well
+5. Provide specific, actionable advice
+6. Maintain an encouraging, positive tone
+7. Be prepared to answer follow-up questions about the analysis
+8. Make sure the analysis isn't too long. Try keeping it to around 100 words. It should be 30-45 seconds to read out-loud. However, if you're asked for timestamps, allow for longer text output"""
+
+ANALYSIS_REQUEST = "Analyze my {exercise} set from the session data. Provide detailed feedback and be ready for questions."
+NO_DATA_REPLY = "No {exercise} data found. Complete a workout session first!"
+ERROR_REPLY = "Sorry, I couldn't process that. Please try again."
+
+
+class CoachLimitError(Exception):
+    """Raised when every coaching slot of the process is taken"""
+
+
+def load_summary(exercise="squat", session_id=None, log_file="temp.txt"):
+    """The set summary the backend keeps up to date. Sessions from before set summaries
+    existed only left the feedback log, which is reduced to counts per feedback type."""
+    try:
+        with open(summary_path(exercise, session_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return summarize_feedback_log(session_log_path(log_file, session_id))
+
+
+def analysis_key(summary, exercise="squat", model=COACH_MODEL):
+    """Cache key of a written analysis: the set's content, not which session it came from,
+    plus the model and prompts, so a prompt change does not serve stale analyses"""
+    content = {key: value for key, value in summary.items() if key not in ("session_id", "started_at")}
+    return content_key(model, SYSTEM_PROMPT, ANALYSIS_REQUEST, exercise, content)
+
+
+async def analyze_set(client, summary, exercise="squat", model=COACH_MODEL):
+    """The coach's written analysis of a set, one async model call"""
+    context = CoachContext(SYSTEM_PROMPT.format(exercise=exercise))
+    context.attach_session(summary)
+    response = await client.aio.models.generate_content(
+        model=model, contents=context.prompt(ANALYSIS_REQUEST.format(exercise=exercise)))
+    if not response.text:
+        raise ValueError("The model returned no text (blocked or empty response)")
+    return response.text.strip()
+
+
+def gemini_client(api_key=None):
+    from google import genai
+
+    return genai.Client(api_key=api_key or os.environ.get("GEMINI_API_KEY"))
+
+
+class Microphone:
+    """Blocking speech capture and recognition. listen() gives up after LISTEN_TIMEOUT
+    seconds of silence, so a conversation that is stopped frees the microphone soon."""
+
+    def __init__(self, timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.timeout = timeout
+        self.phrase_time_limit = phrase_time_limit
+
+    def listen(self):
+        with self.sr.Microphone() as source:
+            self.recognizer.adjust_for_ambient_noise(source)
+            try:
+                return self.recognizer.listen(source, timeout=self.timeout,
+                                              phrase_time_limit=self.phrase_time_limit)
+            except self.sr.WaitTimeoutError:
+                return None
+
+    def recognize(self, audio):
+        try:
+            text = self.recognizer.recognize_google(audio)
+            print(f"You said: {text}")
+            return text
+        except self.sr.UnknownValueError:
+            print("Sorry, I could not understand the audio.")
+            return None
+        except self.sr.RequestError as e:
+            print(f"Could not request results from Google Speech Recognition service; {e}")
+            return None
+
+
+class CoachSession:
+    """One spoken conversation about a set: the analysis first, then questions until the
+    athlete says "exit" or the session is stopped.
+
+    Nothing blocks the event loop. Gemini is called through its async client; the
+    microphone, speech recognition, synthesis and playback run on threads. Every stage
+    is its own task (listening, answering, and inside an answer splitting, synthesizing
+    and playing), so cancelling run() stops all of them. Without a microphone the
+    session speaks the analysis and ends."""
+
+    def __init__(self, coach_id, client, synthesizer, summary=None, exercise="squat",
+                 open_output=None, microphone=None, model=COACH_MODEL):
+        self.coach_id = coach_id
+        self.client = client
+        self.exercise = exercise
+        self.model = model
+        self.microphone = microphone
+        self.context = CoachContext(SYSTEM_PROMPT.format(exercise=exercise), summarize=self._summarize)
+        self.context.attach_session(summary)
+        self.speech = SpeechPipeline(synthesizer, open_output=open_output)
+        self.state = "starting"
+        self.turns = 0
+        self.started = time.time()
+
+    def _summarize(self, prompt):
+        # CoachContext folds history synchronously; add_turn runs in an executor
+        return self.client.models.generate_content(model=self.model, contents=prompt).text
+
+    async def _reply_stream(self, user_input):
+        """The reply as it is generated, piece by piece"""
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model, contents=self.context.prompt(user_input))
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Error in Gemini API call: {e}")
+            yield ERROR_REPLY
+
+    async def respond(self, user_input):
+        self.state = "speaking"
+        response = (await self.speech.speak(self._reply_stream(user_input))).strip()
+        if self.speech.first_audio_seconds is not None:
+            print(f"[{self.coach_id}] First audio after {self.speech.first_audio_seconds:.2f}s")
+        if self.speech.interrupted:
+            response = " ".join(self.speech.spoken) + " [interrupted]"
+        await asyncio.get_running_loop().run_in_executor(None, self.context.add_turn, user_input, response)
+        self.turns += 1
+        self.state = "listening" if self.microphone is not None else "done"
+
+    async def listen(self):
+        """Next thing the athlete said, None for silence or unrecognized speech. The
+        microphone waits on a daemon thread, recognition goes to the executor."""
+        audio = await in_daemon_thread(self.microphone.listen)
+        if audio is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, self.microphone.recognize, audio)
+
+    async def run(self):
+        if self.context.session:
+            speaking = asyncio.create_task(self.respond(ANALYSIS_REQUEST.format(exercise=self.exercise)))
+        else:
+            speaking = asyncio.create_task(self.speech.say(NO_DATA_REPLY.format(exercise=self.exercise)))
+        try:
+            if self.microphone is None:
+                await speaking
+                return
+            # The microphone listens while the coach is still talking: a new question
+            # interrupts the answer (barge-in), the coach's own voice is ignored
+            while True:
+                user_input = await self.listen()
+                if not user_input:
+                    continue
+                if not speaking.done():
+                    if self.speech.is_echo(user_input):
+                        continue
+                    self.speech.interrupt()
+                await speaking
+                if user_input.lower() == 'exit':
+                    print("Goodbye! Chat session ended.")
+                    return
+                speaking = asyncio.create_task(self.respond(user_input))
+        finally:
+            speaking.cancel()
+            await asyncio.gather(speaking, return_exceptions=True)
+            self.speech.close()
+            self.state = "done"
+
+    def status(self):
+        return {
+            "coach_id": self.coach_id,
+            "exercise": self.exercise,
+            "state": self.state,
+            "turns": self.turns,
+            "seconds": round(time.time() - self.started, 1),
+            "first_audio_seconds": self.speech.first_audio_seconds,
+            "context": self.context.stats(),
+        }
+
+
+class CoachService:
+    """Coaching conversations of the whole process on one asyncio event loop, running
+    on a background thread that starts with the first conversation. Flask request
+    threads start and stop conversations; each one is a task on the loop, so any number
+    up to max_sessions share the process without a thread (or process) each."""
+
+    def __init__(self, max_sessions=MAX_COACH_SESSIONS):
+        self.max_sessions = max_sessions
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._loop_lock = threading.Lock()
+        self._sessions = {}  # Coach id -> (CoachSession, task)
+
+    def event_loop(self):
+        """The shared loop, started on first use; post-workout analysis jobs run on it too"""
+        with self._loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="coach-loop", daemon=True)
+                self._thread.start()
+            return self.loop
+
+    def start(self, coach_id, make_session):
+        """Start a conversation unless one with this id is running; make_session() builds
+        the CoachSession (on the calling thread). Returns the conversation's status."""
+        with self._lock:
+            running = self._sessions.get(coach_id)
+            if running is not None and not running[1].done():
+                return running[0].status()
+            finished = [key for key, (_, task) in self._sessions.items() if task.done()]
+            for key in finished[:max(0, len(finished) - FINISHED_KEPT)]:
+                del self._sessions[key]
+            if len(self._sessions) - len(finished) >= self.max_sessions:
+                raise CoachLimitError(f"All {self.max_sessions} coaching slots are in use")
+            session = make_session()
+            loop = self.event_loop()
+            task = asyncio.run_coroutine_threadsafe(self._run(session), loop)
+            self._sessions[coach_id] = (session, task)
+            return session.status()
+
+    async def _run(self, session):
+        try:
+            await session.run()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Coaching session {session.coach_id} failed: {e}")
+            session.state = "failed"
+
+    def stop(self, coach_id):
+        """Cancel a conversation; its tasks wind down on the loop, the microphone is
+        released within LISTEN_TIMEOUT"""
+        with self._lock:
+            running = self._sessions.get(coach_id)
+        if running is None or running[1].done():
+            return False
+        running[1].cancel()
+        return True
+
+    def status(self, coach_id=None):
+        with self._lock:
+            sessions = [session for session, _ in self._sessions.values()]
+        if coach_id is not None:
+            return next((session.status() for session in sessions if session.coach_id == coach_id), None)
+        return [session.status() for session in sessions]
+
+    def close(self):
+        for coach_id in list(self._sessions):
+            self.stop(coach_id)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
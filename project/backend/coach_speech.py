@@ -0,0 +1,186 @@
+import asyncio
+import re
+import threading
+import time
+
+MIN_SENTENCE_CHARS = 12  # Shorter sentences ("Nice work.") wait for the next one
+MAX_SENTENCE_CHARS = 200  # Longer runs without a full stop are cut at a comma or space
+PLAYBACK_CHUNK_SECONDS = 0.2  # Playback checks for barge-in this often
+SYNTHESIS_AHEAD = 2  # Sentences synthesized before the speaker gets to them
+ECHO_OVERLAP = 0.6  # Share of a heard phrase's words in the coach's reply that makes it an echo
+
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+CLAUSE_END = re.compile(r"[,;:]\s+")
+WORD = re.compile(r"[a-z0-9']+")
+
+
+def split_sentences(text, final=False):
+    """(complete sentences, rest still waiting for its end) of streamed text. With
+    final, the rest is the last sentence."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if match.end() - start >= MIN_SENTENCE_CHARS:
+            sentences.append(text[start:match.end()].strip())
+            start = match.end()
+    rest = text[start:]
+    while len(rest) > MAX_SENTENCE_CHARS:
+        head = rest[:MAX_SENTENCE_CHARS]
+        cuts = [match.end() for match in CLAUSE_END.finditer(head)]
+        cut = cuts[-1] if cuts else (head.rfind(" ") + 1 or MAX_SENTENCE_CHARS)
+        sentences.append(rest[:cut].strip())
+        rest = rest[cut:]
+    if final and rest.strip():
+        sentences.append(rest.strip())
+        rest = ""
+    return sentences, rest
+
+
+def in_daemon_thread(func, *args):
+    """Run a blocking call on a daemon thread and await its result. Unlike the default
+    executor, a call that never returns (a microphone still listening) does not keep the
+    process alive at exit."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def run():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_settle, future, None, e)
+        else:
+            loop.call_soon_threadsafe(_settle, future, result, None)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _settle(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class SpeechPipeline:
+    """Speaks a reply while it is still being generated. The text stream is cut into
+    sentences, each sentence is synthesized as soon as it is complete and played as soon
+    as the previous one finished, so the first words play after one sentence of
+    generation and one synthesis round trip instead of after the whole reply.
+
+    Synthesis and playback are blocking calls and run on threads; the three stages are
+    joined by asyncio queues. interrupt() (barge-in) stops playback within
+    PLAYBACK_CHUNK_SECONDS and drops whatever was not said yet."""
+
+    def __init__(self, synthesizer, open_output=None, ahead=SYNTHESIS_AHEAD):
+        self.synthesizer = synthesizer
+        self.open_output = open_output  # Returns a Speaker, or None for silent
+        self.speaker = None
+        self.ahead = ahead
+        self.spoken = []  # Sentences of the current reply that started playing
+        self.first_audio_seconds = None  # Start of the reply to its first sound
+        self.interrupted = False
+        self._stop = threading.Event()
+        self._player = None
+
+    async def speak(self, chunks):
+        """Speak an async stream of text pieces; returns all the text that was generated"""
+        self._stop.clear()
+        self.interrupted = False
+        self.spoken = []
+        self.first_audio_seconds = None
+        start = time.perf_counter()
+        sentences = asyncio.Queue()
+        audio = asyncio.Queue(maxsize=self.ahead)
+        text = []
+
+        async def split():
+            buffer = ""
+            try:
+                async for chunk in chunks:
+                    if self._stop.is_set():
+                        break
+                    text.append(chunk)
+                    ready, buffer = split_sentences(buffer + chunk)
+                    for sentence in ready:
+                        sentences.put_nowait(sentence)
+                ready, _ = split_sentences(buffer, final=True)
+                for sentence in ready:
+                    sentences.put_nowait(sentence)
+            finally:
+                sentences.put_nowait(None)
+
+        async def synthesize():
+            while not self._stop.is_set():
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+                try:
+                    pcm = await asyncio.to_thread(self.synthesizer.synthesize, sentence)
+                except Exception as e:
+                    print(f"Error in speech synthesis: {e}")
+                    continue
+                await audio.put((sentence, pcm))
+            await audio.put(None)
+
+        async def play():
+            while True:
+                item = await audio.get()
+                if item is None or self._stop.is_set():
+                    break
+                sentence, pcm = item
+                self.spoken.append(sentence)
+                if self.first_audio_seconds is None:
+                    self.first_audio_seconds = time.perf_counter() - start
+                await asyncio.to_thread(self._play, pcm)
+
+        tasks = [asyncio.create_task(stage()) for stage in (split, synthesize, play)]
+        self._player = tasks[2]
+        try:
+            await asyncio.wait([self._player])
+        finally:
+            self._stop.set()  # Playback ended early: the producers have nobody to feed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return "".join(text)
+
+    async def say(self, text):
+        async def once():
+            yield text
+
+        return await self.speak(once())
+
+    def _play(self, pcm):
+        if self.open_output is not None:
+            self.speaker = self.open_output()
+            self.open_output = None
+        if self.speaker is None:
+            return
+        step = 2 * int(PLAYBACK_CHUNK_SECONDS * self.synthesizer.sampling_rate)  # 16-bit samples
+        for offset in range(0, len(pcm), step):
+            if self._stop.is_set():
+                break
+            self.speaker.play(pcm[offset:offset + step])
+
+    def interrupt(self):
+        """Barge-in: stop speaking the current reply"""
+        self.interrupted = True
+        self._stop.set()
+        if self._player is not None:
+            self._player.cancel()  # Playing stops within a chunk, waiting for audio at once
+
+    def is_echo(self, heard):
+        """Whether a phrase the microphone picked up is most likely the coach's own voice"""
+        heard_words = WORD.findall(heard.lower())
+        if not heard_words:
+            return False
+        said = set(WORD.findall(" ".join(self.spoken).lower()))
+        return sum(word in said for word in heard_words) / len(heard_words) >= ECHO_OVERLAP
+
+    def close(self):
+        self._stop.set()
+        if self.speaker is not None:
+            self.speaker.close()
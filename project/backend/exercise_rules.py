@@ -0,0 +1,401 @@
+import random
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from audio_cues import COACHING, FAULT
+from feedback_logger import feedback_logger
+from kinematics import NUM_LANDMARKS, AngleSet, landmarks_to_array, mediapipe_solutions, to_pixels
+from latency_metrics import stage
+from pose_tiers import DEFAULT_POSE_TIER, check_tier
+from session_recording import mark_feedback
+
+AXES = {"x": 0, "y": 1}
+OPERATORS = {"<": 0, "<=": 1, ">": 2, ">=": 3}
+
+# Exercise definitions are plain dicts:
+#
+#   name, log_file            registry key and legacy JSONL log the rules write to
+#   initial_phase             phase of a fresh session
+#   rep_transition            (from, to) phase change that completes a rep
+#   features                  name -> {"angle": (a, b, c)}         joint angle, a joint may be a (l, r) midpoint
+#                                     {"linear": [(lm, "x"|"y", coef), ...], "abs": bool, "unit": "px"|"percent_width"}
+#                                     {"max" | "min": [feature, ...]}
+#                                     {"affine": feature, "scale": s, "offset": o}
+#   conditions                name -> [(feature, op, threshold), ...] (all) or {"any": [...]}
+#   rules                     evaluated in order, the first match stops unless "stop": False. A rule has
+#                             "when" (condition name(s), "not " negates), optional "phase", "to", "feedback",
+#                             "cue" (+ "cue_cooldown": False to skip the audio cooldown), "log" + "data", "fault"
+#   default_feedback          shown when no pose / nothing matched; idle_feedback overrides the latter
+#   encouragement, bonus      pools for {"pool": name, "text": suffix} messages
+#   visibility, required_*    landmarks below the visibility threshold mask the angles that use them
+#   summary                   feature -> "min" | "max", the per-rep extreme the set summary tracks
+#   reps                      rep segmentation: "signal" feature that is high at rest, "rest" and "bottom"
+#                             thresholds, "first_half" ("eccentric" | "concentric"), optional "hysteresis",
+#                             "fault_penalty" and "score_faults" (see rep_segmentation.RepSegmenter)
+#   overlay                   what draw() puts on the frame
+
+
+class ExerciseState:
+    """Per-session state of one exercise's state machine"""
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.last_audio_time = 0
+        self.last_log_times = {}
+
+
+class FrameResult:
+    def __init__(self, feedback=None, pose=True):
+        self.pose = pose
+        self.feedback = feedback
+        self.features = {}
+        self.points = None
+        self.rules = []  # Names of the rules that matched, in order
+        self.faults = []
+        self.cues = []  # (message, respects_cooldown, priority)
+        self.logs = []  # (feedback type, payload)
+        self.phase = None
+        self.transition = None
+        self.rep = False
+        self.inferred = True  # False when the landmarks were predicted on a skipped frame
+        self.tier = None  # Pose model tier the session was running at
+        self.rep_stats = None  # Segmented rep that ended on this frame
+
+
+class CompiledExercise:
+    """An exercise definition resolved into index arrays and op codes. Features and
+    conditions for one frame, or a whole (T, 33, 4) series, are computed in a few
+    batched NumPy calls; only the phase state machine steps frame by frame."""
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.name = definition["name"]
+        self.log_file = definition.get("log_file", f"{self.name}_log.txt")
+        self.log_cooldown = definition.get("log_cooldown", 0)
+        self.initial_phase = definition["initial_phase"]
+        self.rep_transition = tuple(definition.get("rep_transition", ()))
+        self.encouragement = definition.get("encouragement", {})
+        self.overlay = definition.get("overlay", {})
+        # Pose model tier when the client does not ask for one, and the lightest one the
+        # automatic fallback may step down to
+        self.pose_tier = check_tier(definition.get("pose_tier", DEFAULT_POSE_TIER))
+        self.min_pose_tier = check_tier(definition.get("min_pose_tier", "lite"))
+        self._compile_features(definition["features"])
+        self._compile_conditions(definition.get("conditions", {}))
+        self._compile_rules(definition["rules"])
+        self.summary_features = definition.get("summary", {})
+        for name, mode in self.summary_features.items():
+            if name not in self.feature_index or mode not in ("min", "max"):
+                raise ValueError(f"{self.name}: bad summary feature {name}: {mode}")
+        self.rep_spec = definition.get("reps")
+        if self.rep_spec is not None and self.rep_spec["signal"] not in self.feature_index:
+            raise ValueError(f"{self.name}: unknown rep signal {self.rep_spec['signal']}")
+
+        visibility = definition.get("visibility")
+        self.visibility = None
+        if visibility is not None:
+            self.visibility = np.full(NUM_LANDMARKS, visibility.get("default", 0.0))
+            for landmark, threshold in visibility.items():
+                if landmark != "default":
+                    self.visibility[landmark] = threshold
+        self.required_landmarks = np.asarray(definition.get("required_landmarks", []), dtype=np.intp)
+        self.required_features = np.asarray(
+            [self.feature_index[name] for name in definition.get("required_features", [])], dtype=np.intp)
+
+    def _compile_features(self, features):
+        angle_names = [name for name, spec in features.items() if "angle" in spec]
+        linear_names = [name for name, spec in features.items() if "linear" in spec]
+        derived_names = [name for name in features if name not in angle_names and name not in linear_names]
+        self.feature_names = angle_names + linear_names + derived_names
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+
+        self.angle_set = AngleSet({name: features[name]["angle"] for name in angle_names})
+
+        # All linear features are one (L, 33, 2) weight tensor applied to the x, y coordinates
+        self.linear_weights = np.zeros((len(linear_names), NUM_LANDMARKS, 2))
+        for i, name in enumerate(linear_names):
+            for landmark, axis, coef in features[name]["linear"]:
+                self.linear_weights[i, landmark, AXES[axis]] += coef
+        self.linear_abs = np.array([features[name].get("abs", False) for name in linear_names], dtype=bool)
+        self.linear_percent = np.array(
+            [features[name].get("unit", "px") == "percent_width" for name in linear_names], dtype=bool)
+
+        self.derived = []
+        for name in derived_names:
+            spec = features[name]
+            if "max" in spec or "min" in spec:
+                kind = "max" if "max" in spec else "min"
+                self.derived.append((kind, [self.feature_index[f] for f in spec[kind]], 1.0, 0.0))
+            elif "affine" in spec:
+                self.derived.append(("affine", [self.feature_index[spec["affine"]]],
+                                     spec.get("scale", 1.0), spec.get("offset", 0.0)))
+            else:
+                raise ValueError(f"{self.name}: unknown feature type for {name}")
+
+    def _compile_conditions(self, conditions):
+        self.condition_names = list(conditions)
+        self.condition_index = {name: i for i, name in enumerate(self.condition_names)}
+        clause_feature, clause_op, clause_threshold = [], [], []
+        self.condition_clauses = []
+        self.condition_any = []
+        for name in self.condition_names:
+            spec = conditions[name]
+            is_any = isinstance(spec, dict)
+            clauses = spec["any"] if is_any else spec
+            indices = []
+            for feature, op, threshold in clauses:
+                indices.append(len(clause_feature))
+                clause_feature.append(self.feature_index[feature])
+                clause_op.append(OPERATORS[op])
+                clause_threshold.append(threshold)
+            self.condition_clauses.append(np.asarray(indices, dtype=np.intp))
+            self.condition_any.append(is_any)
+        self.clause_feature = np.asarray(clause_feature, dtype=np.intp)
+        self.clause_op = np.asarray(clause_op, dtype=np.intp)
+        self.clause_threshold = np.asarray(clause_threshold, dtype=np.float64)
+
+    def _compile_rules(self, rules):
+        self.rules = []
+        for rule in rules:
+            when = rule.get("when", [])
+            if isinstance(when, str):
+                when = [when]
+            compiled_when = []
+            for condition in when:
+                negate = condition.startswith("not ")
+                condition = condition[4:] if negate else condition
+                compiled_when.append((self.condition_index[condition], negate))
+            compiled = dict(rule)
+            compiled["when"] = compiled_when
+            compiled.setdefault("name", rule.get("log", "rule"))
+            self.rules.append(compiled)
+
+    def new_state(self):
+        return ExerciseState(self.initial_phase)
+
+    def compute_features(self, points, frame_shape):
+        """(..., 33, 4) pixel landmarks -> (..., F) feature values in feature_names order"""
+        angles = self.angle_set.compute(points, self.visibility)
+        linear = np.einsum("...lk,flk->...f", points[..., :NUM_LANDMARKS, :2], self.linear_weights)
+        linear = np.where(self.linear_abs, np.abs(linear), linear)
+        linear = np.where(self.linear_percent, linear / frame_shape[1] * 100, linear)
+        columns = [angles, linear]
+        values = np.concatenate(columns, axis=-1)
+        for kind, sources, scale, offset in self.derived:
+            source = values[..., sources]
+            if kind == "max":
+                column = source.max(axis=-1)
+            elif kind == "min":
+                column = source.min(axis=-1)
+            else:
+                column = source[..., 0] * scale + offset
+            values = np.concatenate([values, column[..., None]], axis=-1)
+        return values
+
+    def compute_conditions(self, values):
+        """(..., F) features -> (..., C) booleans; NaN features never satisfy a clause"""
+        diff = values[..., self.clause_feature] - self.clause_threshold
+        with np.errstate(invalid="ignore"):
+            clauses = np.select(
+                [self.clause_op == 0, self.clause_op == 1, self.clause_op == 2],
+                [diff < 0, diff <= 0, diff > 0],
+                diff >= 0)
+        conditions = [clauses[..., idx].any(axis=-1) if is_any else clauses[..., idx].all(axis=-1)
+                      for idx, is_any in zip(self.condition_clauses, self.condition_any)]
+        if not conditions:
+            return np.zeros(values.shape[:-1] + (0,), dtype=bool)
+        return np.stack(conditions, axis=-1)
+
+    def is_trackable(self, points, values):
+        if len(self.required_landmarks) and self.visibility is not None:
+            if not (points[self.required_landmarks, 3] >= self.visibility[self.required_landmarks]).all():
+                return False
+        if len(self.required_features) and np.isnan(values[self.required_features]).any():
+            return False
+        return True
+
+    def evaluate(self, points, state, frame_shape, values=None, conditions=None):
+        """Step the state machine by one frame of pixel landmarks. values / conditions
+        can be passed in when they were precomputed for a whole series."""
+        if values is None:
+            values = self.compute_features(points, frame_shape)
+        result = FrameResult()
+        result.points = points
+        result.features = {name: (None if np.isnan(value) else float(value))
+                           for name, value in zip(self.feature_names, values)}
+        result.phase = state.phase
+        if not self.is_trackable(points, values):
+            result.pose = False
+            result.feedback = self.text(self.definition.get("default_feedback", ""))
+            return result
+        if conditions is None:
+            conditions = self.compute_conditions(values)
+
+        for rule in self.rules:
+            if rule.get("phase") is not None and rule["phase"] != state.phase:
+                continue
+            if not all(conditions[index] != negate for index, negate in rule["when"]):
+                continue
+            result.rules.append(rule["name"])
+            if rule.get("fault"):
+                result.faults.append(rule["name"])
+            if rule.get("to") and rule["to"] != state.phase:
+                result.transition = (state.phase, rule["to"])
+                result.rep = result.transition == self.rep_transition
+                state.phase = rule["to"]
+            if rule.get("feedback") and result.feedback is None:
+                result.feedback = self.text(rule["feedback"], result.features)
+            if rule.get("cue"):
+                result.cues.append((self.text(rule["cue"], result.features), rule.get("cue_cooldown", True),
+                                    FAULT if rule.get("fault") else COACHING))
+            if rule.get("log"):
+                result.logs.append((rule["log"], self.payload(rule.get("data", {}), points, result.features)))
+            if rule.get("stop", True):
+                break
+
+        result.phase = state.phase
+        if result.feedback is None:
+            result.feedback = self.text(self.definition.get("idle_feedback",
+                                                            self.definition.get("default_feedback", "")))
+        bonus = self.definition.get("bonus")
+        if bonus and random.random() < bonus["chance"]:
+            result.feedback += " " + random.choice(self.encouragement[bonus["pool"]])
+        return result
+
+    def cue_texts(self):
+        """Every fixed cue the rules can speak, for warming the audio cache"""
+        texts = []
+        for rule in self.rules:
+            spec = rule.get("cue")
+            if isinstance(spec, dict):
+                texts += [f"{prefix} {spec['text']}" for prefix in self.encouragement[spec["pool"]]]
+            elif spec and "{" not in spec:
+                texts.append(spec)
+        return texts
+
+    def text(self, spec, features=None):
+        """Message from a rule: a format string over the (truncated) feature values, or
+        {"pool": name, "text": suffix} for a random encouragement followed by the suffix"""
+        if isinstance(spec, dict):
+            prefix = random.choice(self.encouragement[spec["pool"]])
+            spec = f"{prefix} {spec['text']}"
+        if features and "{" in spec:
+            ints = {name: int(value) for name, value in features.items() if value is not None}
+            try:
+                return spec.format(**ints)
+            except KeyError:
+                return spec
+        return spec
+
+    def payload(self, spec, points, features):
+        """Log payload: landmarks become [x, y, z] pixel points, (a, b) pairs their
+        midpoint, strings feature values, lists and dicts are resolved element-wise"""
+        if isinstance(spec, dict):
+            return {key: self.payload(value, points, features) for key, value in spec.items()}
+        if isinstance(spec, list):
+            return [self.payload(value, points, features) for value in spec]
+        if isinstance(spec, bool):
+            return spec
+        if isinstance(spec, str):
+            return features.get(spec)
+        if isinstance(spec, tuple):
+            return ((points[spec[0], :3] + points[spec[1], :3]) / 2).tolist()
+        return points[spec, :3].tolist()
+
+    def draw(self, frame, results, result):
+        overlay = self.overlay
+        height, width = frame.shape[:2]
+
+        def put(text, org, style):
+            cv2.putText(frame, text, (int(org[0]), int(org[1])), cv2.FONT_HERSHEY_SIMPLEX,
+                        style.get("scale", 0.7), style.get("color", (0, 255, 0)), style.get("thickness", 2))
+
+        feedback_style = overlay.get("feedback", {})
+        put(result.feedback, feedback_style.get("org", (10, 30)), feedback_style)
+
+        banner = overlay.get("phase_banners", {}).get(result.phase)
+        if banner:
+            x, y = banner["org"]
+            put(banner["text"], (width + x if x < 0 else x, y), banner)
+
+        for label in overlay.get("labels", []):
+            text = self.text(label["text"], result.features)
+            if "{" in text:
+                continue  # A feature the label needs is missing this frame
+            if "at" in label:
+                at = label["at"]
+                if isinstance(at, tuple):
+                    x, y = (result.points[at[0], :2] + result.points[at[1], :2]) / 2
+                else:
+                    x, y = result.points[at, :2]
+                dx, dy = label.get("offset", (0, 0))
+                put(text, (x + dx, y + dy), label)
+            else:
+                put(text, label["org"], label)
+
+        drawing_utils, drawing_styles, connections = mediapipe_drawing()
+        if overlay.get("landmark_style") == "pose":
+            drawing_utils.draw_landmarks(
+                frame, results.pose_landmarks, connections,
+                landmark_drawing_spec=drawing_styles.get_default_pose_landmarks_style())
+        else:
+            drawing_utils.draw_landmarks(frame, results.pose_landmarks, connections)
+        return frame
+
+
+def mediapipe_drawing():
+    """MediaPipe's drawing helpers load matplotlib, so they are imported on the first
+    annotated frame (or by the startup warm-up) rather than with this module"""
+    solutions = mediapipe_solutions()
+    return solutions.drawing_utils, solutions.drawing_styles, solutions.pose.POSE_CONNECTIONS
+
+
+def emit_cues(result, state, audio_queue, current_time, audio_cooldown):
+    """Hand the frame's cues to the CueScheduler, which coalesces repeats and orders
+    faults first; only the per-exercise cooldown is applied here"""
+    for message, respects_cooldown, priority in result.cues:
+        if respects_cooldown and current_time - state.last_audio_time <= audio_cooldown:
+            continue
+        audio_queue.put(message, priority)
+        state.last_audio_time = current_time
+
+
+def write_logs(exercise, result, state, current_time, session_id=None):
+    for feedback_type, payload in result.logs:
+        mark_feedback(session_id, exercise.name, feedback_type)
+        if current_time - state.last_log_times.get(feedback_type, 0) < exercise.log_cooldown:
+            continue
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "feedback": feedback_type,
+            "coordinates": payload
+        }
+        feedback_logger.log(exercise.log_file, entry, session_id)
+        state.last_log_times[feedback_type] = current_time
+
+
+def process_exercise(exercise, frame, results, state, current_time, audio_queue, audio_cooldown=3,
+                     annotate=True, session_id=None):
+    """The one processing path for every exercise: evaluate the rules on this frame,
+    queue cues, write logs and (optionally) draw on the frame. Returns (FrameResult, frame)."""
+    if not results.pose_landmarks:
+        return FrameResult(exercise.text(exercise.definition.get("default_feedback", "")), pose=False), frame
+
+    with stage("rules"):
+        points = to_pixels(landmarks_to_array(results.pose_landmarks), frame.shape)
+        result = exercise.evaluate(points, state, frame.shape)
+    if not result.pose:
+        return result, frame
+
+    with stage("cues"):
+        emit_cues(result, state, audio_queue, current_time, audio_cooldown)
+    with stage("logs"):
+        write_logs(exercise, result, state, current_time, session_id)
+
+    if annotate:
+        # Drawn in place, the caller only needs the annotated frame
+        with stage("draw"):
+            exercise.draw(frame, results, result)
+    return result, frame
@@ -0,0 +1,6 @@
+from squat_processor import squat_exercise
+from push_up_processor import pushup_exercise
+from bicep_curl_processor import bicep_exercise
+
+# Compiled exercise definitions by the name clients send in "exercise"
+EXERCISES = {exercise.name: exercise for exercise in (squat_exercise, pushup_exercise, bicep_exercise)}
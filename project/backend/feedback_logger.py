@@ -0,0 +1,212 @@
+import atexit
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+
+LOG_BUFFER_SIZE = 10000  # Entries held in memory; the oldest are dropped if the disk falls behind
+FLUSH_INTERVAL = 1.0  # Seconds between background flushes
+FLUSH_BATCH = 256  # Flush early once this many entries are waiting
+MAX_LOG_BYTES = 5 * 1024 * 1024  # Rotate a log file once it grows past this size
+MAX_LOG_AGE = 24 * 60 * 60  # ...or once its first entry is this old
+LOG_BACKUPS = 3  # Rotated files kept as name.1 .. name.N
+SESSION_LOG_DIR = "logs"
+MAX_SESSION_LOGS = int(os.environ.get("MAX_SESSION_LOGS", "500"))  # Session directories kept, least recently written removed first
+SESSION_LOG_RETENTION = 30 * 24 * 60 * 60  # ...and none kept this long after its last entry
+DEFAULT_SESSION_ID = "default"
+
+
+def session_log_path(filename, session_id=None):
+    """The default session keeps writing to the legacy file in the working directory
+    (gemini.py reads temp.txt); every other session gets logs/<session_id>/<filename>"""
+    if not session_id or session_id == DEFAULT_SESSION_ID:
+        return filename
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(session_id))
+    return os.path.join(SESSION_LOG_DIR, safe_id, filename)
+
+
+def _started_at(path):
+    """When an existing log file got its first entry, as near as the filesystem tells: its
+    creation time where one is kept, else when its predecessor was rotated out (the last
+    write to name.1), else its last change"""
+    stat = os.stat(path)
+    created = getattr(stat, "st_birthtime", None)
+    if created:
+        return created
+    try:
+        return os.stat(f"{path}.1").st_mtime
+    except FileNotFoundError:
+        return stat.st_ctime
+
+
+def _last_write(directory):
+    """Newest modification time of the files in a directory, the directory's own if empty"""
+    times = [entry.stat().st_mtime for entry in os.scandir(directory) if entry.is_file()]
+    return max(times, default=os.stat(directory).st_mtime)
+
+
+class _LogFile:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.handle = open(path, "a")
+        self.size = self.handle.tell()
+        # Age counts from the file's first entry, not from this process opening it
+        self.started_at = time.time() if self.size == 0 else _started_at(path)
+
+    def close(self):
+        self.handle.close()
+
+
+class FeedbackLogger:
+    """JSONL writer that keeps disk I/O off the request thread. log() only appends to an
+    in-memory ring buffer; a background thread serializes and writes entries in batches
+    and rotates files by size and age. Whenever a new session starts logging, session
+    directories beyond max_sessions or older than retention are removed."""
+
+    def __init__(self, buffer_size=LOG_BUFFER_SIZE, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH,
+                 max_bytes=MAX_LOG_BYTES, max_age=MAX_LOG_AGE, backups=LOG_BACKUPS,
+                 max_sessions=MAX_SESSION_LOGS, retention=SESSION_LOG_RETENTION):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.max_sessions = max_sessions
+        self.retention = retention
+        self.dropped = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # Serializes flushes from the worker and from flush()
+        self._files = {}
+        self._closed = False
+        self._thread = None  # Started by the first entry, so importing this module costs nothing
+
+    def log(self, filename, entry, session_id=None):
+        path = session_log_path(filename, session_id)
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((path, entry))
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="feedback-logger", daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.flush_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Write everything buffered so far from the calling thread"""
+        with self._cond:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        self._write(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._write_lock:
+            for log_file in self._files.values():
+                log_file.close()
+            self._files.clear()
+
+    def close_session(self, session_id):
+        """Write what the session has buffered and close its log files. Only sessions with
+        their own directory; the default session's legacy files stay open."""
+        if not session_id or session_id == DEFAULT_SESSION_ID:
+            return
+        directory = os.path.dirname(session_log_path("log", session_id))
+        self.flush()
+        with self._write_lock:
+            for path in [path for path in self._files if os.path.dirname(path) == directory]:
+                self._files.pop(path).close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.flush_batch:
+                    self._cond.wait(self.flush_interval)
+                batch = list(self._buffer)
+                self._buffer.clear()
+                closed = self._closed
+            self._write(batch)
+            if closed:
+                break
+
+    def _write(self, batch):
+        if not batch:
+            return
+        lines = {}
+        for path, entry in batch:
+            try:
+                lines.setdefault(path, []).append(json.dumps(entry) + "\n")
+            except (TypeError, ValueError) as e:
+                print(f"Feedback log entry dropped ({path}): {e}")
+        with self._write_lock:
+            for path, path_lines in lines.items():
+                try:
+                    for line in path_lines:
+                        # Rotation is checked per line so a large batch can't overshoot max_bytes
+                        log_file = self._open(path)
+                        log_file.handle.write(line)
+                        log_file.size += len(line)
+                    log_file.handle.flush()
+                except OSError as e:
+                    print(f"Feedback log error ({path}): {e}")
+
+    def _open(self, path):
+        log_file = self._files.get(path)
+        if log_file is None:
+            directory = os.path.dirname(path)
+            new_session = directory != "" and not os.path.isdir(directory)
+            log_file = _LogFile(path)
+            self._files[path] = log_file
+            if new_session:
+                self._prune_sessions()
+        # Also checked on opening: a file left by an earlier run may be due already
+        if log_file.size >= self.max_bytes or time.time() - log_file.started_at >= self.max_age:
+            log_file.close()
+            self._rotate(path)
+            log_file = _LogFile(path)
+            self._files[path] = log_file
+        return log_file
+
+    def _prune_sessions(self):
+        """Remove the least recently written session directories beyond max_sessions and
+        any not written to for retention seconds; directories with open files stay"""
+        open_directories = {os.path.dirname(path) for path in self._files}
+        try:
+            entries = [entry.path for entry in os.scandir(SESSION_LOG_DIR) if entry.is_dir()]
+            closed = sorted((_last_write(path), path) for path in entries if path not in open_directories)
+        except OSError as e:
+            print(f"Session logs not pruned: {e}")
+            return
+        excess = len(entries) - self.max_sessions
+        now = time.time()
+        for written, path in closed:
+            if excess <= 0 and now - written < self.retention:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            excess -= 1
+
+    def _rotate(self, path):
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{index}"):
+                os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+
+# Shared by all exercise processors
+feedback_logger = FeedbackLogger()
+atexit.register(feedback_logger.close)
@@ -0,0 +1,103 @@
+import math
+import os
+
+import cv2
+import numpy as np
+
+FRAME_SKIP = int(os.environ.get("FRAME_SKIP", "1"))  # Run pose inference on every k-th frame, 1 = every frame
+MOTION_THRESHOLD = 6.0  # Mean absolute difference (0-255) of the motion thumbnails that forces inference
+MAX_PREDICT_GAP = 0.25  # Seconds a prediction may run ahead of the last inferred landmarks
+MOTION_THUMBNAIL = (32, 24)
+
+
+class OneEuroFilter:
+    """One-Euro filter (Casiez et al.) over a landmark array, all landmarks at once.
+    Besides the smoothed position it keeps a smoothed velocity, which is what the
+    skipper extrapolates with between inferred frames."""
+
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta  # Coordinates are normalized, so speeds are in frame widths per second
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = None
+        self.dx = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, t, x):
+        if self.t is None or t <= self.t:
+            self.t, self.x, self.dx = t, x.copy(), np.zeros_like(x)
+            return self.x
+        dt = t - self.t
+        dx = (x - self.x) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.dx = a_d * dx + (1 - a_d) * self.dx
+        a = self._alpha(self.min_cutoff + self.beta * np.abs(self.dx), dt)
+        self.x = a * x + (1 - a) * self.x
+        self.t = t
+        return self.x
+
+
+class FrameSkipper:
+    """Decides per frame whether a session's frame goes through pose inference, and
+    fills in landmarks for the frames that don't.
+
+    Inference runs on every k-th frame, and earlier whenever the image moved more than
+    MOTION_THRESHOLD since the last inferred frame, so fast phases of a rep (and the
+    turn at the bottom) are still measured. Skipped frames get the last inferred
+    landmarks moved along the One-Euro velocity estimate (constant velocity)."""
+
+    def __init__(self, every=FRAME_SKIP, motion_threshold=MOTION_THRESHOLD, max_gap=MAX_PREDICT_GAP):
+        self.every = max(1, every)
+        self.motion_threshold = motion_threshold
+        self.max_gap = max_gap
+        self.filter = OneEuroFilter()
+        self._since_inference = 0
+        self._last_time = None
+        self._last_landmarks = None  # (33, 4) of the last inferred frame, None when no pose
+        self._last_thumbnail = None
+        self.inferred = 0
+        self.predicted = 0
+
+    @staticmethod
+    def thumbnail(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, MOTION_THUMBNAIL, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def should_infer(self, frame, current_time):
+        if self._last_landmarks is None or self._since_inference + 1 >= self.every:
+            return True
+        if current_time - self._last_time > self.max_gap:
+            return True
+        motion = np.abs(self.thumbnail(frame) - self._last_thumbnail).mean()
+        return bool(motion > self.motion_threshold)
+
+    def update(self, frame, current_time, landmarks):
+        """Record an inferred frame; landmarks is a (33, 4) array or None"""
+        self.inferred += 1
+        self._since_inference = 0
+        self._last_time = current_time
+        self._last_thumbnail = self.thumbnail(frame)
+        if landmarks is None or np.isnan(landmarks).all():
+            self._last_landmarks = None
+            self.filter.reset()
+            return
+        self._last_landmarks = np.asarray(landmarks, dtype=np.float64)
+        self.filter(current_time, self._last_landmarks[:, :3])
+
+    def predict(self, current_time):
+        """Landmarks for a skipped frame: last inferred position plus filtered velocity
+        times the elapsed time; visibility is carried over"""
+        self.predicted += 1
+        self._since_inference += 1
+        predicted = self._last_landmarks.copy()
+        dt = min(current_time - self._last_time, self.max_gap)
+        predicted[:, :3] += self.filter.dx * dt
+        return predicted
@@ -0,0 +1,70 @@
+import base64
+import json
+import threading
+
+from flask_sock import ConnectionClosed
+
+
+class LatestFrame:
+    """One-slot mailbox between the socket reader and the analysis loop.
+    A frame that arrives before the previous one was picked up replaces it,
+    so a slow pose.process drops stale frames instead of queueing them."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+        self.invalid = 0  # Messages the reader could not turn into a frame
+
+    def put(self, item):
+        with self._cond:
+            self.received += 1
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def take(self):
+        """Block until a frame is available; returns None once the stream is closed"""
+        with self._cond:
+            while self._item is None and not self._closed:
+                self._cond.wait()
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+def receive_frames(ws, inbox, exercise):
+    """Reader thread: binary messages are JPEG frames, text messages are JSON with an
+    optional base64 "image" and/or a new "exercise" for the following frames. A message
+    that is not valid JSON, not an object or carries no valid base64 image is counted
+    and skipped."""
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, str):
+                try:
+                    data = json.loads(message)
+                    exercise = data.get("exercise", exercise).lower()
+                    image_data_str = data.get("image")
+                    if not image_data_str:
+                        continue
+                    if image_data_str.startswith("data:image"):
+                        image_data_str = image_data_str.partition(",")[2]
+                    message = base64.b64decode(image_data_str)
+                    if not message:
+                        raise ValueError("Empty image")
+                except (ValueError, AttributeError, TypeError):
+                    inbox.invalid += 1
+                    continue
+            inbox.put((message, exercise))
+    except ConnectionClosed:
+        pass
+    finally:
+        inbox.close()
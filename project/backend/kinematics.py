@@ -0,0 +1,169 @@
+import enum
+import threading
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+_mediapipe_lock = threading.Lock()
+
+
+def mediapipe_solutions():
+    """mediapipe.python.solutions, imported on first use. MediaPipe's package import is
+    not safe to run from two threads at once (the startup warm-up races the first
+    request), so every lazy import goes through this lock."""
+    with _mediapipe_lock:
+        from mediapipe.python import solutions
+    return solutions
+
+
+class PoseLandmark(enum.IntEnum):
+    """MediaPipe's 33 pose landmarks, same names and values as
+    mediapipe.solutions.pose.PoseLandmark without importing MediaPipe"""
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
+
+
+def landmarks_to_array(pose_landmarks):
+    """MediaPipe landmark list -> (33, 4) array of normalized x, y, z, visibility"""
+    if isinstance(pose_landmarks, LandmarkList):
+        return pose_landmarks.array.astype(np.float64)
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+                    dtype=np.float64)
+
+
+class Landmark:
+    """Stand-in for a MediaPipe NormalizedLandmark (no presence field, like Pose output)"""
+    __slots__ = ("x", "y", "z", "visibility")
+
+    def __init__(self, x, y, z, visibility):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.visibility = visibility
+
+    def HasField(self, name):
+        return name in self.__slots__
+
+
+class LandmarkList:
+    """Array-backed pose_landmarks: .landmark works with drawing_utils, .array with everything else"""
+
+    def __init__(self, array):
+        self.array = np.asarray(array)
+        self._landmark = None
+
+    @property
+    def landmark(self):
+        if self._landmark is None:
+            self._landmark = [Landmark(*map(float, row)) for row in self.array]
+        return self._landmark
+
+
+class PoseResults:
+    """What Pose.process returns, rebuilt from a (33, 4) array (None when no pose was
+    found), e.g. for landmarks that came back from a worker process or a recording"""
+
+    def __init__(self, landmarks=None):
+        self.pose_landmarks = None if landmarks is None else LandmarkList(landmarks)
+
+
+def to_pixels(points, frame_shape):
+    """Scale x and y of a (..., 33, 4) landmark array to pixels, like get_landmark_point did"""
+    points = np.array(points, dtype=np.float64)
+    points[..., 0] *= frame_shape[1]
+    points[..., 1] *= frame_shape[0]
+    return points
+
+
+def joint_angles(points, triples):
+    """Angles in degrees at b for every (a, b, c) index triple, measured in the image
+    plane. points is (..., N, 4) and the result is (..., len(triples)); a zero-length
+    limb gives NaN."""
+    triples = np.asarray(triples, dtype=np.intp)
+    a = points[..., triples[:, 0], :2]
+    b = points[..., triples[:, 1], :2]
+    c = points[..., triples[:, 2], :2]
+    ba = a - b
+    bc = c - b
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = np.einsum("...i,...i->...", ba, bc) / norms
+    angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+    return np.where(norms > 0, angles, np.nan)
+
+
+class AngleSet:
+    """The joint angles one exercise needs, resolved to index arrays once so every frame
+    (or a whole (T, 33, 4) recording) is a single batched NumPy call.
+
+    angles maps a name to three joints; a joint is either a PoseLandmark or a pair of
+    them, which stands for their midpoint."""
+
+    def __init__(self, angles):
+        self.names = list(angles)
+        self.midpoint_pairs = []
+        self.triples = []
+        for name in self.names:
+            self.triples.append([self._index(joint) for joint in angles[name]])
+        self.midpoint_pairs = np.asarray(self.midpoint_pairs, dtype=np.intp).reshape(-1, 2)
+        self.triples = np.asarray(self.triples, dtype=np.intp).reshape(-1, 3)
+
+    def _index(self, joint):
+        if isinstance(joint, tuple):
+            pair = [int(joint[0]), int(joint[1])]
+            if pair not in self.midpoint_pairs:
+                self.midpoint_pairs.append(pair)
+            return NUM_LANDMARKS + self.midpoint_pairs.index(pair)
+        return int(joint)
+
+    def with_midpoints(self, points):
+        """Append the midpoint rows after the 33 landmarks: (..., 33 + P, 4)"""
+        if not len(self.midpoint_pairs):
+            return points
+        mids = points[..., self.midpoint_pairs, :].mean(axis=-2)
+        return np.concatenate([points, mids], axis=-2)
+
+    def compute(self, points, min_visibility=None):
+        """(..., 33, 4) landmarks -> (..., K) angles in the order of self.names.
+        With min_visibility (a scalar or one threshold per landmark), angles that use
+        a landmark below its threshold come back as NaN."""
+        points = self.with_midpoints(points)
+        angles = joint_angles(points, self.triples)
+        if min_visibility is not None:
+            visible = points[..., :NUM_LANDMARKS, 3] >= min_visibility
+            if len(self.midpoint_pairs):
+                visible = np.concatenate([visible, visible[..., self.midpoint_pairs].all(axis=-1)], axis=-1)
+            angles = np.where(visible[..., self.triples].all(axis=-1), angles, np.nan)
+        return angles
@@ -0,0 +1,252 @@
+import argparse
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from exercise_rules import FrameResult
+from exercises import EXERCISES
+from kinematics import NUM_LANDMARKS, PoseLandmark, PoseResults, to_pixels
+from session_recording import FEEDBACK_CODE, load_recording
+
+DEFAULT_FRAME_SHAPE = (480, 640, 3)  # Webcam frame the synthetic streams are scaled to
+SYNTHETIC_FPS = 30
+REP_SECONDS = 2.0  # Length of one synthetic repetition
+SYNTHETIC_NOISE = 0.002  # Landmark jitter, in frame heights
+SYNTHETIC_VISIBILITY = 0.99
+
+
+class NullCueQueue:
+    """Stands in for the CueScheduler so no TTS request or audio device is involved"""
+
+    def __init__(self):
+        self.cues = 0
+
+    def put(self, text, priority=None):
+        self.cues += 1
+
+    def stats(self):
+        return {"pending": 0, "played": 0, "coalesced": 0, "dropped": 0, "cache_hits": 0, "cache_misses": 0}
+
+
+# Front view of a person standing upright, (x, y) in frame heights with x = 0 in the
+# middle of the body; the right side mirrors the left one
+STANDING = {
+    PoseLandmark.NOSE: (0.0, 0.15),
+    PoseLandmark.LEFT_EYE_INNER: (0.01, 0.135),
+    PoseLandmark.LEFT_EYE: (0.02, 0.135),
+    PoseLandmark.LEFT_EYE_OUTER: (0.03, 0.135),
+    PoseLandmark.LEFT_EAR: (0.045, 0.145),
+    PoseLandmark.MOUTH_LEFT: (0.015, 0.175),
+    PoseLandmark.LEFT_SHOULDER: (0.09, 0.25),
+    PoseLandmark.LEFT_ELBOW: (0.11, 0.40),
+    PoseLandmark.LEFT_WRIST: (0.12, 0.53),
+    PoseLandmark.LEFT_PINKY: (0.125, 0.56),
+    PoseLandmark.LEFT_INDEX: (0.12, 0.565),
+    PoseLandmark.LEFT_THUMB: (0.11, 0.555),
+    PoseLandmark.LEFT_HIP: (0.06, 0.50),
+    PoseLandmark.LEFT_KNEE: (0.065, 0.75),
+    PoseLandmark.LEFT_ANKLE: (0.065, 0.92),
+    PoseLandmark.LEFT_HEEL: (0.06, 0.94),
+    PoseLandmark.LEFT_FOOT_INDEX: (0.075, 0.96),
+}
+
+
+def standing_pose():
+    """(33, 2) standing pose in frame heights"""
+    pose = np.zeros((NUM_LANDMARKS, 2))
+    for landmark, (x, y) in STANDING.items():
+        pose[landmark] = (x, y)
+        if landmark.name.startswith("LEFT_"):
+            pose[PoseLandmark[landmark.name.replace("LEFT_", "RIGHT_", 1)]] = (-x, y)
+    return pose
+
+
+HAND = [PoseLandmark.LEFT_PINKY, PoseLandmark.LEFT_INDEX, PoseLandmark.LEFT_THUMB]
+FACE = list(range(PoseLandmark.NOSE, PoseLandmark.MOUTH_RIGHT + 1))
+
+
+def squat_motion(depth):
+    """Front view squat: everything from the hips up drops by up to 0.2 frame heights
+    while the knees track out over the toes, bending them to about 95°; the feet stay
+    where they are"""
+    poses = np.repeat(standing_pose()[np.newaxis], len(depth), axis=0)
+    poses[:, :PoseLandmark.RIGHT_HIP + 1, 1] += 0.2 * depth[:, np.newaxis]
+    poses[:, PoseLandmark.LEFT_KNEE, 0] += 0.08 * depth
+    poses[:, PoseLandmark.RIGHT_KNEE, 0] -= 0.08 * depth
+    return poses
+
+
+def bicep_motion(depth):
+    """Front view curl of the left arm: the elbow angle goes from 178° down to 20°"""
+    poses = np.repeat(standing_pose()[np.newaxis], len(depth), axis=0)
+    elbow = poses[0, PoseLandmark.LEFT_ELBOW]
+    upper_arm = poses[0, PoseLandmark.LEFT_SHOULDER] - elbow
+    upper_arm /= np.linalg.norm(upper_arm)
+    theta = np.radians(178 - depth * (178 - 20))
+    forearm = np.stack([np.cos(theta) * upper_arm[0] - np.sin(theta) * upper_arm[1],
+                        np.sin(theta) * upper_arm[0] + np.cos(theta) * upper_arm[1]], axis=-1)
+    poses[:, PoseLandmark.LEFT_WRIST] = elbow + 0.13 * forearm
+    poses[:, HAND] = (elbow + 0.16 * forearm)[:, np.newaxis]
+    return poses
+
+
+def pushup_motion(depth):
+    """Side view push-up, head to the left: straight body from the shoulders to the feet,
+    both elbow angles go from 170° down to 80°"""
+    arm = 0.14  # Upper arm and forearm length
+    floor = 0.85
+    theta = np.radians(170 - depth * 90)
+    poses = np.zeros((len(depth), NUM_LANDMARKS, 2))
+    shoulder = np.stack([np.full(len(depth), -0.25), floor - 2 * arm * np.sin(theta / 2)], axis=-1)
+    elbow = np.stack([-0.25 + arm * np.cos(theta / 2), floor - arm * np.sin(theta / 2)], axis=-1)
+    ankle = np.array([0.5, floor])
+    standing = standing_pose()
+    for side in ("LEFT_", "RIGHT_"):
+        poses[:, PoseLandmark[side + "SHOULDER"]] = shoulder
+        poses[:, PoseLandmark[side + "ELBOW"]] = elbow
+        poses[:, [PoseLandmark[side + name] for name in ("WRIST", "PINKY", "INDEX", "THUMB")]] = (-0.25, floor)
+        poses[:, PoseLandmark[side + "HIP"]] = shoulder + 0.45 * (ankle - shoulder)
+        poses[:, PoseLandmark[side + "KNEE"]] = shoulder + 0.72 * (ankle - shoulder)
+        poses[:, PoseLandmark[side + "ANKLE"]] = ankle
+        poses[:, PoseLandmark[side + "HEEL"]] = ankle + (0.02, -0.01)
+        poses[:, PoseLandmark[side + "FOOT_INDEX"]] = ankle + (0.0, 0.02)
+    head = shoulder + (-0.1, -0.02)
+    poses[:, FACE] = head[:, np.newaxis] + (standing[FACE] - standing[PoseLandmark.NOSE])
+    return poses
+
+
+SYNTHETIC_MOTIONS = {"squat": squat_motion, "pushup": pushup_motion, "bicep": bicep_motion}
+
+
+def synthetic_stream(exercise, reps=5, fps=SYNTHETIC_FPS, frame_shape=DEFAULT_FRAME_SHAPE,
+                     rep_seconds=REP_SECONDS, noise=SYNTHETIC_NOISE, seed=0):
+    """Deterministic landmark stream of `reps` clean repetitions of an exercise, no model
+    involved: (timestamps, (T, 33, 4) normalized landmarks). Each repetition starts and
+    ends at rest, and the seeded jitter keeps the features from sitting exactly on a
+    threshold. The poses are built in frame heights and then normalized, so the angles
+    the rules see in pixels are the ones intended."""
+    if exercise not in SYNTHETIC_MOTIONS:
+        raise ValueError(f"No synthetic motion for {exercise!r}, expected one of {sorted(SYNTHETIC_MOTIONS)}")
+    frames = int(round(reps * rep_seconds * fps)) + 1
+    timestamps = np.arange(frames) / fps
+    depth = (1 - np.cos(2 * np.pi * timestamps / rep_seconds)) / 2  # 0 at rest, 1 at the bottom of a rep
+    poses = SYNTHETIC_MOTIONS[exercise](depth)
+    poses += np.random.default_rng(seed).normal(0, noise, poses.shape)
+
+    height, width = frame_shape[:2]
+    landmarks = np.zeros((frames, NUM_LANDMARKS, 4))
+    landmarks[..., 0] = poses[..., 0] * height / width + 0.5
+    landmarks[..., 1] = poses[..., 1]
+    landmarks[..., 3] = SYNTHETIC_VISIBILITY
+    return timestamps, landmarks
+
+
+def load_series(path):
+    """A session recording as (exercise name, frame shape, timestamps, (T, 33, 4)
+    normalized landmarks, recorded feedback codes). Frames without a pose are NaN rows."""
+    header, records = load_recording(path)
+    frame_shape = (header["height"], header["width"], 3)
+    landmarks = records["landmarks"].astype(np.float64)
+    timestamps = np.asarray(records["timestamp"])
+    return header["exercise"], frame_shape, timestamps, landmarks, np.asarray(records["feedback"])
+
+
+def pose_results(landmarks):
+    """PoseResults for each frame of a (T, 33, 4) series, to feed the process_* functions
+    the way Pose.process would; frames without a pose come out like a missed detection"""
+    for points in landmarks:
+        yield PoseResults(None if np.isnan(points[:, :3]).all() else points)
+
+
+def replay(exercise, landmarks, frame_shape=DEFAULT_FRAME_SHAPE, state=None):
+    """Step an exercise's rules over a (T, 33, 4) series of normalized landmarks at full
+    speed, yielding a FrameResult per frame. Features and conditions for the whole
+    series are one batched call, only the phase machine runs per frame. Nothing is
+    spoken, logged, recorded or drawn."""
+    state = state or exercise.new_state()
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    points = to_pixels(landmarks, frame_shape)
+    values = exercise.compute_features(points, frame_shape)
+    conditions = exercise.compute_conditions(values)
+    has_pose = ~np.isnan(landmarks[..., :3]).all(axis=(-2, -1))
+    no_pose = exercise.definition.get("default_feedback", "")
+    for index in range(len(points)):
+        if not has_pose[index]:
+            result = FrameResult(exercise.text(no_pose), pose=False)
+            result.phase = state.phase
+            yield result
+            continue
+        yield exercise.evaluate(points[index], state, frame_shape, values[index], conditions[index])
+
+
+def summarize(exercise, landmarks, frame_shape=DEFAULT_FRAME_SHAPE, recorded_feedback=None):
+    """Replay a series and count what happened: reps, faults, rules and phase changes.
+    With the feedback codes of a recording, frames whose last log type differs from the
+    recorded one are counted as mismatches (rules changed, or float16 rounding flipped a
+    threshold)."""
+    summary = {"exercise": exercise.name, "frames": 0, "pose_frames": 0, "reps": 0,
+               "transitions": 0, "faults": Counter(), "rules": Counter()}
+    mismatches = 0
+    result = None
+    start = time.perf_counter()
+    for index, result in enumerate(replay(exercise, landmarks, frame_shape)):
+        summary["frames"] += 1
+        summary["pose_frames"] += result.pose
+        summary["reps"] += result.rep
+        summary["transitions"] += result.transition is not None
+        summary["faults"].update(result.faults)
+        summary["rules"].update(result.rules)
+        if recorded_feedback is not None:
+            code = FEEDBACK_CODE.get(result.logs[-1][0], 0) if result.logs else 0
+            mismatches += code != recorded_feedback[index]
+    elapsed = time.perf_counter() - start
+    summary.update({
+        "faults": dict(summary["faults"]),
+        "rules": dict(summary["rules"]),
+        "final_phase": None if result is None else result.phase,
+        "seconds": round(elapsed, 4),
+        "fps": round(summary["frames"] / elapsed, 1) if elapsed else None,
+    })
+    if recorded_feedback is not None:
+        summary["feedback_mismatches"] = int(mismatches)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay session recordings or synthetic landmark streams through the exercise "
+                    "rules at full speed, without a camera or the pose model.")
+    parser.add_argument("recordings", nargs="*", help=".rec session recordings")
+    parser.add_argument("--synthetic", action="append", default=[], choices=sorted(SYNTHETIC_MOTIONS),
+                        help="replay a synthetic stream of this exercise (repeatable)")
+    parser.add_argument("--reps", type=int, default=10, help="repetitions per synthetic stream")
+    parser.add_argument("--exercise", choices=sorted(EXERCISES), default=None,
+                        help="score recordings with these rules instead of the recorded exercise's")
+    parser.add_argument("--repeat", type=int, default=1, help="replays per input, the fastest is reported")
+    args = parser.parse_args()
+    if not args.recordings and not args.synthetic:
+        parser.error("nothing to replay, give recordings or --synthetic")
+
+    inputs = []
+    for path in args.recordings:
+        name, frame_shape, _, landmarks, feedback = load_series(path)
+        exercise = EXERCISES[args.exercise or name]
+        inputs.append((path, exercise, landmarks, frame_shape, feedback if exercise.name == name else None))
+    for name in args.synthetic:
+        _, landmarks = synthetic_stream(name, args.reps)
+        inputs.append((f"synthetic {name}", EXERCISES[name], landmarks, DEFAULT_FRAME_SHAPE, None))
+
+    for label, exercise, landmarks, frame_shape, feedback in inputs:
+        runs = [summarize(exercise, landmarks, frame_shape, feedback) for _ in range(max(1, args.repeat))]
+        summary = max(runs, key=lambda run: run["fps"] or 0)
+        line = (f"{os.path.basename(label)}: {summary['frames']} frames, {summary['reps']} reps, "
+                f"faults {summary['faults']}, {summary['fps']} fps")
+        if "feedback_mismatches" in summary:
+            line += f", {summary['feedback_mismatches']} feedback mismatches"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
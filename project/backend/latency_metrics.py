@@ -0,0 +1,119 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, from a cheap conversion up to a slow inference
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations, Prometheus style"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """(le, cumulative count) pairs ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), total
+
+
+class StageMetrics:
+    """Per-stage latency histograms of the analysis routes, labelled by route and stage,
+    plus request counts by status. render() returns the Prometheus text format."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # (route, stage) -> Histogram
+        self._requests = {}  # (route, status) -> count
+        self._lock = threading.Lock()
+
+    def observe(self, route, timings, status=None):
+        with self._lock:
+            for name, seconds in timings.items():
+                histogram = self._histograms.get((route, name))
+                if histogram is None:
+                    histogram = self._histograms[(route, name)] = Histogram(self.buckets)
+                histogram.observe(seconds)
+            if status is not None:
+                self._requests[(route, status)] = self._requests.get((route, status), 0) + 1
+
+    def render(self):
+        lines = ["# HELP analysis_stage_seconds Time spent in each stage of frame analysis",
+                 "# TYPE analysis_stage_seconds histogram"]
+        with self._lock:
+            for (route, name), histogram in sorted(self._histograms.items()):
+                labels = f'route="{route}",stage="{name}"'
+                for le, count in histogram.samples():
+                    lines.append(f'analysis_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"analysis_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"analysis_stage_seconds_count{{{labels}}} {histogram.count}")
+            lines += ["# HELP analysis_requests_total Analysis requests by response status",
+                      "# TYPE analysis_requests_total counter"]
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f'analysis_requests_total{{route="{route}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+def begin_timings():
+    """Start collecting stage timings for the request handled by this thread"""
+    _local.timings = {}
+    _local.start = time.perf_counter()
+
+
+def end_timings():
+    """Stop collecting; returns the stage timings with "total" added, None when none were begun"""
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        return None
+    timings["total"] = time.perf_counter() - _local.start
+    _local.timings = None
+    return timings
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request; repeated stages add up.
+    Outside a request (batch runs, warm-up) this only costs the clock reads."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def server_timing(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+
+def render_metric(name, kind, help_text, samples):
+    """One metric family in Prometheus text format; samples are (labels, value) with
+    labels a tuple of (name, value) pairs"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
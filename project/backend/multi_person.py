@@ -0,0 +1,245 @@
+import itertools
+import os
+import time
+
+import cv2
+import numpy as np
+
+from exercise_rules import mediapipe_drawing
+from kinematics import landmarks_to_array
+from latency_metrics import stage
+from pose_pool import PoolBusyError
+from pose_roi import ROI_MARGIN, ROI_MIN_VISIBILITY
+from session_store import Session
+
+GROUP_DETECT_EVERY = int(os.environ.get("GROUP_DETECT_EVERY", "5"))  # Frames between person detector runs
+GROUP_MAX_PEOPLE = int(os.environ.get("GROUP_MAX_PEOPLE", "6"))  # Tracks per camera
+DETECT_WIDTH = 480  # Frames are shrunk to this width for the person detector
+DETECT_MIN_SCORE = 0.3  # HOG SVM score a detection needs
+DETECT_NMS = 0.4  # Overlap above which the weaker of two detections is dropped
+TRACK_MATCH_IOU = 0.3  # Overlap a detection needs with a track to be that track's person
+TRACK_DUPLICATE_IOU = 0.6  # Two tracks whose people overlap this much are following the same one
+TRACK_MAX_MISSES = 10  # Frames without a pose before a track is dropped
+# Exercises done lying down, which the upright-person detector never finds anyone in
+HORIZONTAL_EXERCISES = {"pushup"}
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x0, y0, x1, y1) boxes"""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+def landmark_box(landmarks, frame_shape):
+    """Pixel box around the visible landmarks, None when too few are visible"""
+    visible = landmarks[:, 3] >= ROI_MIN_VISIBILITY
+    if visible.sum() < 4:
+        return None
+    xs = landmarks[visible, 0] * frame_shape[1]
+    ys = landmarks[visible, 1] * frame_shape[0]
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+
+class PersonDetector:
+    """OpenCV's HOG people detector on a shrunken frame: no model download, and cheap
+    enough to run every few frames. Returns padded (x0, y0, x1, y1) pixel boxes.
+    Its model is of upright pedestrians, so athletes lying down (HORIZONTAL_EXERCISES)
+    are not detected and group tracking does not support those exercises."""
+
+    def __init__(self, width=DETECT_WIDTH, margin=ROI_MARGIN):
+        self.width = width
+        self.margin = margin
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / width)
+        small = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale,
+                                                      interpolation=cv2.INTER_LINEAR)
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return []
+        keep = cv2.dnn.NMSBoxes([list(map(int, rect)) for rect in rects],
+                                np.asarray(weights, dtype=np.float32).reshape(-1).tolist(),
+                                DETECT_MIN_SCORE, DETECT_NMS)
+        boxes = []
+        for index in np.asarray(keep, dtype=np.intp).reshape(-1):
+            x, y, w, h = np.asarray(rects[index], dtype=np.float64) / scale
+            pad = self.margin / 2 * max(w, h)
+            boxes.append((int(max(0, x - pad)), int(max(0, y - pad)),
+                          int(min(width, x + w + pad)), int(min(height, y + h + pad))))
+        return boxes
+
+
+class TrackCues:
+    """Cue queue of one track: cues name the athlete they are meant for"""
+
+    def __init__(self, audio_queue, track_id):
+        self.audio_queue = audio_queue
+        self.track_id = track_id
+
+    def put(self, text, priority=None):
+        if self.audio_queue is not None:
+            self.audio_queue.put(f"Athlete {self.track_id}, {text}", priority)
+
+
+class PersonTrack:
+    """One athlete in a group: a persistent id and a Session of its own (Pose tracker or
+    pool worker, region of interest, exercise states, set summary, rep segmentation)"""
+
+    def __init__(self, track_id, group_id, box, frame_shape, audio_queue=None):
+        self.id = track_id
+        self.session = Session(f"{group_id}#{track_id}")
+        self.box = box  # Where to look for the athlete when the crop lost them
+        self.session.roi.set_box(box, frame_shape)
+        self.misses = 0
+        self.cues = TrackCues(audio_queue, track_id)
+
+    def current_box(self):
+        return self.session.roi.box or self.box
+
+
+class GroupTracker:
+    """Multi-person pose for one camera. A person detector runs every `detect_every`
+    frames (and whenever a track lost its athlete); detections are matched to tracks by
+    box overlap, the rest start new tracks. In between, every track follows its athlete
+    with its own landmark-driven crop. All crops of a frame go to the PosePool together,
+    so the cost grows with the number of people and they run on the workers in parallel."""
+
+    def __init__(self, group_id, pool=None, audio_queue=None, on_close=None,
+                 detect_every=GROUP_DETECT_EVERY, max_people=GROUP_MAX_PEOPLE):
+        self.group_id = group_id
+        self.pool = pool
+        self.audio_queue = audio_queue
+        self.on_close = on_close  # Called with a track's session id after it is dropped
+        self.detect_every = max(1, detect_every)
+        self.max_people = max_people
+        self.detector = PersonDetector()
+        self.tracks = {}  # Track id -> PersonTrack
+        self.frames = 0
+        self.frame_shape = None  # (height, width) the track boxes are in pixels of
+        self._ids = itertools.count(1)
+
+    def estimate(self, frame, tier, floor="lite", smooth=True):
+        """Landmarks of everyone tracked in this frame: [(PersonTrack, (33, 4) normalized
+        landmarks)], ordered by track id. Every track runs the requested Pose model tier,
+        each stepping down on its own (not below floor) while over the latency budget.
+        A change of frame size (resolution, rotation) ends all tracks: their boxes cannot
+        be carried over, so everyone is detected afresh."""
+        if self.frame_shape is not None and frame.shape[:2] != self.frame_shape:
+            self.close()
+        self.frame_shape = frame.shape[:2]
+        lost = any(track.misses for track in self.tracks.values())
+        if not self.tracks or lost or self.frames % self.detect_every == 0:
+            with stage("detect"):
+                self._assign(self.detector.detect(frame), frame.shape)
+        self.frames += 1
+
+        tracks = list(self.tracks.values())
+        for track in tracks:
+            track.session.tiers.select(tier, floor, smooth)
+        with stage("preprocess"):
+            prepared = [track.session.roi.prepare(frame) for track in tracks]
+        outputs = self._infer(tracks, [image for image, _ in prepared])
+
+        found = []
+        for track, (_, box), landmarks in zip(tracks, prepared, outputs):
+            if isinstance(landmarks, PoolBusyError):
+                continue  # Backpressure, not a lost athlete: skip the frame, keep the track as it is
+            full = track.session.roi.update(box, landmarks, frame.shape)
+            if full is None:
+                track.misses += 1
+                track.session.roi.set_box(track.box, frame.shape)
+                continue
+            track.misses = 0
+            track.box = track.session.roi.box or box
+            found.append((track, full))
+
+        found = self._drop_duplicates(found, frame.shape)
+        for track in [track for track in self.tracks.values() if track.misses > TRACK_MAX_MISSES]:
+            self._drop(track)
+        return sorted(found, key=lambda item: item[0].id)
+
+    def _infer(self, tracks, images):
+        if self.pool is not None:
+            # Color conversion and inference happen in the workers; each track's governor
+            # sees the round trip of the whole batch, which is what its frame waited for
+            start = time.perf_counter()
+            with stage("pose"):
+                outputs = self.pool.process_batch([(track.session.session_id, image, track.session.pose_options())
+                                                   for track, image in zip(tracks, images)])
+            elapsed = time.perf_counter() - start
+            for track in tracks:
+                track.session.tiers.observe(elapsed, self.pool.queue_depth(track.session.session_id))
+            return outputs
+        outputs = []
+        for track, image in zip(tracks, images):
+            start = time.perf_counter()
+            with stage("color"):
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            with stage("pose"):
+                found = track.session.pose.process(rgb_image).pose_landmarks
+            track.session.tiers.observe(time.perf_counter() - start)
+            outputs.append(landmarks_to_array(found) if found else None)
+        return outputs
+
+    def _assign(self, detections, frame_shape):
+        """Greedy matching of detections to tracks, best overlap first"""
+        pairs = sorted(((box_iou(track.current_box(), box), track_id, index)
+                        for track_id, track in self.tracks.items() for index, box in enumerate(detections)),
+                       reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for iou, track_id, index in pairs:
+            if iou < TRACK_MATCH_IOU:
+                break
+            if track_id in matched_tracks or index in matched_boxes:
+                continue
+            matched_tracks.add(track_id)
+            matched_boxes.add(index)
+            track = self.tracks[track_id]
+            if track.misses:
+                # Lost athlete found again: look where the detector saw them
+                track.box = detections[index]
+                track.session.roi.set_box(detections[index], frame_shape)
+        for index, box in enumerate(detections):
+            if index not in matched_boxes and len(self.tracks) < self.max_people:
+                track_id = next(self._ids)
+                self.tracks[track_id] = PersonTrack(track_id, self.group_id, box, frame_shape, self.audio_queue)
+
+    def _drop_duplicates(self, found, frame_shape):
+        """Two tracks that ended up on the same athlete: the newer one goes"""
+        boxes = {track.id: landmark_box(landmarks, frame_shape) for track, landmarks in found}
+        kept = []
+        for track, landmarks in sorted(found, key=lambda item: item[0].id):
+            box = boxes[track.id]
+            if box is not None and any(boxes[other.id] is not None and box_iou(box, boxes[other.id])
+                                       > TRACK_DUPLICATE_IOU for other, _ in kept):
+                self._drop(track)
+                continue
+            kept.append((track, landmarks))
+        return kept
+
+    def _drop(self, track):
+        self.tracks.pop(track.id, None)
+        track.session.close()
+        if self.on_close is not None:
+            self.on_close(track.session.session_id)
+
+    def close(self):
+        for track in list(self.tracks.values()):
+            self._drop(track)
+
+
+def draw_person(frame, track, results, result):
+    """Skeleton and "#id feedback" above the athlete's box, in place"""
+    drawing_utils, _, connections = mediapipe_drawing()
+    drawing_utils.draw_landmarks(frame, results.pose_landmarks, connections)
+    x0, y0 = track.box[:2]
+    cv2.putText(frame, f"#{track.id} {result.feedback}", (int(x0), max(20, int(y0) - 8)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return frame
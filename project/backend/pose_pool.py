@@ -0,0 +1,261 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+POSE_OPTIONS = {"min_detection_confidence": 0.6, "min_tracking_confidence": 0.6}
+POSE_WORKERS = int(os.environ.get("POSE_WORKERS", os.cpu_count() or 1))  # 0 runs Pose in the request thread
+POSE_QUEUE_SIZE = 4  # Frames waiting per worker before new ones are rejected
+POSE_TIMEOUT = 5  # Seconds to wait for a worker before giving up on a frame
+LATENCY_WINDOW = 512  # Recent frames the latency percentiles are computed over
+
+
+class PoolBusyError(Exception):
+    """Raised when a worker's queue is full and the frame was not accepted"""
+
+
+def _worker(tasks, results, default_options):
+    """Worker process: one MediaPipe Pose per session assigned to this worker, so the
+    tracker keeps following the same person from frame to frame. A frame asking for
+    other options (a different model tier) replaces the session's tracker."""
+    import cv2
+
+    from kinematics import landmarks_to_array
+    from pose_tiers import create_pose
+
+    trackers = {}  # session id -> (options, Pose)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        if task[0] == "close":
+            tracker = trackers.pop(task[1], None)
+            if tracker is not None:
+                tracker[1].close()
+            continue
+
+        _, request_id, session_id, frame, options = task
+        options = options or default_options
+        start = time.perf_counter()
+        try:
+            tracker = trackers.get(session_id)
+            if tracker is None or tracker[0] != options:
+                if tracker is not None:
+                    tracker[1].close()
+                tracker = trackers[session_id] = (options, create_pose(options))
+            pose = tracker[1]
+            found = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).pose_landmarks
+            landmarks = landmarks_to_array(found).astype(np.float32) if found else None
+            results.put((request_id, landmarks, time.perf_counter() - start, None))
+        except Exception as e:
+            results.put((request_id, None, time.perf_counter() - start, str(e)))
+
+    for _, pose in trackers.values():
+        pose.close()
+
+
+class PosePool:
+    """Pose estimation spread over worker processes, one MediaPipe graph per core.
+
+    Every session sticks to the worker it was first assigned (the one with the fewest
+    sessions), each worker has a bounded queue, and submit() hands back a Future of
+    the (33, 4) normalized landmarks, or None when no pose was found. Workers are
+    started on first use."""
+
+    def __init__(self, workers=POSE_WORKERS, queue_size=POSE_QUEUE_SIZE, options=None):
+        self.size = max(1, workers)
+        self.queue_size = queue_size
+        self.options = dict(options or POSE_OPTIONS)
+        # spawn: the parent already runs threads, forking it would copy their locks
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._started = False
+        self._processes = [None] * self.size
+        self._tasks = [None] * self.size
+        self._results = None
+        self._futures = {}  # request id -> (Future, worker, submit time)
+        self._ids = itertools.count()
+        self._assigned = {}  # session id -> worker
+        self._pending = [0] * self.size
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._latency = deque(maxlen=LATENCY_WINDOW)
+        self._inference = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._results = self._ctx.Queue()
+            for index in range(self.size):
+                self._spawn(index)
+            threading.Thread(target=self._collect, daemon=True).start()
+            self._started = True
+
+    def _spawn(self, index):
+        self._tasks[index] = self._ctx.Queue(self.queue_size)
+        process = self._ctx.Process(target=_worker, args=(self._tasks[index], self._results, self.options),
+                                    name=f"pose-worker-{index}", daemon=True)
+        process.start()
+        self._processes[index] = process
+
+    def submit(self, session_id, frame, options=None):
+        """options overrides the pool's Pose options for this frame (model tier)"""
+        self.start()
+        with self._lock:
+            index = self._assigned.get(session_id)
+            if index is None:
+                counts = [0] * self.size
+                for assigned in self._assigned.values():
+                    counts[assigned] += 1
+                index = counts.index(min(counts))
+                self._assigned[session_id] = index
+            request_id = next(self._ids)
+            future = Future()
+            try:
+                self._tasks[index].put_nowait(("frame", request_id, session_id, frame, options))
+            except queue.Full:
+                self._rejected += 1
+                raise PoolBusyError(f"Pose worker {index} is busy")
+            self._futures[request_id] = (future, index, time.perf_counter())
+            self._pending[index] += 1
+            self._submitted += 1
+        return future
+
+    def process(self, session_id, frame, timeout=POSE_TIMEOUT, options=None):
+        """Blocking submit: (33, 4) landmarks or None"""
+        future = self.submit(session_id, frame, options)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            self._check_workers()
+            raise
+
+    def process_batch(self, items, timeout=POSE_TIMEOUT):
+        """Blocking submit of several (session_id, frame, options) at once, e.g. the crops
+        of every athlete in one frame, so they run on the workers in parallel. Returns
+        landmarks or None per item; an item whose worker queue was full comes back as its
+        PoolBusyError (and is counted as rejected), so callers can tell it from no pose."""
+        futures = []
+        for session_id, frame, options in items:
+            try:
+                futures.append(self.submit(session_id, frame, options))
+            except PoolBusyError as e:
+                futures.append(e)
+        deadline = time.perf_counter() + timeout
+        results = []
+        for future in futures:
+            if isinstance(future, PoolBusyError):
+                results.append(future)
+                continue
+            try:
+                results.append(future.result(max(0.0, deadline - time.perf_counter())))
+            except FutureTimeout:
+                self._check_workers()
+                raise
+        return results
+
+    def queue_depth(self, session_id):
+        """Frames waiting in (or running on) the worker the session is assigned to"""
+        with self._lock:
+            index = self._assigned.get(session_id)
+            return 0 if index is None else self._pending[index]
+
+    def release(self, session_id):
+        """Drop a session's tracker in its worker"""
+        with self._lock:
+            index = self._assigned.pop(session_id, None)
+            if index is None or not self._started:
+                return
+            try:
+                self._tasks[index].put_nowait(("close", session_id))
+            except queue.Full:
+                pass  # The worker keeps a stale tracker until it restarts
+
+    def _collect(self):
+        while True:
+            request_id, landmarks, inference_time, error = self._results.get()
+            with self._lock:
+                entry = self._futures.pop(request_id, None)
+                if entry is None:
+                    continue  # Already failed by a worker restart
+                future, index, submitted = entry
+                self._pending[index] -= 1
+                self._completed += 1
+                self._latency.append(time.perf_counter() - submitted)
+                self._inference.append(inference_time)
+            if error is not None:
+                future.set_exception(RuntimeError(f"Pose worker failed: {error}"))
+            else:
+                future.set_result(landmarks)
+
+    def _check_workers(self):
+        """Restart workers that died; their sessions start tracking from scratch"""
+        failed = []
+        with self._lock:
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                for request_id, (future, assigned, _) in list(self._futures.items()):
+                    if assigned == index:
+                        failed.append(self._futures.pop(request_id)[0])
+                self._pending[index] = 0
+                self._restarts += 1
+                self._spawn(index)
+        for future in failed:
+            future.set_exception(RuntimeError("Pose worker exited"))
+
+    def metrics(self):
+        with self._lock:
+            latency = np.array(self._latency) * 1000
+            inference = np.array(self._inference) * 1000
+            sessions = [0] * self.size
+            for index in self._assigned.values():
+                sessions[index] += 1
+            return {
+                "workers": self.size,
+                "queue_depth": list(self._pending),
+                "queue_capacity": self.queue_size,
+                "sessions": sessions,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "restarts": self._restarts,
+                "latency_ms": _summary(latency),
+                "inference_ms": _summary(inference),
+            }
+
+    def close(self):
+        with self._lock:
+            if not self._started:
+                return
+            for tasks in self._tasks:
+                try:
+                    tasks.put(None, timeout=1)
+                except queue.Full:
+                    pass
+            processes = list(self._processes)
+            self._started = False
+        for process in processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+
+
+def _summary(values):
+    if not len(values):
+        return None
+    return {
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "max": round(float(values.max()), 2),
+    }
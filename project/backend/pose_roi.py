@@ -0,0 +1,115 @@
+import os
+
+import cv2
+import numpy as np
+
+from latency_metrics import stage
+
+ROI_CROP = os.environ.get("ROI_CROP", "1") == "1"  # Crop to the athlete tracked from the previous frame
+POSE_INPUT_SIZE = int(os.environ.get("POSE_INPUT_SIZE", "480"))  # Longest side fed to Pose, 0 = as sent
+ROI_MARGIN = 0.25  # Padding around the landmark bounding box, as a fraction of its longest side
+ROI_MIN_VISIBILITY = 0.5  # Landmarks that count towards the bounding box
+ROI_MIN_SIZE = 96  # Pixels; smaller crops are grown around their center
+
+
+class RegionOfInterest:
+    """Per-session preprocessing in front of pose inference.
+
+    prepare() crops the frame to the box around the person found in the previous
+    frame and shrinks it to at most POSE_INPUT_SIZE on its longest side; update() maps
+    the landmarks Pose returns for that image back to normalized coordinates of the
+    full frame, so everything downstream sees the same landmarks as before.
+
+    The box only moves when the person gets close to its edge (or grows much smaller
+    than it), because MediaPipe's own tracker works in the coordinates of the image it
+    is given and a crop that shifts every frame would keep disturbing it."""
+
+    def __init__(self, crop=ROI_CROP, input_size=POSE_INPUT_SIZE, margin=ROI_MARGIN):
+        self.crop = crop
+        self.input_size = input_size
+        self.margin = margin
+        self.box = None  # (x0, y0, x1, y1) in frame pixels, None = whole frame
+        self.frame_shape = None  # (height, width) of the frame the box is in pixels of
+
+    def set_box(self, box, frame_shape):
+        self.box = box
+        self.frame_shape = tuple(frame_shape[:2])
+
+    def prepare(self, frame):
+        """Returns (image for Pose, box it was cut from)"""
+        height, width = frame.shape[:2]
+        if self.box is not None and self.frame_shape != (height, width):
+            self.box = None  # The client changed resolution (or rotated): the box means nothing here
+        box = (0, 0, width, height)
+        if self.box is not None:
+            x0, y0, x1, y1 = (int(v) for v in self.box)
+            x0, x1 = max(0, min(x0, width)), max(0, min(x1, width))
+            y0, y1 = max(0, min(y0, height)), max(0, min(y1, height))
+            if x1 > x0 and y1 > y0:
+                box = (x0, y0, x1, y1)
+            else:
+                self.box = None
+        x0, y0, x1, y1 = box
+        image = frame[y0:y1, x0:x1]
+        longest = max(x1 - x0, y1 - y0)
+        if self.input_size and longest > self.input_size:
+            scale = self.input_size / longest
+            size = (max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale)))
+            # Bilinear like MediaPipe's own resize; INTER_AREA costs more than inference on big photos
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+        return image, box
+
+    def estimate(self, frame, infer):
+        """Run infer (image -> normalized (33, 4) landmarks or None) on the prepared image
+        and return landmarks for the full frame. When the crop lost the person the
+        full frame is tried once more right away."""
+        while True:
+            with stage("preprocess"):
+                image, box = self.prepare(frame)
+            landmarks = self.update(box, infer(image), frame.shape)
+            if landmarks is not None or box == (0, 0, frame.shape[1], frame.shape[0]):
+                return landmarks
+
+    def update(self, box, landmarks, frame_shape):
+        """(33, 4) landmarks normalized to the prepared image -> normalized to the full
+        frame (None stays None); also moves the box for the next frame"""
+        if landmarks is None:
+            self.box = None
+            return None
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = box
+        full = np.array(landmarks, dtype=np.float64)
+        full[:, 0] = (full[:, 0] * (x1 - x0) + x0) / width
+        full[:, 1] = (full[:, 1] * (y1 - y0) + y0) / height
+        full[:, 2] *= (x1 - x0) / width  # MediaPipe scales z like x
+        if self.crop:
+            self._track(full, width, height)
+        return full
+
+    def _track(self, landmarks, width, height):
+        visible = landmarks[:, 3] >= ROI_MIN_VISIBILITY
+        if visible.sum() < 4:
+            self.box = None
+            return
+        xs = landmarks[visible, 0] * width
+        ys = landmarks[visible, 1] * height
+        left, right, top, bottom = xs.min(), xs.max(), ys.min(), ys.max()
+        pad = self.margin * max(right - left, bottom - top)
+
+        if self.box is not None:
+            bx0, by0, bx1, by1 = self.box
+            inner = pad / 2
+            inside = (left - bx0 >= inner and bx1 - right >= inner and
+                      top - by0 >= inner and by1 - bottom >= inner)
+            oversized = (bx1 - bx0) * (by1 - by0) > 4 * (right - left + 2 * pad) * (bottom - top + 2 * pad)
+            if inside and not oversized:
+                return
+
+        cx, cy = (left + right) / 2, (top + bottom) / 2
+        half_w = max(right - left + 2 * pad, ROI_MIN_SIZE) / 2
+        half_h = max(bottom - top + 2 * pad, ROI_MIN_SIZE) / 2
+        box = (int(max(0, cx - half_w)), int(max(0, cy - half_h)),
+               int(min(width, np.ceil(cx + half_w))), int(min(height, np.ceil(cy + half_h))))
+        # A box covering (almost) the whole frame is just the frame
+        self.set_box(None if (box[2] - box[0]) * (box[3] - box[1]) > 0.9 * width * height else box,
+                     (height, width))
@@ -0,0 +1,118 @@
+import os
+from collections import deque
+
+import numpy as np
+
+from kinematics import mediapipe_solutions
+
+POSE_TIERS = {"lite": 0, "full": 1, "heavy": 2}  # Tier name -> MediaPipe model_complexity, lightest first
+DEFAULT_POSE_TIER = os.environ.get("POSE_TIER", "full")
+POSE_TIER_FALLBACK = os.environ.get("POSE_TIER_FALLBACK", "1") == "1"  # Step down when over budget
+POSE_LATENCY_BUDGET = float(os.environ.get("POSE_LATENCY_BUDGET", "0.1"))  # Seconds, p95 per inferred frame
+POSE_QUEUE_BUDGET = 2  # Frames waiting in the session's worker queue before stepping down
+TIER_WINDOW = 30  # Inferred frames the latency percentile is taken over
+TIER_RECOVER_FRAMES = 150  # Comfortable frames before trying the next heavier tier again
+TIER_HEADROOM = 0.5  # Fraction of the budget the p95 must stay under to step back up
+BUNDLED_COMPLEXITY = 1  # The only model shipped in the wheel; lite and heavy are downloaded on first use
+
+
+def check_tier(tier):
+    if tier not in POSE_TIERS:
+        raise ValueError(f"Unknown pose tier: {tier} (expected one of {', '.join(POSE_TIERS)})")
+    return tier
+
+
+def pose_options(base, tier, smooth=True):
+    """Pose keyword arguments for a tier on top of the base confidence options"""
+    return {**base, "model_complexity": POSE_TIERS[tier], "smooth_landmarks": smooth}
+
+
+def create_pose(options):
+    """MediaPipe Pose for options. When the tier's model cannot be downloaded (offline
+    machines) the bundled full model is used instead."""
+    pose_module = mediapipe_solutions().pose
+    try:
+        return pose_module.Pose(**options)
+    except Exception as e:
+        if options.get("model_complexity", BUNDLED_COMPLEXITY) == BUNDLED_COMPLEXITY:
+            raise
+        print(f"Pose model_complexity={options['model_complexity']} unavailable ({e}), using the full model")
+        return pose_module.Pose(**{**options, "model_complexity": BUNDLED_COMPLEXITY})
+
+
+class TierGovernor:
+    """Model tier of one session. The client (or the exercise) asks for a tier; while the
+    p95 inference latency over the last TIER_WINDOW frames is above the budget, or
+    frames pile up in the session's worker queue, the session steps down to the next
+    lighter tier, but never below the exercise's floor. After TIER_RECOVER_FRAMES
+    comfortable frames it tries the heavier tier again; a retry that goes straight
+    back over budget doubles the wait before the next one."""
+
+    def __init__(self, tier=DEFAULT_POSE_TIER, fallback=POSE_TIER_FALLBACK,
+                 latency_budget=POSE_LATENCY_BUDGET, queue_budget=POSE_QUEUE_BUDGET):
+        self.requested = check_tier(tier)
+        self.floor = tier
+        self.tier = tier
+        self.smooth = True
+        self.fallback = fallback
+        self.latency_budget = latency_budget
+        self.queue_budget = queue_budget
+        self.recover_frames = TIER_RECOVER_FRAMES
+        self.downgrades = 0
+        self.upgrades = 0
+        self._latency = deque(maxlen=TIER_WINDOW)
+        self._comfortable = 0
+        self._probing = False  # Just stepped up, a quick step down means the tier is too heavy
+
+    def select(self, requested, floor="lite", smooth=True):
+        """Set the tier asked for this frame; a new request starts over at that tier"""
+        check_tier(requested)
+        floor = min(check_tier(floor), requested, key=POSE_TIERS.get)
+        if (requested, floor) != (self.requested, self.floor):
+            self.requested, self.floor, self.tier = requested, floor, requested
+            self.recover_frames = TIER_RECOVER_FRAMES
+            self._reset()
+        self.smooth = smooth
+
+    def options(self, base):
+        return pose_options(base, self.tier, self.smooth)
+
+    def observe(self, seconds, queue_depth=0):
+        """Record one inferred frame's latency (and the queue in front of it)"""
+        if not self.fallback:
+            return
+        self._latency.append(seconds)
+        over_queue = queue_depth > self.queue_budget
+        if len(self._latency) < TIER_WINDOW and not over_queue:
+            return
+        p95 = float(np.percentile(self._latency, 95))
+        if (p95 > self.latency_budget or over_queue) and POSE_TIERS[self.tier] > POSE_TIERS[self.floor]:
+            if self._probing:
+                self.recover_frames *= 2
+            self._step(-1)
+            self.downgrades += 1
+            return
+        if len(self._latency) == TIER_WINDOW:
+            self._probing = False
+        if p95 < self.latency_budget * TIER_HEADROOM and POSE_TIERS[self.tier] < POSE_TIERS[self.requested]:
+            self._comfortable += 1
+            if self._comfortable >= self.recover_frames:
+                self._step(1)
+                self.upgrades += 1
+                self._probing = True
+        else:
+            self._comfortable = 0
+
+    def _step(self, direction):
+        tiers = list(POSE_TIERS)
+        self.tier = tiers[tiers.index(self.tier) + direction]
+        self._reset()
+
+    def _reset(self):
+        self._latency.clear()
+        self._comfortable = 0
+        self._probing = False
+
+    def status(self):
+        return {"requested": self.requested, "tier": self.tier, "smooth": self.smooth,
+                "downgrades": self.downgrades, "upgrades": self.upgrades}
@@ -1,207 +1,126 @@
-import cv2
-import numpy as np
-import mediapipe as mp
-from datetime import datetime
-import json
-import random
-from mediapipe.python.solutions.pose import PoseLandmark
+from kinematics import PoseLandmark
+from exercise_rules import CompiledExercise, ExerciseState, process_exercise
 
-def calculate_angle(a, b, c):
-    """Calculate angle between three points with safety checks"""
-    if None in [a, b, c] or len(a) < 2 or len(b) < 2 or len(c) < 2:
-        return None
+# Modified thresholds
+ELBOW_DOWN_THRESHOLD = 110
+ELBOW_UP_THRESHOLD = 160
+SPINE_ANGLE_MAX = 180
+SPINE_ANGLE_MIN = 60
+LOG_COOLDOWN = 0.5  # Seconds between log lines of one feedback type; reminders hold for many frames
 
-    a2d = np.array(a[:2])
-    b2d = np.array(b[:2])
-    c2d = np.array(c[:2])
-
-    ba = a2d - b2d
-    bc = c2d - b2d
-
-    if np.linalg.norm(ba) == 0 or np.linalg.norm(bc) == 0:
-        return None
-
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    angle = np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
-    return angle
-
-def get_landmark_point(landmark, frame_shape, visibility_threshold=0.3):
-    """Get landmark coordinates with adjustable visibility threshold"""
-    if landmark.visibility < visibility_threshold:
-        return None
-    return [
-        landmark.x * frame_shape[1],
-        landmark.y * frame_shape[0],
-        landmark.z
-    ]
-
-def log_feedback(feedback_type, coordinates):
-    entry = {
-        "timestamp": datetime.now().isoformat(),
-        "feedback": feedback_type,
-        "coordinates": coordinates
-    }
-    with open("pushup_log.txt", "a") as f:
-        f.write(json.dumps(entry) + "\n")
+CRITICAL_POINTS = [PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER, PoseLandmark.LEFT_ELBOW,
+                   PoseLandmark.RIGHT_ELBOW, PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP]
 
 ENCOURAGEMENT = {
     'perfect_down': ["Awesome depth!", "Great range!", "Perfect form!", "Excellent going down!"],
     'perfect_up': ["Strong push!", "Great extension!", "Nice control!", "Powerful ascent!"],
     'partial_rep': ["You've got this!", "Keep going!", "One more rep!", "Almost there!"],
     'form_reminder': ["Core tight!", "Body straight!", "You're doing great!", "Maintain form!"],
-    'general': ["Every rep counts!", "You're getting stronger!", "Consistency is key!", "Progress happens daily!"]
+    'general': ["Every rep counts!", "You're getting stronger!", "Consistency is key!", "Progress happens daily!"],
+    'bonus': ["You're crushing it!", "Strong work!", "That's the spirit!", "Progress feels good!"]
 }
 
-def get_encouragement(key):
-    return random.choice(ENCOURAGEMENT[key])
-
-def process_pushup(frame, results, mp_pose, last_audio_time, audio_queue, pushup_phase, current_time, AUDIO_COOLDOWN):
-    feedback = random.choice(ENCOURAGEMENT['general']) + " Let's go!"
-    frame_shape = frame.shape
-    annotated_frame = frame.copy()
-
-    # Modified thresholds
-    ELBOW_DOWN_THRESHOLD = 110
-    ELBOW_UP_THRESHOLD = 160
-    SPINE_ANGLE_MAX = 180
-    SPINE_ANGLE_MIN = 60
-
-    try:
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
-
-            # Get key landmarks
-            landmark_points = {
-                'shoulderL': get_landmark_point(landmarks[PoseLandmark.LEFT_SHOULDER], frame_shape, 0.3),
-                'shoulderR': get_landmark_point(landmarks[PoseLandmark.RIGHT_SHOULDER], frame_shape, 0.3),
-                'elbowL': get_landmark_point(landmarks[PoseLandmark.LEFT_ELBOW], frame_shape, 0.3),
-                'elbowR': get_landmark_point(landmarks[PoseLandmark.RIGHT_ELBOW], frame_shape, 0.3),
-                'wristL': get_landmark_point(landmarks[PoseLandmark.LEFT_WRIST], frame_shape, 0.3),
-                'wristR': get_landmark_point(landmarks[PoseLandmark.RIGHT_WRIST], frame_shape, 0.3),
-                'hipL': get_landmark_point(landmarks[PoseLandmark.LEFT_HIP], frame_shape, 0.3),
-                'hipR': get_landmark_point(landmarks[PoseLandmark.RIGHT_HIP], frame_shape, 0.3),
-                'kneeL': get_landmark_point(landmarks[PoseLandmark.LEFT_KNEE], frame_shape, 0.1),
-            }
-
-            critical_points = ['shoulderL', 'shoulderR', 'elbowL', 'elbowR', 'hipL', 'hipR']
-            if any(landmark_points[p] is None for p in critical_points):
-                return feedback, annotated_frame, pushup_phase, last_audio_time
-
-            angleElbowL = calculate_angle(landmark_points['shoulderL'], landmark_points['elbowL'], landmark_points['wristL'])
-            angleElbowR = calculate_angle(landmark_points['shoulderR'], landmark_points['elbowR'], landmark_points['wristR'])
-            angleShoulderL = calculate_angle(landmark_points['hipL'], landmark_points['shoulderL'], landmark_points['elbowL'])
-            angleShoulderR = calculate_angle(landmark_points['hipR'], landmark_points['shoulderR'], landmark_points['elbowR'])
-
-            spine_angle = None
-            if landmark_points['kneeL'] is not None:
-                raw_spine_angle = calculate_angle(landmark_points['shoulderL'], landmark_points['hipL'], landmark_points['kneeL'])
-                spine_angle = int(raw_spine_angle) if raw_spine_angle is not None else None
-
-            if any(a is None for a in [angleElbowL, angleElbowR, angleShoulderL, angleShoulderR]):
-                return feedback, annotated_frame, pushup_phase, last_audio_time
-
-            def should_play_audio(msg):
-                return (current_time - last_audio_time) > AUDIO_COOLDOWN and (audio_queue.empty() or audio_queue.queue[-1] != msg)
-
-            # Phase detection with encouragement
-            if pushup_phase == "down" and angleElbowL < ELBOW_DOWN_THRESHOLD and angleElbowR < ELBOW_DOWN_THRESHOLD:
-                msg = f"{get_encouragement('perfect_down')} Perfect, push up now!"
-                feedback = f"Perfect! Push up! ({(180 - int(max(angleElbowL, angleElbowR)))}° depth)"
-                log_feedback("good_form", {
-                    "joint_angles": {
-                        "elbows": [angleElbowL, angleElbowR],
-                        "shoulders": [angleShoulderL, angleShoulderR]
-                    },
-                    "spine": spine_angle
-                })
-                pushup_phase = "up"
-                if should_play_audio(msg):
-                    audio_queue.put(msg)
-                    last_audio_time = current_time
-
-            elif pushup_phase == "up" and angleElbowL > ELBOW_UP_THRESHOLD and angleElbowR > ELBOW_UP_THRESHOLD:
-                msg = f"{get_encouragement('perfect_up')} Try lower down!"
-                feedback = f"Great! Lower down! ({int(min(angleElbowL, angleElbowR))}° extension)"
-                log_feedback("good_form", {
-                    "joint_angles": {
-                        "elbows": [angleElbowL, angleElbowR],
-                        "shoulders": [angleShoulderL, angleShoulderR]
-                    },
-                    "spine": spine_angle
-                })
-                pushup_phase = "down"
-                if should_play_audio(msg):
-                    audio_queue.put(msg)
-                    last_audio_time = current_time
-
-            # Form feedback with positive reinforcement
-            elif spine_angle is not None:
-                if spine_angle > SPINE_ANGLE_MAX:
-                    msg = f"{get_encouragement('form_reminder')} Straighten your back!"
-                    feedback = "Almost perfect! Straighten your back a bit"
-                    log_feedback("form_reminder", {"spine_angle": spine_angle})
-                elif spine_angle < SPINE_ANGLE_MIN:
-                    msg = f"{get_encouragement('form_reminder')} Hips down!"
-                    feedback = " Keep hips down for better form!"
-                    log_feedback("form_reminder", {"spine_angle": spine_angle})
-                
-                if should_play_audio(msg):
-                    audio_queue.put(msg)
-                    last_audio_time = current_time
-
-            elif pushup_phase == "down" and (angleElbowL > ELBOW_DOWN_THRESHOLD or angleElbowR > ELBOW_DOWN_THRESHOLD):
-                msg = f"Keep going lower"
-                feedback = f"Almost there! Current: {int(max(angleElbowL, angleElbowR))}°"
-                log_feedback("depth_reminder", {"elbow_angles": [angleElbowL, angleElbowR]})
-                if should_play_audio(msg):
-                    audio_queue.put(msg)
-                    last_audio_time = current_time
-
-            elif pushup_phase == "up" and (angleElbowL < ELBOW_UP_THRESHOLD or angleElbowR < ELBOW_UP_THRESHOLD):
-                msg = f"{get_encouragement('partial_rep')} Push to full extension!"
-                feedback = f" Keep pushing! Current: {int(min(angleElbowL, angleElbowR))}°"
-                log_feedback("ascent_reminder", {"elbow_angles": [angleElbowL, angleElbowR]})
-                if should_play_audio(msg):
-                    audio_queue.put(msg)
-                    last_audio_time = current_time
-
-            # Random encouragement
-            if random.random() < 0.4:  # 40% chance of extra encouragement
-                encouragement = random.choice([
-                    "You're crushing it!",
-                    "Strong work!",
-                    "That's the spirit!",
-                    "Progress feels good!"
-                ])
-                feedback += f" {encouragement}"
-
-            # Visualization
-            cv2.putText(annotated_frame, feedback, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 100), 2)
-            
-            # Add motivational elements
-            if pushup_phase == "up":
-                cv2.putText(annotated_frame, "↑ PUSH STRONG ↑", (frame_shape[1]-300, 50),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 100), 2)
-            else:
-                cv2.putText(annotated_frame, "↓ CONTROL DESCENT ↓", (frame_shape[1]-350, 50),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 100), 2)
-
-            # Angle displays
-            if landmark_points['elbowL']:
-                cv2.putText(annotated_frame, f'L: {int(angleElbowL)}°', 
-                            (int(landmark_points['elbowL'][0])-30, int(landmark_points['elbowL'][1])-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 200), 2)
-            if landmark_points['elbowR']:
-                cv2.putText(annotated_frame, f'R: {int(angleElbowR)}°', 
-                            (int(landmark_points['elbowR'][0])-30, int(landmark_points['elbowR'][1])-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 200), 2)
-
-            mp.solutions.drawing_utils.draw_landmarks(
-                annotated_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec=mp.solutions.drawing_styles.get_default_pose_landmarks_style())
+GOOD_FORM_DATA = {
+    "joint_angles": {
+        "elbows": ["elbow_left", "elbow_right"],
+        "shoulders": ["shoulder_left", "shoulder_right"]
+    },
+    "spine": "spine"
+}
 
-    except Exception as e:
-        print(f"Pushup processing error: {e}")
+PUSHUP = {
+    "name": "pushup",
+    "log_file": "pushup_log.txt",
+    "log_cooldown": LOG_COOLDOWN,
+    # "down" = waiting to reach the bottom, "up" = waiting to lock out
+    "initial_phase": "down",
+    "rep_transition": ("up", "down"),
+    "default_feedback": {"pool": "general", "text": "Let's go!"},
+    "encouragement": ENCOURAGEMENT,
+    "bonus": {"pool": "bonus", "chance": 0.4},  # 40% chance of extra encouragement
+    # Landmarks below this visibility are ignored; the knee is often out of frame in a pushup
+    "visibility": {"default": 0.3, PoseLandmark.LEFT_KNEE: 0.1},
+    "required_landmarks": CRITICAL_POINTS,
+    "required_features": ["elbow_left", "elbow_right", "shoulder_left", "shoulder_right"],
+    "features": {
+        "elbow_left": {"angle": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST)},
+        "elbow_right": {"angle": (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST)},
+        "shoulder_left": {"angle": (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW)},
+        "shoulder_right": {"angle": (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW)},
+        "spine": {"angle": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE)},
+        "elbow_max": {"max": ["elbow_left", "elbow_right"]},
+        "elbow_min": {"min": ["elbow_left", "elbow_right"]},
+        "depth": {"affine": "elbow_max", "scale": -1, "offset": 180},
+    },
+    # Per-rep extremes for the set summary: depth at the bottom, lockout at the top, spine line
+    "summary": {"depth": "max", "elbow_min": "max", "spine": "min"},
+    # Reps from the less bent elbow, locked out at the top and bent past the depth threshold at the bottom
+    "reps": {"signal": "elbow_max", "rest": ELBOW_UP_THRESHOLD, "bottom": ELBOW_DOWN_THRESHOLD,
+             "first_half": "eccentric"},
+    "conditions": {
+        "bottom": [("elbow_left", "<", ELBOW_DOWN_THRESHOLD), ("elbow_right", "<", ELBOW_DOWN_THRESHOLD)],
+        "top": [("elbow_left", ">", ELBOW_UP_THRESHOLD), ("elbow_right", ">", ELBOW_UP_THRESHOLD)],
+        "spine_arched": [("spine", ">", SPINE_ANGLE_MAX)],
+        "hips_high": [("spine", "<", SPINE_ANGLE_MIN)],
+        "not_deep": {"any": [("elbow_left", ">", ELBOW_DOWN_THRESHOLD), ("elbow_right", ">", ELBOW_DOWN_THRESHOLD)]},
+        "not_extended": {"any": [("elbow_left", "<", ELBOW_UP_THRESHOLD), ("elbow_right", "<", ELBOW_UP_THRESHOLD)]},
+    },
+    # Phase detection with encouragement, then form and range reminders. Bottom and top log
+    # as types of their own, so a quick lockout is not held back by the bottom's log cooldown
+    "rules": [
+        {"name": "bottom", "phase": "down", "when": "bottom", "to": "up",
+         "feedback": "Perfect! Push up! ({depth}° depth)",
+         "cue": {"pool": "perfect_down", "text": "Perfect, push up now!"},
+         "log": "good_form_bottom", "data": GOOD_FORM_DATA},
+        {"name": "top", "phase": "up", "when": "top", "to": "down",
+         "feedback": "Great! Lower down! ({elbow_min}° extension)",
+         "cue": {"pool": "perfect_up", "text": "Try lower down!"},
+         "log": "good_form_top", "data": GOOD_FORM_DATA},
+        {"name": "spine_arched", "when": "spine_arched", "fault": True,
+         "feedback": "Almost perfect! Straighten your back a bit",
+         "cue": {"pool": "form_reminder", "text": "Straighten your back!"},
+         "log": "form_reminder", "data": {"spine_angle": "spine"}},
+        {"name": "hips_high", "when": "hips_high", "fault": True,
+         "feedback": " Keep hips down for better form!",
+         "cue": {"pool": "form_reminder", "text": "Hips down!"},
+         "log": "form_reminder", "data": {"spine_angle": "spine"}},
+        {"phase": "down", "when": "not_deep",
+         "feedback": "Almost there! Current: {elbow_max}°", "cue": "Keep going lower",
+         "log": "depth_reminder", "data": {"elbow_angles": ["elbow_left", "elbow_right"]}},
+        {"phase": "up", "when": "not_extended",
+         "feedback": " Keep pushing! Current: {elbow_min}°",
+         "cue": {"pool": "partial_rep", "text": "Push to full extension!"},
+         "log": "ascent_reminder", "data": {"elbow_angles": ["elbow_left", "elbow_right"]}},
+    ],
+    "overlay": {
+        "feedback": {"org": (10, 30), "scale": 0.8, "color": (0, 255, 100), "thickness": 2},
+        # Add motivational elements
+        "phase_banners": {
+            "up": {"text": "↑ PUSH STRONG ↑", "org": (-300, 50), "scale": 1, "color": (100, 255, 100)},
+            "down": {"text": "↓ CONTROL DESCENT ↓", "org": (-350, 50), "scale": 1, "color": (100, 255, 100)},
+        },
+        # Angle displays
+        "labels": [
+            {"text": "L: {elbow_left}°", "at": PoseLandmark.LEFT_ELBOW, "offset": (-30, -10),
+             "scale": 0.6, "color": (0, 200, 200)},
+            {"text": "R: {elbow_right}°", "at": PoseLandmark.RIGHT_ELBOW, "offset": (-30, -10),
+             "scale": 0.6, "color": (0, 200, 200)},
+        ],
+        "landmark_style": "pose",
+    },
+}
 
-    return feedback, annotated_frame, pushup_phase, last_audio_time
\ No newline at end of file
+pushup_exercise = CompiledExercise(PUSHUP)
+
+def process_pushup(frame, results, mp_pose, last_audio_time, audio_queue, pushup_phase, current_time, AUDIO_COOLDOWN,
+                   annotate=True, angles=None, session_id=None, state=None):
+    """Pushup through the shared rule engine, keeping the original call signature. Pass the
+    same ExerciseState as state on every call to keep log cooldowns between frames."""
+    state = state if state is not None else ExerciseState(pushup_phase)
+    state.phase = pushup_phase
+    state.last_audio_time = last_audio_time
+    result, frame = process_exercise(pushup_exercise, frame, results, state, current_time, audio_queue,
+                                     AUDIO_COOLDOWN, annotate, session_id)
+    if angles is not None and result.pose:
+        angles.update(result.features)
+    return result.feedback, frame, state.phase, state.last_audio_time
@@ -0,0 +1,203 @@
+import argparse
+import json
+from collections import deque
+from datetime import datetime
+
+from feedback_logger import feedback_logger
+
+REP_HYSTERESIS = 10  # Degrees the signal must drop below "rest" before a rep starts
+FAULT_PENALTY = 15  # Form score points lost per distinct fault during a rep
+MAX_REP_HISTORY = 200  # Segmented reps kept per session and exercise
+
+
+class Rep:
+    """One segmented repetition, from leaving the rest position to returning to it"""
+
+    def __init__(self, number, start, top):
+        self.number = number
+        self.start = start
+        self.end = start
+        self.top = top  # Signal at rest just before the rep
+        self.bottom = top
+        self.bottom_time = start
+        self.faults = set()
+        self.full = False
+        self.score = 0
+
+    def to_dict(self, first_half, origin=0.0):
+        first = self.bottom_time - self.start
+        second = self.end - self.bottom_time
+        eccentric, concentric = (first, second) if first_half == "eccentric" else (second, first)
+        return {
+            "rep": self.number,
+            "t": round(self.start - origin, 2),
+            "seconds": round(self.end - self.start, 2),
+            "eccentric_seconds": round(eccentric, 2),
+            "concentric_seconds": round(concentric, 2),
+            "range_of_motion": round(self.top - self.bottom, 1),
+            "lowest": round(self.bottom, 1),
+            "full": self.full,
+            "faults": sorted(self.faults),
+            "score": self.score,
+        }
+
+
+class RepSegmenter:
+    """Splits a stream of per-frame features into reps using the exercise's "reps"
+    definition. The signal (a joint angle) is high at rest: a rep starts once it drops
+    `hysteresis` below "rest" and ends when it climbs back above "rest", so jitter
+    around one threshold never splits or merges reps. The lowest point splits the rep
+    into its two halves; "first_half" says whether going down is the eccentric
+    (squat, push-up) or the concentric part (curl). A rep is full when the signal
+    got down to "bottom"; the form score is the share of that range reached, minus
+    a penalty per fault seen during the rep (only the "score_faults", if given)."""
+
+    def __init__(self, exercise, history=MAX_REP_HISTORY):
+        spec = exercise.rep_spec
+        if spec is None:
+            raise ValueError(f"{exercise.name} has no rep segmentation definition")
+        self.exercise = exercise
+        self.signal = spec["signal"]
+        self.rest = spec["rest"]
+        self.bottom = spec["bottom"]
+        self.first_half = spec.get("first_half", "eccentric")
+        self.hysteresis = spec.get("hysteresis", REP_HYSTERESIS)
+        self.fault_penalty = spec.get("fault_penalty", FAULT_PENALTY)
+        self.score_faults = spec.get("score_faults")  # Faults that cost points, None = all
+        self.reps = deque(maxlen=history)  # Completed reps as dicts
+        self.count = 0
+        self.origin = None
+        self.current = None
+        self._at_rest = False
+        self._top = None
+        self._rest_time = None
+
+    def update(self, features, timestamp, faults=()):
+        """Feed one frame's features; returns the rep (as a dict) that ended on it, if any"""
+        if self.origin is None:
+            self.origin = timestamp
+        value = features.get(self.signal)
+        if value is None:
+            return None
+        rep = self.current
+        if rep is None:
+            if value >= self.rest:
+                self._top = value if not self._at_rest else max(self._top, value)
+                self._rest_time = timestamp
+                self._at_rest = True
+                return None
+            if not self._at_rest or value >= self.rest - self.hysteresis:
+                return None  # Inside the hysteresis band, or not seen at rest yet
+            # The rep started when the signal last was at rest
+            rep = self.current = Rep(self.count + 1, self._rest_time, self._top)
+            self._at_rest = False
+
+        rep.end = timestamp
+        rep.faults.update(fault for fault in faults if self.score_faults is None or fault in self.score_faults)
+        if value < rep.bottom:
+            rep.bottom = value
+            rep.bottom_time = timestamp
+        if value <= self.rest:
+            return None
+        return self._finish(rep, value, timestamp)
+
+    def _finish(self, rep, value, timestamp):
+        rep.full = rep.bottom <= self.bottom
+        reached = min(1.0, (self.rest - rep.bottom) / (self.rest - self.bottom))
+        rep.score = max(0, round(100 * reached - self.fault_penalty * len(rep.faults)))
+        self.count += 1
+        self.current = None
+        self._at_rest = True
+        self._top = value
+        self._rest_time = timestamp
+        stats = rep.to_dict(self.first_half, self.origin)
+        self.reps.append(stats)
+        return stats
+
+    def totals(self):
+        """Rep counts and means over the reps kept in the history"""
+        reps = list(self.reps)
+        if not reps:
+            return {"reps": self.count, "full_reps": 0}
+
+        def mean(key):
+            return round(sum(rep[key] for rep in reps) / len(reps), 2)
+
+        return {
+            "reps": self.count,
+            "full_reps": sum(rep["full"] for rep in reps),
+            "mean_eccentric_seconds": mean("eccentric_seconds"),
+            "mean_concentric_seconds": mean("concentric_seconds"),
+            "mean_range_of_motion": mean("range_of_motion"),
+            "mean_score": mean("score"),
+        }
+
+
+def log_rep(exercise, rep, session_id=None):
+    """Append a segmented rep to the exercise's feedback log, next to the form feedback"""
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "feedback": "rep_stats",
+        "rep": rep,
+    }
+    feedback_logger.log(exercise.log_file, entry, session_id)
+
+
+def segment_frames(exercise, frames):
+    """Segment an offline series of (timestamp, features, faults) frames; the returned
+    segmenter holds every rep and the totals"""
+    segmenter = RepSegmenter(exercise, history=None)
+    for timestamp, features, faults in frames:
+        segmenter.update(features, timestamp, faults)
+    return segmenter
+
+
+def batch_frames(path):
+    """(timestamp, features, faults) frames from a batch_analyze <name>.jsonl file"""
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("pose"):
+                yield entry["t"], entry.get("features", {}), entry.get("faults", [])
+
+
+def recording_frames(exercise, path):
+    """(timestamp, features, faults) frames of a session recording, scored by replaying
+    the exercise's rules over the recorded landmarks"""
+    from landmark_replay import load_series, replay
+
+    _, frame_shape, timestamps, landmarks, _ = load_series(path)
+    for timestamp, result in zip(timestamps, replay(exercise, landmarks, frame_shape)):
+        if result.pose:
+            yield float(timestamp), result.features, result.faults
+
+
+def main():
+    from exercises import EXERCISES
+    from session_recording import load_recording
+
+    parser = argparse.ArgumentParser(
+        description="Segment reps offline from session recordings (.rec) or batch_analyze frame logs "
+                    "(.jsonl) and print one JSON line per rep, then the totals.")
+    parser.add_argument("inputs", nargs="+", help=".rec recordings or batch .jsonl files")
+    parser.add_argument("--exercise", choices=sorted(EXERCISES), default=None,
+                        help="exercise of .jsonl inputs (recordings name their own)")
+    args = parser.parse_args()
+
+    for path in args.inputs:
+        if path.endswith(".rec"):
+            exercise = EXERCISES[args.exercise or load_recording(path)[0]["exercise"]]
+            frames = recording_frames(exercise, path)
+        else:
+            if args.exercise is None:
+                parser.error(f"--exercise is needed for {path}")
+            exercise = EXERCISES[args.exercise]
+            frames = batch_frames(path)
+        segmenter = segment_frames(exercise, frames)
+        for rep in segmenter.reps:
+            print(json.dumps({"input": path, **rep}))
+        print(json.dumps({"input": path, "exercise": exercise.name, **segmenter.totals()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from kinematics import NUM_LANDMARKS, landmarks_to_array
+
+RECORDING_DIR = "recordings"
+RECORD_BUFFER = 256  # Frames buffered in memory between writes
+HEADER_SIZE = 1024  # Fixed-size JSON header, space padded, in front of the records
+MAGIC = "GYMBRO-REC"
+
+# One fixed-width record per analyzed frame. Landmarks are MediaPipe's normalized
+# x, y, z and visibility; float16 keeps sub-pixel precision at phone resolutions.
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("landmarks", "<f2", (NUM_LANDMARKS, 4)),
+    ("feedback", "u1"),
+])
+
+# Feedback types written by the processors' log_feedback, code = index
+FEEDBACK_CODES = [
+    "none",
+    "go_lower", "lean_forward", "knee_valgus_left", "knee_valgus_right", "perfect_form",
+    "good_form", "form_reminder", "depth_reminder", "ascent_reminder",
+    "rep_completed", "lift_higher", "back_lean", "good_form_bottom", "good_form_top",
+]
+FEEDBACK_CODE = {name: code for code, name in enumerate(FEEDBACK_CODES)}
+
+
+def landmarks_array(results):
+    """(33, 4) array of normalized landmarks, or NaNs when no pose was detected"""
+    if not results.pose_landmarks:
+        return np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    return landmarks_to_array(results.pose_landmarks)
+
+
+class SessionRecorder:
+    """Appends fixed-width frame records to a .rec file, buffered in a preallocated array.
+    The header's frame size scales every record, so an existing file recorded at another
+    size is moved aside (name-<unix time>.rec) and a new one started."""
+
+    def __init__(self, path, exercise, frame_shape, session_id=None):
+        self.path = path
+        self.frame_shape = (int(frame_shape[0]), int(frame_shape[1]))
+        self._buffer = np.zeros(RECORD_BUFFER, dtype=RECORD_DTYPE)
+        self._count = 0
+        self._pending_feedback = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0 and _header_shape(path) != self.frame_shape:
+            root, ext = os.path.splitext(path)
+            os.replace(path, f"{root}-{int(time.time())}{ext}")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            header = {
+                "magic": MAGIC,
+                "version": 1,
+                "exercise": exercise,
+                "session_id": session_id,
+                "width": self.frame_shape[1],
+                "height": self.frame_shape[0],
+                "feedback_codes": FEEDBACK_CODES,
+            }
+            with open(path, "wb") as f:
+                f.write(_pack_header(header))
+
+    def mark_feedback(self, feedback_type):
+        """Tag the frame being processed with a feedback type; the last one wins"""
+        self._pending_feedback = FEEDBACK_CODE.get(feedback_type, 0)
+
+    def record(self, timestamp, landmarks):
+        with self._lock:
+            record = self._buffer[self._count]
+            record["timestamp"] = timestamp
+            record["landmarks"] = landmarks
+            record["feedback"] = self._pending_feedback
+            self._pending_feedback = 0
+            self._count += 1
+            if self._count == RECORD_BUFFER:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._count:
+            with open(self.path, "ab") as f:
+                f.write(self._buffer[:self._count].tobytes())
+            self._count = 0
+
+
+def _pack_header(header):
+    data = json.dumps(header).encode()
+    if len(data) > HEADER_SIZE - 1:
+        raise ValueError("Recording header too large")
+    return data + b" " * (HEADER_SIZE - 1 - len(data)) + b"\n"
+
+
+def _header_shape(path):
+    """(height, width) in a recording's header, None when it is not a readable recording"""
+    try:
+        with open(path, "rb") as f:
+            header = json.loads(f.read(HEADER_SIZE))
+        return (header["height"], header["width"]) if header.get("magic") == MAGIC else None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def load_recording(path):
+    """Memory-map a recording; returns (header dict, structured array of RECORD_DTYPE).
+    Nothing is parsed per frame, slicing only touches the pages it needs."""
+    with open(path, "rb") as f:
+        header = json.loads(f.read(HEADER_SIZE))
+    if header.get("magic") != MAGIC:
+        raise ValueError(f"{path} is not a session recording")
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+    return header, records
+
+
+def pixel_landmarks(header, records):
+    """(T, 33, 4) float32 landmarks with x and y scaled to the recorded frame size,
+    matching what get_landmark_point returns in the processors"""
+    points = records["landmarks"].astype(np.float32)
+    points[..., 0] *= header["width"]
+    points[..., 1] *= header["height"]
+    return points
+
+
+def feedback_names(records):
+    return [FEEDBACK_CODES[code] for code in records["feedback"]]
+
+
+# Open recorders per (session, exercise)
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def recording_path(session_id, exercise):
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(session_id or "default"))
+    return os.path.join(RECORDING_DIR, safe_id, f"{exercise}.rec")
+
+
+def get_recorder(session_id, exercise, frame_shape):
+    """The session's recorder of an exercise; a new file when the client's frame size changed"""
+    key = (session_id, exercise)
+    with _recorders_lock:
+        recorder = _recorders.get(key)
+        if recorder is not None and recorder.frame_shape != tuple(frame_shape[:2]):
+            recorder.flush()
+            recorder = None
+        if recorder is None:
+            recorder = SessionRecorder(recording_path(session_id, exercise), exercise, frame_shape, session_id)
+            _recorders[key] = recorder
+        return recorder
+
+
+def mark_feedback(session_id, exercise, feedback_type):
+    recorder = _recorders.get((session_id, exercise))
+    if recorder is not None:
+        recorder.mark_feedback(feedback_type)
+
+
+def close_session(session_id):
+    with _recorders_lock:
+        keys = [key for key in _recorders if key[0] == session_id]
+        recorders = [_recorders.pop(key) for key in keys]
+    for recorder in recorders:
+        recorder.flush()
+
+
+def flush_all():
+    with _recorders_lock:
+        recorders = list(_recorders.values())
+    for recorder in recorders:
+        recorder.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+from feedback_logger import feedback_logger
+from frame_skipping import FrameSkipper
+from pose_pool import POSE_OPTIONS
+from pose_roi import RegionOfInterest
+from pose_tiers import TierGovernor, create_pose
+from session_recording import close_session
+from rep_segmentation import RepSegmenter
+from session_summary import SetSummary
+
+MAX_SESSIONS = 16  # Upper bound on live Pose trackers per process
+SESSION_IDLE_TIMEOUT = 300  # Seconds without a frame before a session is evicted
+DEFAULT_SESSION_ID = "default"
+
+
+class SessionLimitError(Exception):
+    """Raised when every session slot is taken by an active client"""
+
+
+class Session:
+    """Pose tracker, rep phase state and audio cooldown for one client. The in-process
+    tracker is only created when frames are not sent to a PosePool."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self._pose = None
+        self._pose_options = None
+        self.tiers = TierGovernor()  # Model tier asked for by the client, stepped down when over budget
+        # MediaPipe graphs are not thread safe, so frames of one session are processed in order
+        self.lock = threading.Lock()
+        self.exercise_states = {}  # Exercise name -> ExerciseState
+        self.summaries = {}  # Exercise name -> SetSummary
+        self.rep_segmenters = {}  # Exercise name -> RepSegmenter
+        self.skipper = None  # FrameSkipper while the client asks for frame skipping
+        self.roi = RegionOfInterest()
+        self.group = None  # GroupTracker once the client sends group (multi-person) frames
+        self.last_seen = time.time()
+
+    def pose_options(self):
+        """Pose options for the session's current model tier"""
+        return self.tiers.options(POSE_OPTIONS)
+
+    @property
+    def pose(self):
+        options = self.pose_options()
+        if self._pose is not None and options != self._pose_options:
+            self._pose.close()
+            self._pose = None
+        if self._pose is None:
+            self._pose = create_pose(options)
+            self._pose_options = options
+        return self._pose
+
+    def exercise_state(self, exercise):
+        """Rep phase and cooldowns of one exercise, created on first use"""
+        state = self.exercise_states.get(exercise.name)
+        if state is None:
+            state = exercise.new_state()
+            self.exercise_states[exercise.name] = state
+        return state
+
+    def set_summary(self, exercise):
+        """Running summary of the session's set of one exercise, created on first use"""
+        summary = self.summaries.get(exercise.name)
+        if summary is None:
+            summary = SetSummary(exercise, self.session_id)
+            self.summaries[exercise.name] = summary
+        return summary
+
+    def rep_segmenter(self, exercise):
+        """Rep segmentation of one exercise, created on first use"""
+        segmenter = self.rep_segmenters.get(exercise.name)
+        if segmenter is None:
+            segmenter = RepSegmenter(exercise)
+            self.rep_segmenters[exercise.name] = segmenter
+        return segmenter
+
+    def group_tracker(self, create):
+        """The session's multi-person tracker, made by create() on first use"""
+        if self.group is None:
+            self.group = create()
+        return self.group
+
+    def frame_skipper(self, every):
+        """FrameSkipper for inference on every k-th frame, None when every frame is inferred"""
+        if every <= 1:
+            self.skipper = None
+        elif self.skipper is None or self.skipper.every != every:
+            self.skipper = FrameSkipper(every)
+        return self.skipper
+
+    def close(self):
+        with self.lock:
+            if self._pose is not None:
+                self._pose.close()
+            if self.group is not None:
+                self.group.close()
+            for summary in self.summaries.values():
+                try:
+                    summary.save()
+                except OSError as e:
+                    print(f"Set summary not saved ({self.session_id}): {e}")
+        close_session(self.session_id)
+        feedback_logger.close_session(self.session_id)
+
+
+class SessionStore:
+    """Registry of sessions keyed by client id, bounded in size and evicted when idle"""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT, on_close=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close  # Called with the session id after a session is closed
+        self._sessions = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, session_id=None):
+        session_id = session_id or DEFAULT_SESSION_ID
+        now = time.time()
+        with self._lock:
+            expired = self._pop_idle(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._close_all(expired)
+                    raise SessionLimitError(f"Session limit of {self.max_sessions} reached")
+                session = Session(session_id)
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+        # Closing waits for in-flight frames, so do it outside the registry lock
+        self._close_all(expired)
+        return session
+
+    def find(self, session_id):
+        """The live session with this id, or None; unlike get() never creates one"""
+        with self._lock:
+            return self._sessions.get(session_id or DEFAULT_SESSION_ID)
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._close_all([session])
+
+    def evict_idle(self):
+        with self._lock:
+            expired = self._pop_idle(time.time())
+        self._close_all(expired)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _pop_idle(self, now):
+        expired = []
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_seen < self.idle_timeout:
+                break  # Ordered by last use, so the rest are fresher
+            expired.append(self._sessions.pop(session_id))
+        return expired
+
+    def _close_all(self, sessions):
+        for session in sessions:
+            session.close()
+            if self.on_close is not None:
+                self.on_close(session.session_id)
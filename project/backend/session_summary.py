@@ -0,0 +1,205 @@
+import json
+import os
+from collections import Counter, deque
+from datetime import datetime
+
+MAX_REP_DETAILS = 100  # Completed reps kept in full, the set totals cover every rep
+MAX_FAULT_EVENTS = 100  # Fault events kept with their time, the counts cover every event
+SUMMARY_FILE = "{exercise}_summary.json"
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+class RepStats:
+    """One repetition: the extreme of each summary feature, seconds spent per phase and
+    the faults that started during it"""
+
+    def __init__(self, number, start):
+        self.number = number
+        self.start = start
+        self.end = start
+        self.extremes = {}
+        self.phase_seconds = Counter()
+        self.faults = Counter()
+
+    def to_dict(self, set_start):
+        return {
+            "rep": self.number,
+            "t": _round(self.start - set_start),
+            "seconds": _round(self.end - self.start),
+            "phase_seconds": {phase: _round(seconds) for phase, seconds in self.phase_seconds.items()},
+            "features": {name: _round(value) for name, value in self.extremes.items()},
+            "faults": dict(self.faults),
+        }
+
+
+class SetSummary:
+    """Running statistics of one exercise set, fed one FrameResult at a time. Memory does
+    not grow with the number of frames: each frame only updates the current rep and the
+    set totals, so the summary is ready the moment the set ends.
+
+    The exercise's "summary" definition names the features to track and whether the
+    lowest or the highest value of a rep matters (e.g. the smallest knee angle is the
+    squat depth). A fault that holds over consecutive frames counts as one event."""
+
+    def __init__(self, exercise, session_id=None):
+        self.exercise = exercise
+        self.session_id = session_id
+        self.modes = exercise.summary_features
+        self.started = None
+        self.last_time = None
+        self.frames = 0
+        self.pose_frames = 0
+        self.rep_count = 0
+        self.current = None
+        self.rep_details = deque(maxlen=MAX_REP_DETAILS)
+        self.rep_seconds = []  # Fastest, slowest, total
+        self.phase_totals = Counter()
+        self.feature_totals = {}  # name -> [lowest, highest, sum, reps]
+        self.fault_frames = Counter()
+        self.fault_events = Counter()
+        self.recent_faults = deque(maxlen=MAX_FAULT_EVENTS)
+        self._active_faults = frozenset()
+        self._phase = None
+
+    def update(self, result, timestamp):
+        self.frames += 1
+        if self.started is None:
+            self.started = timestamp
+        elapsed = 0 if self.last_time is None else max(0.0, timestamp - self.last_time)
+        self.last_time = timestamp
+        if not result.pose:
+            self._active_faults = frozenset()
+            return
+        self.pose_frames += 1
+        if self.current is None:
+            self.current = RepStats(self.rep_count + 1, timestamp)
+        rep = self.current
+        rep.end = timestamp
+        if self._phase is not None:
+            rep.phase_seconds[self._phase] += elapsed
+        self._phase = result.phase
+
+        for name, mode in self.modes.items():
+            value = result.features.get(name)
+            if value is None:
+                continue
+            best = rep.extremes.get(name)
+            if best is None or (value < best if mode == "min" else value > best):
+                rep.extremes[name] = value
+
+        faults = frozenset(result.faults)
+        self.fault_frames.update(faults)
+        for fault in faults - self._active_faults:
+            self.fault_events[fault] += 1
+            rep.faults[fault] += 1
+            self.recent_faults.append((timestamp, fault, rep.number))
+        self._active_faults = faults
+
+        if result.rep:
+            self._finish_rep(rep)
+            self.current = RepStats(self.rep_count + 1, timestamp)
+
+    def _finish_rep(self, rep):
+        self.rep_count += 1
+        seconds = rep.end - rep.start
+        if self.rep_seconds:
+            fastest, slowest, total = self.rep_seconds
+            self.rep_seconds = [min(fastest, seconds), max(slowest, seconds), total + seconds]
+        else:
+            self.rep_seconds = [seconds, seconds, seconds]
+        self.phase_totals.update(rep.phase_seconds)
+        for name, value in rep.extremes.items():
+            totals = self.feature_totals.setdefault(name, [value, value, 0.0, 0])
+            totals[0] = min(totals[0], value)
+            totals[1] = max(totals[1], value)
+            totals[2] += value
+            totals[3] += 1
+        self.rep_details.append(rep)
+
+    def to_dict(self):
+        """Compact JSON-ready summary: set totals, tempo, per-feature statistics over the
+        reps, fault counts, the most recent fault events and the per-rep details"""
+        start = self.started or 0
+        tempo = None
+        if self.rep_seconds:
+            fastest, slowest, total = self.rep_seconds
+            tempo = {
+                "mean_rep_seconds": _round(total / self.rep_count),
+                "fastest_rep_seconds": _round(fastest),
+                "slowest_rep_seconds": _round(slowest),
+                "mean_phase_seconds": {phase: _round(seconds / self.rep_count)
+                                       for phase, seconds in self.phase_totals.items()},
+            }
+        unfinished = None
+        if self.current is not None and self.current.end > self.current.start:
+            unfinished = self.current.to_dict(start)
+        return {
+            "exercise": self.exercise.name,
+            "session_id": self.session_id,
+            "started_at": datetime.fromtimestamp(self.started).isoformat() if self.started else None,
+            "seconds": _round((self.last_time or start) - start),
+            "frames": self.frames,
+            "pose_frames": self.pose_frames,
+            "reps": self.rep_count,
+            "tempo": tempo,
+            "features": {
+                name: {"per_rep": self.modes[name], "lowest": _round(low), "highest": _round(high),
+                       "mean": _round(total / count)}
+                for name, (low, high, total, count) in self.feature_totals.items()
+            },
+            "faults": {fault: {"events": self.fault_events[fault], "frames": self.fault_frames[fault]}
+                       for fault in self.fault_events},
+            "recent_fault_events": [{"t": _round(t - start), "fault": fault, "rep": rep}
+                                    for t, fault, rep in self.recent_faults],
+            "rep_details": [rep.to_dict(start) for rep in self.rep_details],
+            "unfinished_rep": unfinished,
+        }
+
+    def save(self, path=None):
+        """Write the summary as JSON, replacing the previous one in a single step so a
+        reader never sees half a file"""
+        path = path or summary_path(self.exercise.name, self.session_id)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, path)
+        return path
+
+
+def summary_path(exercise_name, session_id=None):
+    """Next to the session's feedback logs; the default session's lands in the working
+    directory, where gemini.py looks for it"""
+    from feedback_logger import session_log_path
+
+    return session_log_path(SUMMARY_FILE.format(exercise=exercise_name), session_id)
+
+
+def summarize_feedback_log(path):
+    """Counts per feedback type with the first and last time it was logged, read line by
+    line from a JSONL feedback log. For sessions from before set summaries existed;
+    None when the log is missing or empty."""
+    counts = Counter()
+    first, last = {}, {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                feedback = entry.get("feedback")
+                counts[feedback] += 1
+                first.setdefault(feedback, entry.get("timestamp"))
+                last[feedback] = entry.get("timestamp")
+    except FileNotFoundError:
+        return None
+    if not counts:
+        return None
+    return {feedback: {"count": count, "first": first[feedback], "last": last[feedback]}
+            for feedback, count in counts.items()}
@@ -1,157 +1,108 @@
-import cv2
-import numpy as np
-import mediapipe as mp
-import time
-from datetime import datetime
-import json
+from kinematics import PoseLandmark
+from exercise_rules import CompiledExercise, ExerciseState, process_exercise
 
 # Modified logging setup
 LOG_COOLDOWN = 0.1  # Increased from 0.05 to 0.5 seconds
-last_log_times = {}  # Track cooldowns per feedback type
 
-def log_feedback(message, coordinates):
-    global last_log_times
-    current_time = time.time()
-    
-    # Get last log time for this specific message
-    last_time = last_log_times.get(message, 0)
-    
-    if current_time - last_time >= LOG_COOLDOWN:
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "feedback": message,
-            "coordinates": coordinates
-        }
-        # Write to file immediately
-        with open("temp.txt", "a") as f:
-            f.write(json.dumps(entry) + "\n")
-        
-        # Update last log time for this message type
-        last_log_times[message] = current_time
+# Thresholds
+KNEE_VALGUS_THRESHOLD = 100  # Pixels the knee may drift inside the ankle
+BACK_LEAN_THRESHOLD = 65  # Shoulder-hip-knee angle in degrees
+DEPTH_THRESHOLD = 0.75  # Hip must drop below this fraction of knee height
+REP_REST_ANGLE = 160  # Knee angle of a standing athlete, for rep segmentation
+REP_BOTTOM_ANGLE = 110  # Knee angle a full squat gets down to
 
-def process_squat(frame, results, mp_pose,
-                  last_audio_time, audio_queue, perfect_form_flag, current_time,
-                  AUDIO_COOLDOWN=3):
-    feedback = "No pose detected"
-    if results.pose_landmarks:
-        landmarks = results.pose_landmarks.landmark
-
-        def get_landmark_point(landmark, frame):
-            return [landmark.x * frame.shape[1],
-                    landmark.y * frame.shape[0],
-                    landmark.z]
-
-        def calculate_angle(a, b, c):
-            a2d = np.array(a[:2])
-            b2d = np.array(b[:2])
-            c2d = np.array(c[:2])
-            ba = a2d - b2d
-            bc = c2d - b2d
-            cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-            angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
-            return np.degrees(angle)
-
-        def calculate_midpoint(a, b):
-            return [(a[0] + b[0])/2, (a[1] + b[1])/2, (a[2] + b[2])/2]
-
-        # Get landmarks
-        shoulderL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER], frame)
-        shoulderR = get_landmark_point(landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER], frame)
-        hipL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_HIP], frame)
-        hipR = get_landmark_point(landmarks[mp_pose.PoseLandmark.RIGHT_HIP], frame)
-        kneeL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_KNEE], frame)
-        kneeR = get_landmark_point(landmarks[mp_pose.PoseLandmark.RIGHT_KNEE], frame)
-        ankleL = get_landmark_point(landmarks[mp_pose.PoseLandmark.LEFT_ANKLE], frame)
-        ankleR = get_landmark_point(landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE], frame)
-
-        # Calculations
-        angleKneeL = calculate_angle(hipL, kneeL, ankleL)
-        angleKneeR = calculate_angle(hipR, kneeR, ankleR)
-        midpointShoulder = calculate_midpoint(shoulderL, shoulderR)
-        midpointHips = calculate_midpoint(hipL, hipR)
-        midpointKnees = calculate_midpoint(kneeL, kneeR)
-        angleBack = calculate_angle(midpointShoulder, midpointHips, midpointKnees)
+SQUAT = {
+    "name": "squat",
+    "log_file": "temp.txt",
+    # Knee valgus is judged from small lateral offsets the lite model is too coarse for
+    "min_pose_tier": "full",
+    "log_cooldown": LOG_COOLDOWN,
+    # "down" = perfect form reached at the bottom, "up" = everything else
+    "initial_phase": "up",
+    "rep_transition": ("down", "up"),
+    "default_feedback": "No pose detected",
+    "idle_feedback": "Perfect! Go up!",
+    "features": {
+        "knee_left": {"angle": (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE)},
+        "knee_right": {"angle": (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE)},
+        "back": {"angle": ((PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER),
+                           (PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP),
+                           (PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE))},
+        # Positive once the hip is low enough (image y grows downwards)
+        "depth_left": {"linear": [(PoseLandmark.LEFT_HIP, "y", 1), (PoseLandmark.LEFT_KNEE, "y", -DEPTH_THRESHOLD)]},
+        "depth_right": {"linear": [(PoseLandmark.RIGHT_HIP, "y", 1), (PoseLandmark.RIGHT_KNEE, "y", -DEPTH_THRESHOLD)]},
+        "valgus_left": {"linear": [(PoseLandmark.LEFT_KNEE, "x", 1), (PoseLandmark.LEFT_ANKLE, "x", -1)]},
+        "valgus_right": {"linear": [(PoseLandmark.RIGHT_ANKLE, "x", 1), (PoseLandmark.RIGHT_KNEE, "x", -1)]},
+        "knee": {"min": ["knee_left", "knee_right"]},
+    },
+    # Per-rep extremes for the set summary: how deep, how upright, how far the knees caved
+    "summary": {
+        "knee_left": "min", "knee_right": "min", "back": "min",
+        "depth_left": "max", "depth_right": "max", "valgus_left": "max", "valgus_right": "max",
+    },
+    # Reps from the more bent knee: standing straight is rest, 110° or less a full squat.
+    # "Go lower" shows on every descent until depth is met; depth is scored by the range.
+    "reps": {"signal": "knee", "rest": REP_REST_ANGLE, "bottom": REP_BOTTOM_ANGLE, "first_half": "eccentric",
+             "score_faults": ["lean_forward", "knee_valgus_left", "knee_valgus_right"]},
+    "conditions": {
+        "shallow": {"any": [("depth_left", "<=", 0), ("depth_right", "<=", 0)]},
+        "leaning": [("back", "<", BACK_LEAN_THRESHOLD)],
+        "knee_in_left": [("valgus_left", ">", KNEE_VALGUS_THRESHOLD)],
+        "knee_in_right": [("valgus_right", ">", KNEE_VALGUS_THRESHOLD)],
+    },
+    # Posture checks in priority order; any fault resets the perfect form phase
+    "rules": [
+        {"when": "shallow", "to": "up", "fault": True,
+         "feedback": "Go lower", "cue": "Go lower",
+         "log": "go_lower", "data": {
+             "hips": [PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP],
+             "knees": [PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE],
+             "depth_met": False
+         }},
+        {"when": "leaning", "to": "up", "fault": True,
+         "feedback": "Lean forward too much", "cue": "Lean forward too much",
+         "log": "lean_forward", "data": {
+             "body_angle": "back",
+             "shoulder_mid": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER),
+             "hip_mid": (PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP)
+         }},
+        {"when": "knee_in_left", "to": "up", "fault": True,
+         "feedback": "Left knee in", "cue": "Left knee in",
+         "log": "knee_valgus_left", "data": {"knee": PoseLandmark.LEFT_KNEE, "ankle": PoseLandmark.LEFT_ANKLE}},
+        {"when": "knee_in_right", "to": "up", "fault": True,
+         "feedback": "Right knee in", "cue": "Right knee in",
+         "log": "knee_valgus_right", "data": {"knee": PoseLandmark.RIGHT_KNEE, "ankle": PoseLandmark.RIGHT_ANKLE}},
+        # Depth met with no faults
+        {"phase": "up", "to": "down",
+         "feedback": "Perfect! Go up!", "cue": "Good form, go up", "cue_cooldown": False,
+         "log": "perfect_form", "data": {
+             "joint_angles": {"knees": ["knee_left", "knee_right"], "back": "back"},
+             "depth_achieved": True
+         }},
+    ],
+    "overlay": {
+        "feedback": {"org": (10, 30), "scale": 1, "color": (0, 255, 0), "thickness": 2},
+        "labels": [
+            {"text": "{knee_left}", "at": PoseLandmark.LEFT_KNEE, "offset": (-30, -10)},
+            {"text": "{knee_right}", "at": PoseLandmark.RIGHT_KNEE, "offset": (-30, -10)},
+            {"text": "{back}", "at": (PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP), "offset": (-30, -10)},
+        ],
+    },
+}
 
-        # Thresholds
-        knee_valgus_threshold = 100
-        back_lean_threshold = 65
-        depth_threshold = 0.75
-        depth_left = hipL[1] > kneeL[1] * depth_threshold
-        depth_right = hipR[1] > kneeR[1] * depth_threshold
-        current_depth_met = depth_left and depth_right
-        knee_valgus_left = (kneeL[0] - ankleL[0]) > knee_valgus_threshold
-        knee_valgus_right = (ankleR[0] - kneeR[0]) > knee_valgus_threshold
+squat_exercise = CompiledExercise(SQUAT)
 
-        perfect_form = False
-
-        # Posture checks with logging
-        if not current_depth_met:
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                audio_queue.put("Go lower")
-                last_audio_time = current_time
-            feedback = "Go lower"
-            perfect_form_flag = False
-            log_feedback("go_lower", {
-                "hips": [hipL, hipR],
-                "knees": [kneeL, kneeR],
-                "depth_met": current_depth_met
-            })
-        elif angleBack < back_lean_threshold:
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                audio_queue.put("Lean forward too much")
-                last_audio_time = current_time
-            feedback = "Lean forward too much"
-            log_feedback("lean_forward", {
-                "body_angle": float(angleBack),
-                "shoulder_mid": midpointShoulder,
-                "hip_mid": midpointHips
-            })
-        elif knee_valgus_left:
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                audio_queue.put("Left knee in")
-                last_audio_time = current_time
-            feedback = "Left knee in"
-            log_feedback("knee_valgus_left", {
-                "knee": kneeL,
-                "ankle": ankleL
-            })
-        elif knee_valgus_right:
-            if (current_time - last_audio_time) > AUDIO_COOLDOWN:
-                audio_queue.put("Right knee in")
-                last_audio_time = current_time
-            feedback = "Right knee in"
-            log_feedback("knee_valgus_right", {
-                "knee": kneeR,
-                "ankle": ankleR
-            })
-        else:
-            perfect_form = True
-
-        if perfect_form and current_depth_met:
-            if not perfect_form_flag:
-                audio_queue.put("Good form, go up")
-                last_audio_time = current_time
-                feedback = "Perfect! Go up!"
-                perfect_form_flag = True
-                log_feedback("perfect_form", {
-                    "joint_angles": {
-                        "knees": [float(angleKneeL), float(angleKneeR)],
-                        "back": float(angleBack)
-                    },
-                    "depth_achieved": current_depth_met
-                })
-        else:
-            perfect_form_flag = False
-
-        # Visualization
-        cv2.putText(frame, feedback, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(frame, f'{int(angleKneeL)}', (int(kneeL[0])-30, int(kneeL[1])-10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(frame, f'{int(angleKneeR)}', (int(kneeR[0])-30, int(kneeR[1])-10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(frame, f'{int(angleBack)}', (int(midpointHips[0])-30, int(midpointHips[1])-10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        mp.solutions.drawing_utils.draw_landmarks(
-            frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
-
-    return feedback, frame, perfect_form_flag, last_audio_time
+def process_squat(frame, results, mp_pose,
+                  last_audio_time, audio_queue, perfect_form_flag, current_time,
+                  AUDIO_COOLDOWN=3, annotate=True, angles=None, session_id=None, state=None):
+    """Squat through the shared rule engine, keeping the original call signature. Pass the
+    same ExerciseState as state on every call to keep log cooldowns between frames."""
+    phase = "down" if perfect_form_flag else "up"
+    state = state if state is not None else ExerciseState(phase)
+    state.phase = phase
+    state.last_audio_time = last_audio_time
+    result, frame = process_exercise(squat_exercise, frame, results, state, current_time, audio_queue,
+                                     AUDIO_COOLDOWN, annotate, session_id)
+    if angles is not None and result.pose:
+        angles.update(result.features)
+    return result.feedback, frame, state.phase == "down", state.last_audio_time
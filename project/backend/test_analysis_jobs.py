@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from analysis_jobs import DONE, FAILED, AnalysisCache, AnalysisQueue
+
+
+@pytest.fixture
+def event_loop_thread():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+
+    async def cancel_tasks():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def analysis_queue(loop, tmp_path, analyze, **options):
+    options = {"workers": 2, "timeout": 0.2, "retries": 2, "backoff": 0.01, **options}
+    return AnalysisQueue(analyze, lambda: loop, cache=AnalysisCache(str(tmp_path)), **options)
+
+
+def test_analysis_queue_retries_transient_errors_then_caches(event_loop_thread, tmp_path):
+    calls = []
+
+    async def analyze(summary):
+        calls.append(summary)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return f"{summary['reps']} good reps"
+
+    queue = analysis_queue(event_loop_thread, tmp_path, analyze)
+    job = queue.wait(queue.submit("key", summary={"reps": 5}), 5)
+    assert (job.status, job.result, job.attempts) == (DONE, "5 good reps", 2)
+
+    cached = queue.submit("key", summary={"reps": 5})
+    assert cached.done.is_set() and cached.cached and cached.result == "5 good reps"
+    assert len(calls) == 2
+
+
+def test_analysis_queue_fails_fast_on_deterministic_errors(event_loop_thread, tmp_path):
+    calls = []
+
+    async def analyze():
+        calls.append(1)
+        raise ValueError("The model returned no text")
+
+    queue = analysis_queue(event_loop_thread, tmp_path, analyze)
+    job = queue.wait(queue.submit("key"), 5)
+    assert (job.status, job.attempts, len(calls)) == (FAILED, 1, 1)
+    assert queue.cache.get("key") is None
+
+
+def test_analysis_queue_retries_timeouts_and_shares_running_jobs(event_loop_thread, tmp_path):
+    async def analyze():
+        await asyncio.sleep(1)
+
+    queue = analysis_queue(event_loop_thread, tmp_path, analyze, retries=1)
+    job = queue.submit("key")
+    assert queue.submit("key") is job
+    queue.wait(job, 5)
+    assert (job.status, job.attempts) == (FAILED, 2)
+    assert job.error.startswith("Timed out")
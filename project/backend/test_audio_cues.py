@@ -0,0 +1,31 @@
+import os
+
+from audio_cues import PcmCache
+
+VOICE = "test-voice"
+
+
+def cached_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".pcm"))
+
+
+def test_overwriting_a_key_counts_only_the_new_file(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=1000, memory_items=0)
+    cache.put("Go lower", VOICE, b"\0" * 400)
+    cache.put("Go lower", VOICE, b"\0" * 300)
+    cache.put("Go lower", VOICE, b"\0" * 500)
+    assert cache._size == cached_bytes(tmp_path) == 500
+    cache.put("Chest up", VOICE, b"\0" * 400)  # 900 of 1000: nothing evicted
+    assert cache._size == cached_bytes(tmp_path) == 900
+    assert cache.get("Go lower", VOICE) == b"\0" * 500
+
+
+def test_least_recently_played_is_evicted(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=1000, memory_items=0)
+    cache.put("Go lower", VOICE, b"\0" * 400)
+    cache.put("Chest up", VOICE, b"\0" * 400)
+    os.utime(cache.path("Go lower", VOICE), (1, 1))  # Played long ago
+    cache.put("Knees out", VOICE, b"\0" * 400)
+    assert cache.get("Go lower", VOICE) is None
+    assert cache.get("Chest up", VOICE) is not None
+    assert cache._size == cached_bytes(tmp_path) == 800
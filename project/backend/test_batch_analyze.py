@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from batch_analyze import DECODE_AHEAD, analyze_input, collect_inputs
+from exercises import EXERCISES
+
+
+class FakePool:
+    """Finds nobody in any frame; with fail_after, raises on that many frames"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+        self.released = []
+
+    def process(self, session_id, image, timeout=None, options=None):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise TimeoutError("pose worker timed out")
+        return None
+
+    def release(self, session_id):
+        self.released.append(session_id)
+
+
+def image_directory(tmp_path, count):
+    directory = tmp_path / "frames"
+    directory.mkdir()
+    for index in range(count):
+        cv2.imwrite(str(directory / f"{index:04d}.png"), np.full((48, 64, 3), index, np.uint8))
+    return str(directory)
+
+
+def decode_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("decode-")]
+
+
+def test_analyze_image_directory(tmp_path):
+    directory = image_directory(tmp_path, 5)
+    out = tmp_path / "out"
+    out.mkdir()
+    pool = FakePool()
+    summary = analyze_input(pool, EXERCISES["squat"], "frames", directory, "images", str(out))
+    assert (summary["frames"], summary["pose_frames"], summary["reps"]) == (5, 0, 0)
+    assert pool.released == [directory]
+    lines = (out / "frames.jsonl").read_text().splitlines()
+    assert [json.loads(line)["pose"] for line in lines] == [False] * 5
+    assert os.path.exists(out / "frames.summary.json")
+
+
+def test_failed_input_stops_its_decode_thread(tmp_path):
+    directory = image_directory(tmp_path, DECODE_AHEAD * 2)
+    pool = FakePool(fail_after=1)
+    with pytest.raises(TimeoutError):
+        analyze_input(pool, EXERCISES["squat"], "frames", directory, "images", str(tmp_path))
+    assert pool.released == [directory]
+    for thread in decode_threads():
+        thread.join(2)
+    assert not decode_threads()
+
+
+def test_unreadable_video_is_an_error(tmp_path):
+    video = tmp_path / "broken.mp4"
+    video.write_bytes(b"not a video")
+    with pytest.raises(OSError, match="Could not open video"):
+        analyze_input(FakePool(), EXERCISES["squat"], "broken", str(video), "video", str(tmp_path))
+
+
+def test_collect_inputs_names_duplicates(tmp_path):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "set.mp4").write_bytes(b"")
+    names = [name for name, _, _ in collect_inputs([str(tmp_path / "a"), str(tmp_path / "b")])]
+    assert names == ["set", "set-2"]
@@ -0,0 +1,36 @@
+from coach_context import HISTORY_SUMMARY_TOKENS, MIN_RECENT_TURNS, CoachContext, estimate_tokens
+
+
+def test_coach_context_folds_history_into_budget():
+    prompts = []
+
+    def summarize_history(prompt):
+        prompts.append(prompt)
+        return "Athlete asked about depth; advised sitting back."
+
+    context = CoachContext("System prompt", summarize=summarize_history, budget=200)
+    context.attach_session({"reps": 5, "rep_details": [{"rep": n, "score": 90} for n in range(100)]})
+    for turn in range(20):
+        context.add_turn(f"Question {turn} " + "why " * 20, f"Answer {turn} " + "because " * 20)
+        assert context._history_tokens() <= 200
+    assert context.folds > 0 and prompts
+    assert len(context.turns) >= MIN_RECENT_TURNS
+    prompt = context.prompt("Next question")
+    assert "Answer 19" in prompt and "Answer 0 " not in prompt
+    assert "advised sitting back" in prompt
+    assert prompt.count("Session data") == 1
+
+
+def test_coach_context_without_summarizer_keeps_transcript_tail():
+    def failing(prompt):
+        raise RuntimeError("model unavailable")
+
+    context = CoachContext("System prompt", summarize=failing, budget=100)
+    for turn in range(10):
+        context.add_turn(f"Question {turn} " + "x " * 30, f"Answer {turn}")
+    assert context.folds > 0
+    assert len(context.turns) >= MIN_RECENT_TURNS
+    # The folded turns are kept as plain transcript, newest last, capped at its share
+    last_folded = 10 - len(context.turns) - 1
+    assert context.history_summary.endswith(f"Answer {last_folded}")
+    assert estimate_tokens(context.history_summary) <= HISTORY_SUMMARY_TOKENS
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+import pytest
+
+from feedback_logger import FeedbackLogger, session_log_path
+
+
+@pytest.fixture
+def logger(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger = FeedbackLogger(max_sessions=3)
+    yield logger
+    logger.close()
+
+
+def read_entries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_bad_entry_is_dropped_alone(logger):
+    logger.log("squat_log.txt", {"n": 1}, "a")
+    logger.log("squat_log.txt", {"bad": object()}, "a")
+    logger.log("squat_log.txt", {"n": 2}, "a")
+    logger.flush()
+    assert read_entries(session_log_path("squat_log.txt", "a")) == [{"n": 1}, {"n": 2}]
+
+
+def test_close_session_closes_only_its_files(logger):
+    logger.log("squat_log.txt", {"n": 1}, "a")
+    logger.log("squat_log.txt", {"n": 1}, "b")
+    logger.close_session("a")
+    assert set(logger._files) == {session_log_path("squat_log.txt", "b")}
+    assert read_entries(session_log_path("squat_log.txt", "a")) == [{"n": 1}]
+
+
+def test_session_directories_are_capped(logger):
+    for index, session_id in enumerate("abcde"):
+        logger.log("squat_log.txt", {"n": index}, session_id)
+        logger.flush()
+        logger.close_session(session_id)
+        directory = os.path.dirname(session_log_path("squat_log.txt", session_id))
+        written = time.time() - 100 + index  # Oldest first
+        os.utime(session_log_path("squat_log.txt", session_id), (written, written))
+        assert os.path.isdir(directory)
+    assert sorted(os.listdir("logs")) == ["c", "d", "e"]
+
+
+def test_old_session_directories_are_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger = FeedbackLogger(retention=60)
+    logger.log("squat_log.txt", {"n": 1}, "old")
+    logger.close_session("old")
+    old = time.time() - 120
+    os.utime(session_log_path("squat_log.txt", "old"), (old, old))
+    logger.log("squat_log.txt", {"n": 1}, "new")
+    logger.close()
+    assert os.listdir("logs") == ["new"]
+
+
+def test_age_counts_from_the_file_not_the_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = session_log_path("squat_log.txt", "a")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(json.dumps({"n": 0}) + "\n")
+    with open(f"{path}.1", "w") as f:
+        f.write(json.dumps({"n": -1}) + "\n")
+    old = time.time() - 120
+    os.utime(f"{path}.1", (old, old))  # Rotated out two minutes ago
+    logger = FeedbackLogger(max_age=60)
+    logger.log("squat_log.txt", {"n": 1}, "a")
+    logger.close()
+    # A restart does not reset the age: the old file rotated before the new entry
+    assert read_entries(path) == [{"n": 1}]
+    assert read_entries(f"{path}.1") == [{"n": 0}]
@@ -0,0 +1,62 @@
+import base64
+import json
+
+from flask_sock import ConnectionClosed
+
+from frame_stream import LatestFrame, receive_frames
+
+
+class FakeSocket:
+    """Hands out the given messages, then reports the connection closed"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def receive(self):
+        if not self.messages:
+            raise ConnectionClosed()
+        return self.messages.pop(0)
+
+
+class RecordingInbox(LatestFrame):
+    """Also keeps every frame put, not only the newest"""
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+
+    def put(self, item):
+        self.frames.append(item)
+        super().put(item)
+
+
+def test_receive_frames_skips_malformed_messages():
+    jpeg = b"\xff\xd8jpeg"
+    encoded = base64.b64encode(jpeg).decode()
+    inbox = RecordingInbox()
+    receive_frames(FakeSocket([
+        "not json",
+        json.dumps([1, 2]),
+        json.dumps({"image": 5}),
+        json.dumps({"image": "data:image/jpeg;base64"}),  # No comma, no payload
+        json.dumps({"image": "data:image/jpeg;base64,"}),
+        json.dumps({"image": "!!not base64!!"}),
+        json.dumps({"exercise": 3}),
+        json.dumps({"exercise": "PushUp"}),  # Exercise change only
+        json.dumps({"image": f"data:image/jpeg;base64,{encoded}"}),
+        jpeg,
+    ]), inbox, "squat")
+    assert inbox.invalid == 7
+    assert inbox.frames == [(jpeg, "pushup"), (jpeg, "pushup")]
+    assert inbox.take() == (jpeg, "pushup")
+    assert inbox.take() is None  # The stream closed after the socket did
+
+
+def test_latest_frame_keeps_newest():
+    inbox = LatestFrame()
+    inbox.put("first")
+    inbox.put("second")
+    assert (inbox.received, inbox.dropped) == (2, 1)
+    assert inbox.take() == "second"
+    inbox.close()
+    assert inbox.take() is None
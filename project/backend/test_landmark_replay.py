@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from exercises import EXERCISES
+from landmark_replay import replay, summarize, synthetic_stream
+
+REPS = 5
+
+# Per exercise: faults a clean rep may show (depth and lift cues during the motion), and
+# the phase a stream that ends at rest finishes in
+SYNTHETIC = {
+    "squat": ({"go_lower"}, "up"),
+    "pushup": (set(), "down"),
+    "bicep": ({"lift_higher"}, "down"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(SYNTHETIC))
+def test_synthetic_stream_replay(name):
+    allowed_faults, final_phase = SYNTHETIC[name]
+    _, landmarks = synthetic_stream(name, reps=REPS)
+    summary = summarize(EXERCISES[name], landmarks)
+    assert summary["reps"] == REPS
+    assert summary["pose_frames"] == summary["frames"] == len(landmarks)
+    assert set(summary["faults"]) <= allowed_faults
+    assert summary["final_phase"] == final_phase
+
+
+def test_replay_keeps_the_phase_through_frames_without_a_pose():
+    exercise = EXERCISES["squat"]
+    _, landmarks = synthetic_stream("squat", reps=REPS)
+    gap = len(landmarks) // 2
+    landmarks[gap:gap + 10] = np.nan  # The athlete stepped out of view
+    results = list(replay(exercise, landmarks))
+    assert [result.pose for result in results[gap:gap + 10]] == [False] * 10
+    assert {result.phase for result in results[gap:gap + 10]} == {results[gap - 1].phase}
+    assert sum(result.rep for result in results) == summarize(exercise, landmarks)["reps"]
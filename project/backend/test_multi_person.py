@@ -0,0 +1,56 @@
+import numpy as np
+
+from multi_person import TRACK_MAX_MISSES, GroupTracker
+from pose_pool import PoolBusyError
+
+FRAME = np.zeros((480, 640, 3), np.uint8)
+
+
+class FakePool:
+    """Answers every crop with the same output"""
+
+    def __init__(self, output):
+        self.output = output
+
+    def process_batch(self, items, timeout=None):
+        return [self.output for _ in items]
+
+    def queue_depth(self, session_id):
+        return 0
+
+
+class OnePerson:
+    def detect(self, frame):
+        return [(100, 50, 300, 450)]
+
+
+def tracker(output):
+    group = GroupTracker("gym", FakePool(output), detect_every=1000)
+    group.detector = OnePerson()
+    return group
+
+
+def test_busy_workers_do_not_drop_tracks():
+    group = tracker(PoolBusyError("busy"))
+    for _ in range(TRACK_MAX_MISSES + 5):
+        assert group.estimate(FRAME, "lite") == []
+    track, = group.tracks.values()
+    assert track.id == 1 and track.misses == 0
+
+
+def test_tracks_without_a_pose_are_dropped():
+    group = tracker(None)
+    group.estimate(FRAME, "lite")
+    assert list(group.tracks) == [1]
+    for _ in range(TRACK_MAX_MISSES + 1):
+        group.estimate(FRAME, "lite")
+    # Every frame with a lost track runs the detector again, which starts a new track
+    assert 1 not in group.tracks
+
+
+def test_frame_size_change_starts_tracks_afresh():
+    group = tracker(PoolBusyError("busy"))
+    group.estimate(FRAME, "lite")
+    group.estimate(np.zeros((640, 480, 3), np.uint8), "lite")
+    track, = group.tracks.values()
+    assert track.id == 2 and track.session.roi.frame_shape == (640, 480)
@@ -0,0 +1,24 @@
+import numpy as np
+
+from pose_roi import RegionOfInterest
+
+
+def test_box_is_dropped_when_the_frame_size_changes():
+    roi = RegionOfInterest(input_size=0)
+    roi.set_box((100, 100, 300, 400), (480, 640))
+    image, box = roi.prepare(np.zeros((480, 640, 3), np.uint8))
+    assert box == (100, 100, 300, 400) and image.shape[:2] == (300, 200)
+
+    image, box = roi.prepare(np.zeros((640, 480, 3), np.uint8))  # Rotated to portrait
+    assert box == (0, 0, 480, 640) and roi.box is None
+
+
+def test_box_is_clamped_to_the_frame():
+    roi = RegionOfInterest(input_size=0)
+    roi.set_box((-50, 200, 700, 900), (480, 640))
+    _, box = roi.prepare(np.zeros((480, 640, 3), np.uint8))
+    assert box == (0, 200, 640, 480)
+
+    roi.set_box((700, 500, 800, 600), (480, 640))  # Entirely outside
+    _, box = roi.prepare(np.zeros((480, 640, 3), np.uint8))
+    assert box == (0, 0, 640, 480) and roi.box is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import exercise_rules
+from bicep_curl_processor import process_bicep_curl
+from kinematics import PoseResults
+from landmark_replay import DEFAULT_FRAME_SHAPE, NullCueQueue, synthetic_stream
+from push_up_processor import LOG_COOLDOWN, process_pushup
+
+REPS = 5
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    """(feedback type, timestamp) of every entry the processors write"""
+    entries = []
+    clock = {"now": 0.0}
+    monkeypatch.setattr(exercise_rules.feedback_logger, "log",
+                        lambda filename, entry, session_id=None: entries.append((entry["feedback"], clock["now"])))
+    return entries, clock
+
+
+def run(process, name, initial_phase, logged, state=None):
+    entries, clock = logged
+    frame = np.zeros(DEFAULT_FRAME_SHAPE, np.uint8)
+    timestamps, landmarks = synthetic_stream(name, reps=REPS)
+    phase, audio_time = initial_phase, 0
+    for timestamp, points in zip(timestamps.tolist(), landmarks):
+        clock["now"] = timestamp
+        _, _, phase, audio_time = process(frame, PoseResults(points), None, audio_time, NullCueQueue(), phase,
+                                          timestamp, 3, annotate=False, state=state)
+    return entries
+
+
+def gaps(entries, feedback_type):
+    times = [timestamp for kind, timestamp in entries if kind == feedback_type]
+    return np.diff(times)
+
+
+def test_pushup_logs_every_bottom_and_top(logged):
+    entries = run(process_pushup, "pushup", "down", logged, exercise_rules.ExerciseState("down"))
+    kinds = [kind for kind, _ in entries]
+    assert kinds.count("good_form_bottom") == kinds.count("good_form_top") == REPS
+    assert "good_form" not in kinds
+
+
+@pytest.mark.parametrize("process, name, phase", [(process_pushup, "pushup", "down"),
+                                                  (process_bicep_curl, "bicep", "down")])
+def test_log_cooldown_through_the_legacy_wrappers(logged, process, name, phase):
+    entries = run(process, name, phase, logged, exercise_rules.ExerciseState(phase))
+    assert entries
+    for kind in {kind for kind, _ in entries}:
+        assert (gaps(entries, kind) >= LOG_COOLDOWN - 1e-9).all()
@@ -0,0 +1,48 @@
+import pytest
+
+from exercises import EXERCISES
+from landmark_replay import replay, synthetic_stream
+from rep_segmentation import RepSegmenter
+
+REPS = 5
+
+
+def replayed(name, reps=REPS):
+    exercise = EXERCISES[name]
+    timestamps, landmarks = synthetic_stream(name, reps=reps)
+    return exercise, zip(timestamps.tolist(), replay(exercise, landmarks))
+
+
+@pytest.mark.parametrize("name", ["bicep", "pushup", "squat"])
+def test_synthetic_reps_segment_as_full_clean_reps(name):
+    exercise, frames = replayed(name)
+    segmenter = RepSegmenter(exercise, history=None)
+    for timestamp, result in frames:
+        segmenter.update(result.features, timestamp, result.faults)
+    totals = segmenter.totals()
+    assert totals["reps"] == totals["full_reps"] == REPS
+    assert totals["mean_score"] == 100
+    for rep in segmenter.reps:
+        assert rep["eccentric_seconds"] + rep["concentric_seconds"] == pytest.approx(rep["seconds"], abs=0.02)
+
+
+def test_rep_segmenter_hysteresis():
+    segmenter = RepSegmenter(EXERCISES["squat"], history=None)
+    knee = [170, 158, 161, 152, 162, 159, 165]  # Jitter inside the band below "rest"
+    knee += list(range(165, 95, -5)) + list(range(100, 175, 5))  # One full rep
+    ended = [segmenter.update({"knee": value}, index / 30) for index, value in enumerate(knee)]
+    reps = [rep for rep in ended if rep is not None]
+    assert len(reps) == 1
+    assert reps[0]["full"] and reps[0]["score"] == 100
+    assert reps[0]["lowest"] == 100
+
+
+def test_rep_segmenter_scores_faults_and_partial_reps():
+    segmenter = RepSegmenter(EXERCISES["squat"], history=None)
+    knee = list(range(170, 125, -5)) + list(range(130, 175, 5))  # Down to 130 of the 110 needed
+    for index, value in enumerate(knee):
+        segmenter.update({"knee": value}, index / 30, ["lean_forward"] if value == 130 else ["go_lower"])
+    rep, = segmenter.reps
+    assert not rep["full"]
+    assert rep["faults"] == ["lean_forward"]  # go_lower is not a scored fault
+    assert rep["score"] == round(100 * (160 - 130) / (160 - 110)) - 15
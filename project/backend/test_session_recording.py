@@ -0,0 +1,45 @@
+import glob
+
+import numpy as np
+import pytest
+
+from kinematics import NUM_LANDMARKS
+from session_recording import close_session, get_recorder, load_recording, pixel_landmarks, recording_path
+
+LANDMARKS = np.full((NUM_LANDMARKS, 4), 0.5, dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield
+    close_session("a")
+
+
+def record(session_id, shape, frames):
+    recorder = get_recorder(session_id, "squat", shape)
+    for index in range(frames):
+        recorder.record(float(index), LANDMARKS)
+    recorder.flush()
+
+
+def test_reopened_recording_appends_at_the_same_size():
+    record("a", (480, 640, 3), 2)
+    close_session("a")
+    record("a", (480, 640, 3), 3)
+    header, records = load_recording(recording_path("a", "squat"))
+    assert (header["width"], header["height"], len(records)) == (640, 480, 5)
+
+
+def test_other_frame_size_starts_a_new_recording():
+    record("a", (480, 640, 3), 2)
+    close_session("a")  # A restart: the file stays, the recorder is gone
+    record("a", (1280, 720, 3), 3)
+    record("a", (1280, 720, 3), 1)
+    header, records = load_recording(recording_path("a", "squat"))
+    assert (header["width"], header["height"], len(records)) == (720, 1280, 4)
+    assert pixel_landmarks(header, records)[0, 0, :2].tolist() == [360, 640]
+
+    old, = glob.glob("recordings/a/squat-*.rec")
+    header, records = load_recording(old)
+    assert (header["width"], header["height"], len(records)) == (640, 480, 2)
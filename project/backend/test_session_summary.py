@@ -0,0 +1,53 @@
+from exercise_rules import FrameResult
+from exercises import EXERCISES
+from landmark_replay import replay, synthetic_stream
+from session_summary import SetSummary
+
+REPS = 5
+
+
+def replayed(name, reps=REPS):
+    exercise = EXERCISES[name]
+    timestamps, landmarks = synthetic_stream(name, reps=reps)
+    return exercise, zip(timestamps.tolist(), replay(exercise, landmarks))
+
+
+def frame(phase, faults=(), rep=False, **features):
+    result = FrameResult("")
+    result.phase = phase
+    result.faults = list(faults)
+    result.rep = rep
+    result.features = features
+    return result
+
+
+def test_set_summary_counts_reps_and_fault_events():
+    summary = SetSummary(EXERCISES["squat"], "test")
+    frames = [
+        frame("up", knee_left=170),
+        frame("up", ["lean_forward"], knee_left=140),
+        frame("up", ["lean_forward"], knee_left=120),  # Same fault held: one event
+        frame("down", knee_left=100),
+        frame("down", rep=True, knee_left=165),
+        frame("up", ["lean_forward"], knee_left=130),
+        frame("down", rep=True, knee_left=170),
+    ]
+    for index, result in enumerate(frames):
+        summary.update(result, 1000 + index)
+    data = summary.to_dict()
+    assert data["reps"] == 2
+    assert data["faults"] == {"lean_forward": {"events": 2, "frames": 3}}
+    assert [rep["features"]["knee_left"] for rep in data["rep_details"]] == [100, 130]
+    assert data["features"]["knee_left"]["lowest"] == 100
+    assert data["tempo"]["mean_rep_seconds"] == 3.0
+
+
+def test_set_summary_of_replayed_stream():
+    exercise, frames = replayed("pushup")
+    summary = SetSummary(exercise)
+    for timestamp, result in frames:
+        summary.update(result, timestamp)
+    data = summary.to_dict()
+    assert data["reps"] == REPS
+    assert data["faults"] == {}
+    assert len(data["rep_details"]) == REPS
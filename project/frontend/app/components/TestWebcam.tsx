@@ -9,42 +9,68 @@ const TestWebcamFeedback: React.FC<{ presetExercise?: string }> = ({ presetExerc
   const [feedback, setFeedback] = useState<string>('');
   const [annotatedImage, setAnnotatedImage] = useState<string>('');
   const [isStopped, setIsStopped] = useState<boolean>(false);
+  // Identifies this client so the backend keeps its rep state separate
+  const sessionId = useRef<string>(Math.random().toString(36).slice(2));
 
-  // Function to capture a frame and send it to the backend
-  const analyzeFrame = async () => {
+  const socketRef = useRef<WebSocket | null>(null);
+
+  // Open one streaming connection; frames go up, feedback and annotated frames come back
+  useEffect(() => {
     if (isStopped) return;
+    const socket = new WebSocket(
+      `ws://127.0.0.1:5000/ws/analyze?exercise=${exercise || 'squat'}&session_id=${sessionId.current}&response=jpeg`
+    );
+    let imageUrl = '';
+    socket.onmessage = (event) => {
+      if (typeof event.data === 'string') {
+        const message = JSON.parse(event.data);
+        if (message.type === 'feedback') setFeedback(message.feedback);
+        else if (message.type === 'error') setFeedback(message.error);
+      } else {
+        if (imageUrl) URL.revokeObjectURL(imageUrl);
+        imageUrl = URL.createObjectURL(event.data);
+        setAnnotatedImage(imageUrl);
+      }
+    };
+    socket.onerror = () => setFeedback('Error analyzing frame.');
+    socketRef.current = socket;
+    return () => {
+      socket.close();
+      socketRef.current = null;
+    };
+  }, [exercise, isStopped]);
+
+  // Function to capture a frame and stream it to the backend
+  const sendFrame = async () => {
+    const socket = socketRef.current;
+    if (isStopped || !socket || socket.readyState !== WebSocket.OPEN) return;
+    // Skip this tick while the previous frame is still uploading; the server drops stale frames too
+    if (socket.bufferedAmount > 0) return;
     const imageData = webcamRef.current?.getScreenshot();
     if (!imageData) {
       setFeedback('Could not capture image.');
       return;
     }
-    try {
-      const response = await axios.post('http://127.0.0.1:5000/analyze', {
-        image: imageData,
-        exercise: exercise,
-      });
-      const { feedback, annotated_image } = response.data;
-      setFeedback(feedback);
-      setAnnotatedImage(annotated_image);
-    } catch (error) {
-      console.error('Error analyzing frame:', error);
-      setFeedback('Error analyzing frame.');
-    }
+    const frame = await (await fetch(imageData)).blob();
+    socket.send(frame);
   };
 
-  // Set up a timer to continuously analyze frames every second
+  // Stream frames at roughly camera rate
   useEffect(() => {
     if (isStopped) return;
     const interval = setInterval(() => {
-      analyzeFrame();
-    }, 100);
+      sendFrame();
+    }, 33);
     return () => clearInterval(interval);
   }, [exercise, isStopped]);
 
   // Stop handler: calls endpoints to shutdown app.py and start Gemini, then stops the webcam
   const handleStop = async () => {
     try {
-      await axios.post('http://127.0.0.1:5000/start-gemini');
+      await axios.post('http://127.0.0.1:5000/start-gemini', {
+        session_id: sessionId.current,
+        exercise: exercise || 'squat',
+      });
       setTimeout(async () => {
         await axios.post('http://127.0.0.1:5000/shutdown');
       }, 3000);